@@ -0,0 +1,19 @@
+"""
+Benchmarks for the API (see README "Benchmarks").
+
+Kept free of application imports: DATABASE_URL and the other settings are read when
+db.connection is first imported, so runners configure the environment first.
+"""
+import os
+
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+
+def parse_rows(value: str) -> int:
+    """Row count from a number or one of the SCALES names"""
+    return SCALES[value] if value in SCALES else int(value)
+
+
+def default_db_path(rows: int, seed: int) -> str:
+    return os.path.join("benchmarks", "data", f"bench-{rows}-{seed}.db")
@@ -0,0 +1,159 @@
+"""
+Latency of the analytics queries in each analytics mode.
+
+Every AccountApplication analytics classmethod behind an /analytics/* route is called
+`--repeat` times in a fresh process per mode, on a generated SQLite database:
+
+- sql:      ANALYTICS_COUNTERS=false, every call scans accountapplication
+- counters: the incrementally maintained AnalyticsCounter table (the default)
+- columnar: ANALYTICS_COLUMNAR=true, the in-memory NumPy store (db/columnar.py)
+
+The calls only read, so the database is used in place. The columnar report also
+carries the time the store took to load.
+
+Usage:
+    python -m benchmarks.analytics --rows 1M --repeat 20 --output benchmarks/results/analytics-1M.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks import default_db_path, parse_rows
+from benchmarks.routes import _git_commit, _percentile
+
+
+MODES = {
+    "sql": {"ANALYTICS_COUNTERS": "false", "ANALYTICS_COLUMNAR": "false"},
+    "counters": {"ANALYTICS_COUNTERS": "true", "ANALYTICS_COLUMNAR": "false"},
+    "columnar": {"ANALYTICS_COUNTERS": "true", "ANALYTICS_COLUMNAR": "true"},
+}
+
+# Classmethod -> extra arguments after the session
+QUERIES = {
+    "count_total": (),
+    "count_by_account_type": (),
+    "count_by_city": (),
+    "count_by_gender": (),
+    "count_by_occupation": (),
+    "count_by_card_type": (),
+    "count_by_card_network": (),
+    "count_by_marital_status": (),
+    "count_by_residential_status": (),
+    "get_services_stats": (),
+    "get_kin_stats": (),
+    "get_dashboard_stats": (),
+    "get_financial_stats": (),
+    "get_cross_analysis_gender_account": (),
+    "get_cross_analysis_occupation_card": (),
+    "get_city_performance": (),
+    "get_avg_turnover_by_occupation": (),
+    "get_premium_card_demographics": (),
+    "get_digital_adoption_analysis": (),
+    "get_high_value_customers": (500000,),
+    "get_turnover_histogram": (),
+    "get_profile_completeness": (),
+    "get_customer_segments": (),
+    "get_segment_member_ids": ("business_owners",),
+    "get_cube": (("city", "occupation"), ("count", "avg_cr", "max_cr"), {"internet_banking": [True]}),
+}
+
+
+def _child(repeat: int) -> None:
+    """Time every query in this process's mode"""
+    from sqlmodel import Session
+    from db.connection import ANALYTICS_COLUMNAR_ENABLED, engine
+    from db.schemas import AccountApplication
+
+    result = {"load_ms": None, "queries": {}}
+    if ANALYTICS_COLUMNAR_ENABLED:
+        from db.columnar import columnar_store
+
+        started = time.perf_counter()
+        columnar_store.load()
+        result["load_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    with Session(engine) as session:
+        for name, arguments in QUERIES.items():
+            method = getattr(AccountApplication, name)
+            samples = []
+            try:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    method(session, *arguments)
+                    samples.append(time.perf_counter() - started)
+            except Exception as e:
+                session.rollback()
+                result["queries"][name] = {"error": f"{type(e).__name__}: {e}"}
+                continue
+            result["queries"][name] = {
+                "min_ms": round(min(samples) * 1000, 4),
+                "p50_ms": round(_percentile(samples, 50) * 1000, 4),
+                "p95_ms": round(_percentile(samples, 95) * 1000, 4),
+            }
+    print(json.dumps(result), flush=True)
+
+
+def benchmark_analytics(database_url: str, repeat: int, modes: list) -> dict:
+    results = {}
+    for mode in modes:
+        env = dict(os.environ, DATABASE_URL=database_url, OCR_JOBS="false", **MODES[mode])
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.analytics", "--child", "--repeat", str(repeat)],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+        timed = [query["p50_ms"] for query in results[mode]["queries"].values() if "p50_ms" in query]
+        load = f", load {results[mode]['load_ms']:.0f} ms" if results[mode]["load_ms"] is not None else ""
+        print(f"{mode:9s} p50 per query: max {max(timed):>9.3f} ms, sum {sum(timed):>9.3f} ms{load}", file=sys.stderr)
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Analytics query latency with SQL, the counter table and the columnar store")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", default="1k", help="row count or one of: 1k, 100k, 1M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=10, help="calls per query")
+    parser.add_argument("--modes", default=",".join(MODES), help="comma-separated subset of: " + ", ".join(MODES))
+    parser.add_argument("--db", default=None, help="database to read (default benchmarks/data/bench-<rows>-<seed>.db)")
+    parser.add_argument("--output", default=None, help="JSON results path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.repeat)
+        return
+
+    rows = parse_rows(args.rows)
+    path = args.db or default_db_path(rows, args.seed)
+
+    from benchmarks.generator import load_sqlite
+
+    if not os.path.exists(path):
+        load_sqlite(path, rows, args.seed)
+    modes = benchmark_analytics(f"sqlite:///{os.path.abspath(path)}", args.repeat, args.modes.split(","))
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "rows": rows,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "modes": modes,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Cold-start time of the API, as paid by a serverless instance.
+
+Every sample is a fresh Python process that imports the app, runs its startup
+(lifespan) and serves one request through the ASGI app. The process reports its
+import, startup and first-response times; the parent adds the wall time from spawning
+the process to that first response. Runs on a copy of a generated SQLite database
+that one untimed start has already brought up to date, so samples measure steady
+cold starts rather than a first deployment.
+
+Both startup modes are measured: "full" (FAST_STARTUP=false, schema upkeep on every
+start) and "fast" (FAST_STARTUP=true). The report says whether the p50 of the fast
+process time is within --target-ms.
+
+Usage:
+    python -m benchmarks.cold_start --rows 100k --samples 20 --output benchmarks/results/cold-start.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import default_db_path, parse_rows
+from benchmarks.routes import _git_commit, _percentile
+
+
+MODES = {"full": "false", "fast": "true"}
+DEFAULT_TARGET_MS = 1500.0
+
+
+def _child(path: str) -> None:
+    """One cold start: time the app import, its startup and the first request"""
+    import asyncio
+    import httpx  # the benchmark's client, not part of the app's cold start
+
+    async def run() -> dict:
+        started = time.perf_counter()
+        import main
+        imported = time.perf_counter()
+        async with main.app.router.lifespan_context(main.app):
+            ready = time.perf_counter()
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://cold-start") as client:
+                response = await client.get(path)
+            answered = time.perf_counter()
+        return {
+            "status": response.status_code,
+            "import_ms": (imported - started) * 1000,
+            "startup_ms": (ready - imported) * 1000,
+            "first_response_ms": (answered - ready) * 1000,
+        }
+
+    # Startup messages go to stderr; stdout carries the one result line
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    result = asyncio.run(run())
+    sys.stdout = stdout
+    print(json.dumps(result), flush=True)
+
+
+def _sample(env: dict, path: str) -> dict:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.cold_start", "--child", path],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    line = process.stdout.readline()
+    elapsed = time.perf_counter() - started
+    process.wait()
+    if not line:
+        raise RuntimeError(f"cold start failed (exit code {process.returncode})")
+    sample = json.loads(line)
+    sample["process_ms"] = elapsed * 1000
+    return sample
+
+
+def _summary(samples: list) -> dict:
+    summary = {"status": sorted({sample["status"] for sample in samples})}
+    for key in ("import_ms", "startup_ms", "first_response_ms", "process_ms"):
+        values = [sample[key] for sample in samples]
+        summary[key] = {
+            "p50": round(_percentile(values, 50), 2),
+            "p95": round(_percentile(values, 95), 2),
+            "mean": round(statistics.fmean(values), 2),
+        }
+    return summary
+
+
+def benchmark_cold_start(database_url: str, samples: int, path: str) -> dict:
+    results = {}
+    for mode, fast_startup in MODES.items():
+        env = dict(os.environ, DATABASE_URL=database_url, FAST_STARTUP=fast_startup)
+        # Serverless instances do not run the background OCR queue
+        env.setdefault("OCR_JOBS", "false")
+        # Untimed start: brings the copy up to date and records its schema version
+        _sample(env, path)
+        runs = [_sample(env, path) for _ in range(samples)]
+        results[mode] = _summary(runs)
+        print(f"{mode:5s} process p50 {results[mode]['process_ms']['p50']:>8.1f} ms  "
+              f"(import {results[mode]['import_ms']['p50']:.1f}, startup {results[mode]['startup_ms']['p50']:.1f}, "
+              f"first response {results[mode]['first_response_ms']['p50']:.1f})", file=sys.stderr)
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Cold-start time: import, startup and first response in a fresh process")
+    parser.add_argument("--child", metavar="PATH", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--rows", default="1k", help="row count or one of: 1k, 100k, 1M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--samples", type=int, default=15, help="cold starts per mode")
+    parser.add_argument("--path", default="/account-applications/count", help="route of the first request")
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS, help="p50 process time the fast mode must meet")
+    parser.add_argument("--db", default=None, help="source database (copied per run; default benchmarks/data/bench-<rows>-<seed>.db)")
+    parser.add_argument("--output", default=None, help="JSON results path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.child)
+        return
+
+    rows = parse_rows(args.rows)
+    source = args.db or default_db_path(rows, args.seed)
+    workdir = tempfile.mkdtemp(prefix="cold-start-")
+    path = os.path.join(workdir, "cold-start.db")
+
+    from benchmarks.generator import load_sqlite
+
+    if not os.path.exists(source):
+        load_sqlite(source, rows, args.seed)
+    shutil.copyfile(source, path)
+    try:
+        modes = benchmark_cold_start(f"sqlite:///{path}", args.samples, args.path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    fast_p50 = modes["fast"]["process_ms"]["p50"]
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "rows": rows,
+        "seed": args.seed,
+        "samples": args.samples,
+        "path": args.path,
+        "target_ms": args.target_ms,
+        "target_met": fast_p50 <= args.target_ms,
+        "modes": modes,
+    }
+    print(f"fast p50 {fast_p50:.1f} ms, target {args.target_ms:.0f} ms: {'met' if report['target_met'] else 'MISSED'}", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+CPU cost of creating one account application.
+
+Runs on a copy of a generated SQLite database (so the dataset is unchanged) and
+measures, per created application, the process CPU time and wall time of:
+
+- validate:   AccountApplicationCreate.model_validate(payload)
+- controller: validation plus create_account_application() with its own session
+- route:      POST /account-applications through the ASGI app (parsing, validation,
+              insert, counters and response serialisation)
+
+Every stage creates its own applications with unused CNICs. The report carries the
+commit, so runs before and after a change to the create path can be compared.
+
+Usage:
+    python -m benchmarks.create --rows 100k --count 2000 --output benchmarks/results/create.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks import default_db_path, parse_rows
+from benchmarks.routes import _git_commit, _percentile
+
+
+def _summary(cpu: list, wall: list) -> dict:
+    return {
+        "count": len(cpu),
+        "cpu_mean_ms": round(statistics.fmean(cpu) * 1000, 4),
+        "cpu_p50_ms": round(_percentile(cpu, 50) * 1000, 4),
+        "cpu_p95_ms": round(_percentile(cpu, 95) * 1000, 4),
+        "wall_mean_ms": round(statistics.fmean(wall) * 1000, 4),
+        "wall_p50_ms": round(_percentile(wall, 50) * 1000, 4),
+        "wall_p95_ms": round(_percentile(wall, 95) * 1000, 4),
+    }
+
+
+def _timed(call) -> tuple:
+    cpu, wall = time.process_time(), time.perf_counter()
+    result = call()
+    return result, time.process_time() - cpu, time.perf_counter() - wall
+
+
+def benchmark_create(count: int, seed: int, rows: int, warmup: int) -> dict:
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+    from benchmarks.generator import generate_application
+    from controller.account_application import create_account_application
+    from db.connection import engine
+    from model import AccountApplicationCreate
+    import main as app_module
+
+    rng = random.Random(seed)
+    # CNIC indexes past the generated rows so created applications never collide
+    next_index = [rows + 2_000_000]
+
+    def payloads(n: int) -> list:
+        batch = []
+        for _ in range(n):
+            next_index[0] += 1
+            batch.append(generate_application(rng, next_index[0]))
+        return batch
+
+    def controller_create(payload: dict):
+        with Session(engine) as session:
+            return create_account_application(AccountApplicationCreate.model_validate(payload), session)
+
+    stages = {}
+    with TestClient(app_module.app) as client:
+        for payload in payloads(warmup):
+            client.post("/account-applications", json=payload).raise_for_status()
+
+        samples = [_timed(lambda: AccountApplicationCreate.model_validate(payload)) for payload in payloads(count)]
+        stages["validate"] = _summary([cpu for _, cpu, _ in samples], [wall for _, _, wall in samples])
+
+        samples = [_timed(lambda: controller_create(payload)) for payload in payloads(count)]
+        stages["controller"] = _summary([cpu for _, cpu, _ in samples], [wall for _, _, wall in samples])
+
+        samples = [_timed(lambda: client.post("/account-applications", json=payload)) for payload in payloads(count)]
+        statuses = sorted({response.status_code for response, _, _ in samples})
+        stages["route"] = dict(_summary([cpu for _, cpu, _ in samples], [wall for _, _, wall in samples]), status=statuses)
+
+    for stage, summary in stages.items():
+        print(f"{stage:12s} cpu p50 {summary['cpu_p50_ms']:>8.3f} ms  mean {summary['cpu_mean_ms']:>8.3f} ms", file=sys.stderr)
+    return stages
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Per-create CPU time of POST /account-applications")
+    parser.add_argument("--rows", default="1k", help="row count or one of: 1k, 100k, 1M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--count", type=int, default=1000, help="applications created per stage")
+    parser.add_argument("--warmup", type=int, default=50, help="applications created before measuring")
+    parser.add_argument("--db", default=None, help="source database (copied per run; default benchmarks/data/bench-<rows>-<seed>.db)")
+    parser.add_argument("--output", default=None, help="JSON results path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    rows = parse_rows(args.rows)
+    source = args.db or default_db_path(rows, args.seed)
+    workdir = tempfile.mkdtemp(prefix="create-")
+    path = os.path.join(workdir, "create.db")
+
+    # Configure the app before anything imports db.connection
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("OCR_JOBS", "false")
+
+    from benchmarks.generator import load_sqlite
+
+    if not os.path.exists(source):
+        load_sqlite(source, rows, args.seed)
+    shutil.copyfile(source, path)
+    try:
+        stages = benchmark_create(args.count, args.seed, rows, args.warmup)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "rows": rows,
+        "seed": args.seed,
+        "count": args.count,
+        "analytics_counters": os.getenv("ANALYTICS_COUNTERS", "true"),
+        "stages": stages,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
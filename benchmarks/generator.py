@@ -0,0 +1,217 @@
+"""
+Seeded synthetic account applications.
+
+Every application passes AccountApplicationCreate validation and draws its categorical
+fields from the model enums, with a share of optional fields left empty so the
+UNKNOWN / NO_CARD branches of the analytics are exercised. The same seed and count
+always produce the same rows.
+
+Usage:
+    python -m benchmarks.generator --rows 100000 --seed 42 --db benchmarks/data/bench.db
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import time
+from types import SimpleNamespace
+from typing import Iterator
+
+from sqlalchemy import create_engine
+from sqlmodel import SQLModel, Session
+
+from benchmarks import SCALES, default_db_path, parse_rows
+from db.schemas import AccountApplication, AnalyticsCounter, NumberSequence
+from db.migrations import ensure_indexes
+from db.sequences import IBAN_BANK_CODE
+from model import AccountType, CardNetwork, CardType, Gender, MaritalStatus, Occupation, ResidentialStatus
+from utils.validations import account_number_from_sequence, iban_from_account_number
+
+
+FIRST_NAMES = (
+    "MUHAMMAD", "AHMED", "ALI", "HASSAN", "USMAN", "BILAL", "HAMZA", "ZAIN", "FAHAD", "SAAD",
+    "AYESHA", "FATIMA", "SANA", "HIRA", "MARIA", "ZARA", "MAHNOOR", "IQRA", "NIMRA", "AMNA"
+)
+LAST_NAMES = (
+    "KHAN", "AHMED", "ALI", "HUSSAIN", "SHAH", "MALIK", "QURESHI", "SIDDIQUI", "BUTT", "CHAUDHRY",
+    "RAZA", "IQBAL", "BAIG", "MIRZA", "SHEIKH"
+)
+CITIES = (
+    ("KARACHI", 30), ("LAHORE", 25), ("ISLAMABAD", 10), ("RAWALPINDI", 8), ("FAISALABAD", 7),
+    ("MULTAN", 5), ("PESHAWAR", 5), ("QUETTA", 3), ("HYDERABAD", 3), ("SIALKOT", 2), (None, 2)
+)
+RELATIONS = ("S", "W", "D")
+# Monthly turnover tiers in Rs (low, high) with relative weights
+TURNOVER_TIERS = (
+    ((5_000, 50_000), 30), ((50_000, 200_000), 35), ((200_000, 500_000), 20),
+    ((500_000, 2_000_000), 12), ((2_000_000, 20_000_000), 3)
+)
+
+# Enum values and cumulative weights resolved once; the generator is the load bottleneck
+OCCUPATIONS = tuple(member.value for member in Occupation)
+CARD_TYPES = tuple(member.value for member in CardType)
+CARD_NETWORKS = tuple(member.value for member in CardNetwork)
+MARITAL_STATUSES = tuple(member.value for member in MaritalStatus)
+RESIDENTIAL_STATUSES = tuple(member.value for member in ResidentialStatus)
+GENDERS = (Gender.MALE.value, Gender.MALE.value, Gender.FEMALE.value, Gender.FEMALE.value, Gender.OTHER.value)
+ACCOUNT_TYPES = ((AccountType.CURRENT.value, 45), (AccountType.SAVINGS.value, 45), (AccountType.AHU_LAT.value, 10))
+
+
+def _cumulative(pairs):
+    values, weights = zip(*pairs)
+    return values, list(itertools.accumulate(weights))
+
+
+_CITY_CHOICES = _cumulative(CITIES)
+_TURNOVER_CHOICES = _cumulative(TURNOVER_TIERS)
+_ACCOUNT_TYPE_CHOICES = _cumulative(ACCOUNT_TYPES)
+
+
+def _maybe(rng: random.Random, probability: float, value):
+    return value if rng.random() < probability else None
+
+
+def _weighted(rng: random.Random, choices):
+    values, cumulative_weights = choices
+    return rng.choices(values, cum_weights=cumulative_weights)[0]
+
+
+def _date(rng: random.Random, first_year: int, last_year: int) -> str:
+    return f"{rng.randint(1, 28):02d} {rng.randint(1, 12):02d} {rng.randint(first_year, last_year) % 100:02d}"
+
+
+def _cnic(number: int) -> str:
+    digits = f"{number:013d}"
+    return f"{digits[:5]}-{digits[5:12]}-{digits[12]}"
+
+
+def _turnover(rng: random.Random) -> float:
+    low, high = _weighted(rng, _TURNOVER_CHOICES)
+    return float(round(rng.uniform(low, high), -3))
+
+
+def generate_application(rng: random.Random, index: int) -> dict:
+    """One AccountApplicationCreate payload (JSON values); `index` makes the CNIC unique"""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    city = _weighted(rng, _CITY_CHOICES)
+    occupation = _maybe(rng, 0.9, rng.choice(OCCUPATIONS))
+    card_type = _maybe(rng, 0.7, rng.choice(CARD_TYPES))
+    residential_status = _maybe(rng, 0.8, rng.choice(RESIDENTIAL_STATUSES))
+    has_next_of_kin = rng.random() < 0.4
+    internet_banking = rng.random() < 0.55
+    return {
+        "account_type": _weighted(rng, _ACCOUNT_TYPE_CHOICES),
+        "title_of_account": name,
+        "name_on_card": name if card_type else None,
+        "name": name,
+        "fathers_husbands_name": _maybe(rng, 0.8, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"),
+        "mothers_name": _maybe(rng, 0.6, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"),
+        "marital_status": _maybe(rng, 0.85, rng.choice(MARITAL_STATUSES)),
+        "gender": _maybe(rng, 0.9, rng.choice(GENDERS)),
+        "nationality": _maybe(rng, 0.7, "PAKISTANI"),
+        "place_of_birth": _maybe(rng, 0.5, city or "KARACHI"),
+        "date_of_birth": _maybe(rng, 0.75, _date(rng, 1950, 2005)),
+        "cnic_no": _cnic(4210100000000 + index),
+        "cnic_expiry_date": _maybe(rng, 0.6, _date(rng, 2026, 2035)),
+        "house_no_block_street": _maybe(rng, 0.6, f"HOUSE {rng.randint(1, 999)} BLOCK {rng.choice('ABCDEFGH')}"),
+        "area_location": _maybe(rng, 0.5, f"SECTOR {rng.randint(1, 20)}"),
+        "city": city,
+        "postal_code": _maybe(rng, 0.6, f"{rng.randint(10000, 99999)}"),
+        "occupation": occupation,
+        "occupation_other": "FREELANCER" if occupation == Occupation.OTHER.value else None,
+        "purpose_of_account": _maybe(rng, 0.5, rng.choice(("SAVINGS", "SALARY", "BUSINESS"))),
+        "source_of_income": _maybe(rng, 0.5, rng.choice(("SALARY", "BUSINESS", "PENSION", "FAMILY"))),
+        "expected_monthly_turnover_dr": _maybe(rng, 0.8, _turnover(rng)),
+        "expected_monthly_turnover_cr": _maybe(rng, 0.85, _turnover(rng)),
+        "residential_status": residential_status,
+        "residential_status_other": "HOSTEL" if residential_status == ResidentialStatus.OTHER.value else None,
+        "residing_since": _maybe(rng, 0.4, str(rng.randint(1990, 2025))),
+        "has_next_of_kin": has_next_of_kin,
+        "next_of_kin_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}" if has_next_of_kin else None,
+        "next_of_kin_relation": rng.choice(RELATIONS) if has_next_of_kin else None,
+        "next_of_kin_cnic": _cnic(3520100000000 + rng.randrange(10 ** 8)) if has_next_of_kin else None,
+        "next_of_kin_relationship": rng.choice(("FATHER", "MOTHER", "SPOUSE", "SIBLING")) if has_next_of_kin else None,
+        "next_of_kin_contact_no": f"03{rng.randint(0, 999999999):09d}" if has_next_of_kin else None,
+        "next_of_kin_address": None,
+        "next_of_kin_email": None,
+        "internet_banking": internet_banking,
+        "mobile_banking": rng.random() < (0.75 if internet_banking else 0.35),
+        "check_book": rng.random() < 0.4,
+        "sms_alerts": rng.random() < 0.6,
+        "card_type": card_type,
+        "card_network": rng.choice(CARD_NETWORKS) if card_type else None,
+        "zakat_deduction": rng.random() < 0.3,
+    }
+
+
+def generate_rows(count: int, seed: int, start: int = 0) -> Iterator[dict]:
+    """Table rows (payload + account_no, iban, profile_completeness_score) for ids start+1 .. start+count"""
+    rng = random.Random(seed)
+    for index in range(start, start + count):
+        row = generate_application(rng, index)
+        row["account_no"] = account_number_from_sequence(index + 1)
+        row["iban"] = iban_from_account_number(row["account_no"], IBAN_BANK_CODE)
+        row["profile_completeness_score"] = AccountApplication.compute_profile_score(SimpleNamespace(**row))
+        yield row
+
+
+def load_sqlite(path: str, count: int, seed: int, batch_size: int = 10_000) -> dict:
+    """Create a fresh SQLite database at `path` holding `count` generated applications"""
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+
+    # Drop the indexes for the load and rebuild them once at the end
+    table = AccountApplication.__table__
+    for index in table.indexes:
+        index.drop(engine)
+
+    started = time.perf_counter()
+    columns = [column.name for column in table.columns if column.name != "id"]
+    statement = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    batch = []
+    for row in generate_rows(count, seed):
+        batch.append(tuple(row.get(column) for column in columns))
+        if len(batch) >= batch_size:
+            connection.executemany(statement, batch)
+            batch.clear()
+    if batch:
+        connection.executemany(statement, batch)
+    connection.commit()
+    connection.close()
+    insert_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    ensure_indexes(engine)
+    with Session(engine) as session:
+        # Continue the account number sequence after the generated rows
+        session.add(NumberSequence(name="account_number", next_value=count + 1))
+        session.commit()
+        AnalyticsCounter.rebuild(session)
+    engine.dispose()
+    return {
+        "rows": count,
+        "seed": seed,
+        "insert_seconds": round(insert_seconds, 3),
+        "index_and_counter_seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a SQLite database of synthetic account applications")
+    parser.add_argument("--rows", type=parse_rows, default="1k", help="row count or one of: " + ", ".join(SCALES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="output path (default benchmarks/data/bench-<rows>-<seed>.db)")
+    args = parser.parse_args(argv)
+    path = args.db or default_db_path(args.rows, args.seed)
+    print(load_sqlite(path, args.rows, args.seed))
+
+
+if __name__ == "__main__":
+    main()
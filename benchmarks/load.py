@@ -0,0 +1,247 @@
+"""
+Mixed-workload load test.
+
+Closed-loop async workers send a weighted mix of requests, either in-process through
+the ASGI app (default; a copy of the generated SQLite database is used so every run
+starts from the same data) or against a running server with --url. Each concurrency
+stage runs for --duration seconds and reports throughput, error rate and latency
+percentiles per request kind and overall.
+
+Usage:
+    python -m benchmarks.load --rows 100k --concurrency 1,8,32 --duration 10 --output benchmarks/results/load.json
+    python -m benchmarks.load --url http://127.0.0.1:4444 --mix create=20,lookup_cnic=50,analytics=30
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from benchmarks import default_db_path, parse_rows
+
+
+DEFAULT_MIX = "create=10,lookup_cnic=30,lookup_iban=20,dashboard=15,analytics=25"
+MIX_KINDS = ("create", "lookup_cnic", "lookup_iban", "dashboard", "analytics")
+ANALYTICS_SKIP = ("/analytics/cache-stats",)
+
+
+def parse_mix(value: str) -> dict:
+    """'create=10,lookup_cnic=30' -> {'create': 10.0, 'lookup_cnic': 30.0}"""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in MIX_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown mix entry {kind!r}; choose from {', '.join(MIX_KINDS)}")
+        mix[kind] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("mix weights must not all be zero")
+    return mix
+
+
+def _percentile(samples: list, percentile: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summary(latencies: list, statuses: Counter, elapsed: float) -> dict:
+    count = len(latencies)
+    errors = sum(n for status, n in statuses.items() if not (isinstance(status, int) and status < 400))
+    summary = {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0,
+        "throughput_rps": round(count / elapsed, 2) if elapsed else 0,
+        "status_codes": {str(status): n for status, n in sorted(statuses.items(), key=lambda item: str(item[0]))},
+    }
+    if latencies:
+        summary.update({
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+            "max_ms": round(max(latencies) * 1000, 3),
+        })
+    return summary
+
+
+class Workload:
+    """Builds the next request for a kind from sampled keys and the seeded RNG"""
+
+    def __init__(self, mix: dict, seed: int, lookups: list, analytics_paths: list, first_create_index: int):
+        self.kinds = list(mix)
+        self.weights = list(mix.values())
+        self.rng = random.Random(seed)
+        self.lookups = lookups
+        self.analytics_paths = analytics_paths
+        self.create_index = first_create_index
+
+    def next_request(self):
+        from benchmarks.generator import generate_application
+
+        kind = self.rng.choices(self.kinds, weights=self.weights)[0]
+        if kind == "create":
+            self.create_index += 1
+            return kind, "POST", "/account-applications", generate_application(self.rng, self.create_index)
+        if kind == "lookup_cnic":
+            return kind, "GET", f"/account-applications/search/cnic/{self.rng.choice(self.lookups)['cnic_no']}", None
+        if kind == "lookup_iban":
+            return kind, "GET", f"/account-applications/search/iban/{self.rng.choice(self.lookups)['iban']}", None
+        if kind == "dashboard":
+            return kind, "GET", "/analytics/dashboard", None
+        return kind, "GET", self.rng.choice(self.analytics_paths), None
+
+
+async def run_stage(client, workload: Workload, concurrency: int, duration: float) -> dict:
+    latencies = {kind: [] for kind in workload.kinds}
+    statuses = {kind: Counter() for kind in workload.kinds}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            kind, method, url, body = workload.next_request()
+            started = time.perf_counter()
+            try:
+                status = (await client.request(method, url, json=body)).status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies[kind].append(time.perf_counter() - started)
+            statuses[kind][status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [latency for samples in latencies.values() for latency in samples]
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "overall": _summary(all_latencies, sum(statuses.values(), Counter()), elapsed),
+        "by_kind": {kind: _summary(latencies[kind], statuses[kind], elapsed) for kind in workload.kinds},
+    }
+
+
+def _analytics_paths() -> list:
+    from fastapi.routing import APIRoute
+    from routes.routes import router
+
+    paths = []
+    for route in router.routes:
+        if isinstance(route, APIRoute) and route.path.startswith("/analytics/") and "GET" in route.methods \
+                and route.path not in ANALYTICS_SKIP:
+            paths.append(route.path.format(segment="business_owners"))
+    return paths
+
+
+async def run(args, client) -> list:
+    sample = await client.get("/account-applications/paginated", params={"limit": args.lookup_keys})
+    lookups = sample.json()["items"]
+    if not lookups:
+        raise SystemExit("The database has no applications to look up; generate data first")
+    count = (await client.get("/account-applications/count")).json()["total_applications"]
+
+    stages = []
+    for stage, concurrency in enumerate(args.concurrency):
+        # CNIC indexes far past the generated rows (and previous stages) so creates never collide
+        workload = Workload(args.mix, args.seed + stage, lookups, _analytics_paths(), 10 ** 9 + count + stage * 10 ** 7)
+        result = await run_stage(client, workload, concurrency, args.duration)
+        stages.append(result)
+        overall = result["overall"]
+        print(
+            f"concurrency {concurrency:>4}: {overall['throughput_rps']:>9.1f} req/s  "
+            f"p50 {overall.get('p50_ms', 0):>8.2f} ms  p95 {overall.get('p95_ms', 0):>8.2f} ms  "
+            f"p99 {overall.get('p99_ms', 0):>8.2f} ms  errors {overall['error_rate']:.2%}",
+            file=sys.stderr
+        )
+    return stages
+
+
+async def run_in_process(args) -> list:
+    import httpx
+    import main as app_module
+
+    # Unhandled errors become 500 responses, as they would behind a server
+    transport = httpx.ASGITransport(app=app_module.app, raise_app_exceptions=False)
+    async with app_module.app.router.lifespan_context(app_module.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            return await run(args, client)
+
+
+async def run_remote(args) -> list:
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, timeout=None, limits=limits) as client:
+        return await run(args, client)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Mixed-workload load test reporting latency percentiles")
+    parser.add_argument("--url", default=None, help="target a running server instead of the in-process app")
+    parser.add_argument("--rows", default="1k", help="dataset for in-process runs: row count or 1k, 100k, 1M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=None, help="source database (copied per run; default benchmarks/data/bench-<rows>-<seed>.db)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"request weights (default {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=lambda value: [int(part) for part in value.split(",")], default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency stage")
+    parser.add_argument("--lookup-keys", type=int, default=1000, help="applications sampled for CNIC/IBAN lookups")
+    parser.add_argument("--no-cache", action="store_true", help="disable the analytics response cache (in-process only)")
+    parser.add_argument("--output", default=None, help="JSON report path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    workdir = None
+    if args.url:
+        stages = asyncio.run(run_remote(args))
+    else:
+        rows = parse_rows(args.rows)
+        source = args.db or default_db_path(rows, args.seed)
+        workdir = tempfile.mkdtemp(prefix="load-")
+        path = os.path.join(workdir, "load.db")
+
+        # Configure the app before anything imports db.connection
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+        if args.no_cache:
+            os.environ["ANALYTICS_CACHE_MAX_BYTES"] = "0"
+
+        from benchmarks.generator import load_sqlite
+
+        if not os.path.exists(source):
+            load_sqlite(source, rows, args.seed)
+        shutil.copyfile(source, path)
+        try:
+            stages = asyncio.run(run_in_process(args))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "target": args.url or "in-process",
+        "rows": None if args.url else parse_rows(args.rows),
+        "seed": args.seed,
+        "mix": args.mix,
+        "duration_s": args.duration,
+        "cache": not args.no_cache,
+        "db_async": os.getenv("DB_ASYNC", "false"),
+        "stages": stages,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Time every route in routes/routes.py through the ASGI app, in-process.
+
+A seeded database is generated (or reused) for the requested scale, then each route
+is called `--repeat` times. Write routes create, update and delete their own rows, so
+the dataset is unchanged at the end of the run. Results are written as JSON so runs
+can be compared across commits.
+
+The analytics response cache is disabled unless --cache is given, so every call
+measures the query path.
+
+Usage:
+    python -m benchmarks.routes --rows 1k --repeat 5 --output benchmarks/results/1k.json
+    python -m benchmarks.routes --rows 1M --max-seconds 30 --skip /account-applications$
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks import default_db_path, parse_rows
+
+
+def _percentile(samples: list, percentile: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _server_timing_statements(header: str) -> int:
+    match = re.search(r'"(\d+) queries', header or "")
+    return int(match.group(1)) if match else None
+
+
+def _path_values(client) -> dict:
+    """Values for path parameters, taken from the first application"""
+    first = client.get("/account-applications/paginated", params={"limit": 1}).json()["items"][0]
+    return {
+        "application_id": first["id"],
+        "cnic_no": first["cnic_no"],
+        "account_type": first["account_type"],
+        "city": first["city"] or "KARACHI",
+        "account_no": first["account_no"],
+        "iban": first["iban"],
+        "segment": "business_owners",
+        "job_id": 0,  # replaced by the job POST /ocr/jobs submits
+    }
+
+
+def _time_call(client, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    response = client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - started
+    return response, elapsed
+
+
+def benchmark_routes(client, repeat: int, max_seconds: float, skip: list, seed: int, rows: int) -> list:
+    import random
+    from fastapi.routing import APIRoute
+    from benchmarks.generator import generate_application
+    from routes.routes import router
+
+    values = _path_values(client)
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "form.pdf"), "rb") as f:
+        blank_form = f.read()
+    rng = random.Random(seed + 1)
+    # CNIC indexes past the generated rows so created applications never collide
+    next_index = [rows + 1_000_000]
+
+    def new_payload() -> dict:
+        next_index[0] += 1
+        return generate_application(rng, next_index[0])
+
+    results = []
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        for method in sorted(route.methods):
+            label = f"{method} {route.path}"
+            if any(re.search(pattern, route.path) for pattern in skip):
+                results.append({"route": label, "skipped": "--skip"})
+                continue
+
+            samples, statuses, statements, sizes = [], set(), [], []
+            for _ in range(repeat):
+                # Each write call works on a row it created itself
+                kwargs = {}
+                path_values = dict(values)
+                if method == "POST" and route.path.endswith("/extract"):
+                    # The blank form: full extraction, nothing created
+                    kwargs["files"] = {"file": ("form.pdf", blank_form, "application/pdf")}
+                elif method == "POST" and route.path == "/ocr/jobs":
+                    # Times the submission only; the blank form is extracted in the background
+                    kwargs["files"] = [("files", ("form.pdf", blank_form, "application/pdf"))]
+                    kwargs["params"] = {"create": "false"}
+                elif method == "POST" and route.path.endswith("/bulk"):
+                    kwargs["json"] = [new_payload() for _ in range(100)]
+                elif method == "POST":
+                    kwargs["json"] = new_payload()
+                elif method in ("PUT", "DELETE"):
+                    created = client.post("/account-applications", json=new_payload()).json()
+                    path_values["application_id"] = created["id"]
+                    if method == "PUT":
+                        kwargs["json"] = {**created, "city": "QUETTA"}
+                url = route.path.format(**path_values)
+
+                response, elapsed = _time_call(client, method, url, **kwargs)
+                samples.append(elapsed)
+                statuses.add(response.status_code)
+                statements.append(_server_timing_statements(response.headers.get("server-timing")))
+                sizes.append(len(response.content))
+
+                if route.path == "/ocr/jobs" and response.status_code == 202:
+                    values["job_id"] = response.json()["id"]
+                elif method == "POST" and response.status_code == 200 and "files" not in kwargs:
+                    created_ids = [item["id"] for item in response.json()["results"] if item["status"] == "created"] \
+                        if route.path.endswith("/bulk") else [response.json()["id"]]
+                    for application_id in created_ids:
+                        client.delete(f"/account-applications/{application_id}")
+                elif method == "PUT":
+                    client.delete(f"/account-applications/{path_values['application_id']}")
+                if elapsed > max_seconds:
+                    break
+
+            results.append({
+                "route": label,
+                "url": url,
+                "status": sorted(statuses),
+                "runs": len(samples),
+                "min_ms": round(min(samples) * 1000, 3),
+                "p50_ms": round(statistics.median(samples) * 1000, 3),
+                "p95_ms": round(_percentile(samples, 95) * 1000, 3),
+                "max_ms": round(max(samples) * 1000, 3),
+                "statements": statements[-1],
+                "response_bytes": sizes[-1],
+            })
+            print(f"{label:70s} p50 {results[-1]['p50_ms']:>10.2f} ms  {results[-1]['status']}", file=sys.stderr)
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Time every API route against a generated dataset")
+    parser.add_argument("--rows", default="1k", help="row count or one of: 1k, 100k, 1M")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=60.0, help="stop repeating a route once one call exceeds this")
+    parser.add_argument("--skip", action="append", default=[], help="regex of route paths to skip (repeatable)")
+    parser.add_argument("--cache", action="store_true", help="keep the analytics response cache enabled")
+    parser.add_argument("--db", default=None, help="database path (default benchmarks/data/bench-<rows>-<seed>.db)")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild the database even if it exists")
+    parser.add_argument("--output", default=None, help="JSON results path (default: stdout)")
+    args = parser.parse_args(argv)
+
+    rows = parse_rows(args.rows)
+    path = args.db or default_db_path(rows, args.seed)
+
+    # Configure the app before anything imports db.connection
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+    if not args.cache:
+        os.environ["ANALYTICS_CACHE_MAX_BYTES"] = "0"
+
+    from benchmarks.generator import load_sqlite
+
+    load = None
+    if args.regenerate or not os.path.exists(path):
+        load = load_sqlite(path, rows, args.seed)
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+
+    # Record failing routes as 500s instead of aborting the run
+    with TestClient(app_module.app, raise_server_exceptions=False) as client:
+        results = benchmark_routes(client, args.repeat, args.max_seconds, args.skip, args.seed, rows)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "rows": rows,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "cache": args.cache,
+        "analytics_counters": os.getenv("ANALYTICS_COUNTERS", "true"),
+        "db_async": os.getenv("DB_ASYNC", "false"),
+        "load": load,
+        "routes": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
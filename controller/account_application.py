@@ -1,42 +1,42 @@
+import csv
+import io
+import json
 from sqlmodel import Session
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
 from fastapi import HTTPException
+from db.connection import engine
 from model import AccountApplicationCreate, AccountType
-from db.schemas import AccountApplication
-from typing import List, Optional
-from utils.validations import generate_account_number, generate_iban
+from db.schemas import (
+    AccountApplication, OcrJob, KEYSET_SORT_KEYS, PROFILE_FIELDS, CUSTOMER_SEGMENTS, COUNTER_FLAGS,
+    CUBE_DIMENSIONS, CUBE_FILTERS, CUBE_MEASURES, CUBE_MAX_DIMENSIONS
+)
+from typing import Iterator, List, Optional
+from db.sequences import allocate_account_identifiers
+from ocr import MAX_PDF_BYTES
+from ocr.jobs import QueueFull, RETRY_AFTER_SECONDS, job_queue
+from utils.cache import note_write
+from utils.pagination import decode_cursor, next_cursor
+
+
+def create_account_application(application_create: AccountApplicationCreate, session: Session) -> dict:
+    """Create a new account application using model SQL query
+
+    The payload was validated once as AccountApplicationCreate; the stored row is
+    returned as a dict straight from INSERT ... RETURNING.
+    """
+    try:
+        row = application_create.model_dump(mode="json")
 
+        # Allocate account number and IBAN from this process's reserved block
+        row["account_no"], row["iban"] = allocate_account_identifiers()[0]
 
-def create_account_application(application_create: AccountApplicationCreate, session: Session) -> AccountApplication:
-    """Create a new account application using model SQL query"""
-    print("API called with data:", application_create.model_dump())
-    try:
-        # Get data and convert enums to their string values
-        data = application_create.model_dump()
-        
-        # Convert enum fields to string values
-        if data.get('marital_status'):
-            data['marital_status'] = data['marital_status'].value if hasattr(data['marital_status'], 'value') else data['marital_status']
-        if data.get('gender'):
-            data['gender'] = data['gender'].value if hasattr(data['gender'], 'value') else data['gender']
-        if data.get('occupation'):
-            data['occupation'] = data['occupation'].value if hasattr(data['occupation'], 'value') else data['occupation']
-        if data.get('residential_status'):
-            data['residential_status'] = data['residential_status'].value if hasattr(data['residential_status'], 'value') else data['residential_status']
-        if data.get('account_type'):
-            data['account_type'] = data['account_type'].value if hasattr(data['account_type'], 'value') else data['account_type']
-        if data.get('card_type'):
-            data['card_type'] = data['card_type'].value if hasattr(data['card_type'], 'value') else data['card_type']
-        if data.get('card_network'):
-            data['card_network'] = data['card_network'].value if hasattr(data['card_network'], 'value') else data['card_network']
-        
-        # Convert to full AccountApplication model
-        application_data = AccountApplication(**data)
-
-        # Generate account number and IBAN
-        application_data.account_no = generate_account_number()
-        application_data.iban = generate_iban()
-
-        return AccountApplication.create(session, application_data)
+        application = AccountApplication.create(session, row)
+        note_write()
+        return application
+    except IntegrityError as e:
+        session.rollback()
+        raise HTTPException(status_code=409, detail=_duplicate_detail(e))
     except Exception as e:
         print(f"Error creating application: {e}")
         import traceback
@@ -44,6 +44,144 @@ def create_account_application(application_create: AccountApplicationCreate, ses
         raise
 
 
+def create_account_applications_bulk(items: List[dict], session: Session, chunk_size: int = 500) -> dict:
+    """Validate a batch of applications and insert the valid ones in a single transaction
+
+    Each item is validated independently; invalid items (including CNICs already
+    registered or repeated within the batch) are reported and the rest are inserted.
+    """
+    results = [None] * len(items)
+    rows = []
+    row_indexes = []
+    seen_cnics = set()
+
+    for index, item in enumerate(items):
+        try:
+            application_create = AccountApplicationCreate.model_validate(item)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "error", "errors": e.errors(include_url=False, include_context=False)}
+            continue
+        if application_create.cnic_no in seen_cnics:
+            results[index] = {"index": index, "status": "error", "errors": [{"msg": "Duplicate CNIC within batch"}]}
+            continue
+        seen_cnics.add(application_create.cnic_no)
+
+        rows.append(application_create.model_dump(mode="json"))
+        row_indexes.append(index)
+
+    # One IN query per chunk for CNICs that are already registered
+    existing = set()
+    for start in range(0, len(rows), chunk_size):
+        existing |= AccountApplication.existing_cnics(session, [row["cnic_no"] for row in rows[start:start + chunk_size]])
+    for row, index in zip(rows, row_indexes):
+        if row["cnic_no"] in existing:
+            results[index] = {"index": index, "status": "error", "errors": [{"msg": "An account application with this CNIC already exists"}]}
+    insert_rows = [(row, index) for row, index in zip(rows, row_indexes) if row["cnic_no"] not in existing]
+    for (row, _), (account_no, iban) in zip(insert_rows, allocate_account_identifiers(len(insert_rows))):
+        row["account_no"] = account_no
+        row["iban"] = iban
+
+    try:
+        ids = AccountApplication.bulk_create(session, [row for row, _ in insert_rows], chunk_size)
+    except IntegrityError as e:
+        session.rollback()
+        raise HTTPException(status_code=409, detail=_duplicate_detail(e))
+    if ids:
+        note_write()
+
+    for (row, index), application_id in zip(insert_rows, ids):
+        results[index] = {
+            "index": index,
+            "status": "created",
+            "id": application_id,
+            "account_no": row["account_no"],
+            "iban": row["iban"]
+        }
+
+    created = len(ids)
+    return {
+        "total": len(items),
+        "created": created,
+        "failed": len(items) - created,
+        "results": results
+    }
+
+
+def extract_account_application(pdf_bytes: bytes, create: bool, session: Session) -> dict:
+    """Read a filled account-opening form PDF into an application, optionally creating it
+
+    The extracted values are always returned with their per-field confidence; the
+    application is created only when `create` is set and the values pass validation.
+    """
+    from ocr import ExtractionError, extract_application
+
+    if len(pdf_bytes) > MAX_PDF_BYTES:
+        raise HTTPException(status_code=413, detail=f"PDF must not exceed {MAX_PDF_BYTES} bytes")
+    try:
+        extraction = extract_application(pdf_bytes)
+    except ExtractionError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return apply_extraction(extraction, create, session)
+
+
+def apply_extraction(extraction: dict, create: bool, session: Session) -> dict:
+    """Validate extracted form values and create the application when asked and valid"""
+    result = {
+        "application": extraction["fields"],
+        "confidence": extraction["confidence"],
+        "page": extraction["page"],
+        "valid": True,
+        "errors": [],
+        "created": None
+    }
+    try:
+        application_create = AccountApplicationCreate.model_validate(extraction["fields"])
+    except ValidationError as e:
+        result["valid"] = False
+        result["errors"] = e.errors(include_url=False, include_context=False)
+        return result
+
+    result["application"] = application_create.model_dump(mode="json")
+    if create:
+        result["created"] = create_account_application(application_create, session)
+    return result
+
+
+def submit_ocr_job(documents: List[tuple], create: bool, session: Session) -> dict:
+    """Queue (filename, PDF bytes) documents for background extraction"""
+    if not job_queue.running:
+        raise HTTPException(status_code=503, detail="The OCR job queue is not running")
+    if not documents:
+        raise HTTPException(status_code=400, detail="Upload at least one PDF")
+    if len(documents) > job_queue.max_documents:
+        raise HTTPException(status_code=413, detail=f"A job holds at most {job_queue.max_documents} documents")
+    for filename, content in documents:
+        if len(content) > MAX_PDF_BYTES:
+            raise HTTPException(status_code=413, detail=f"{filename}: PDF must not exceed {MAX_PDF_BYTES} bytes")
+    try:
+        job = job_queue.submit(session, documents, create)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return OcrJob.get_status(session, job.id)
+
+
+def get_ocr_job(job_id: int, session: Session) -> dict:
+    """Progress, per-document results and created application ids of an OCR job"""
+    job = OcrJob.get_status(session, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
+
+
+def _duplicate_detail(error: IntegrityError) -> str:
+    """Name the unique field (CNIC, account number or IBAN) that caused a conflict"""
+    message = str(error.orig)
+    for column, label in (("cnic_no", "CNIC"), ("account_no", "account number"), ("iban", "IBAN")):
+        if column in message:
+            return f"An account application with this {label} already exists"
+    return "Account application conflicts with an existing record"
+
+
 def get_account_applications(session: Session) -> List[AccountApplication]:
     """Retrieve all account applications using model SQL query"""
     return AccountApplication.get_all(session)
@@ -60,9 +198,14 @@ def get_account_application_by_id(application_id: int, session: Session) -> Acco
 def update_account_application(application_id: int, updated_application: AccountApplication, session: Session) -> AccountApplication:
     """Update an existing account application using model SQL query"""
     update_data = updated_application.model_dump(exclude_unset=True, exclude={'id'})
-    application = AccountApplication.update_by_id(session, application_id, update_data)
+    try:
+        application = AccountApplication.update_by_id(session, application_id, update_data)
+    except IntegrityError as e:
+        session.rollback()
+        raise HTTPException(status_code=409, detail=_duplicate_detail(e))
     if not application:
         raise HTTPException(status_code=404, detail="Account application not found")
+    note_write()
     return application
 
 
@@ -71,6 +214,7 @@ def delete_account_application(application_id: int, session: Session) -> dict:
     success = AccountApplication.delete_by_id(session, application_id)
     if not success:
         raise HTTPException(status_code=404, detail="Account application not found")
+    note_write()
     return {"message": "Account application deleted successfully"}
 
 
@@ -99,9 +243,22 @@ def get_total_applications_count(session: Session) -> int:
     return AccountApplication.count_total(session)
 
 
-def get_paginated_applications(skip: int = 0, limit: int = 10, session: Session = None) -> List[AccountApplication]:
-    """Get paginated account applications"""
-    return AccountApplication.get_paginated(session, skip, limit)
+def get_paginated_applications(skip: int = 0, limit: int = 10, session: Session = None,
+                               sort: str = "id", after: Optional[str] = None) -> dict:
+    """Get a page of account applications ("items") and the cursor for the next page ("next_cursor")"""
+    if sort not in KEYSET_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort key. Allowed: {', '.join(KEYSET_SORT_KEYS)}")
+    position = None
+    if after:
+        try:
+            cursor_sort, key, last_id = decode_cursor(after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if cursor_sort != sort:
+            raise HTTPException(status_code=400, detail="Cursor was issued for a different sort key")
+        position = (key, last_id)
+    applications = AccountApplication.get_page_after(session, limit, sort, position, skip)
+    return {"items": applications, "next_cursor": next_cursor(applications, limit, sort)}
 
 
 def get_application_by_account_number(account_no: str, session: Session) -> Optional[AccountApplication]:
@@ -114,6 +271,42 @@ def get_application_by_iban(iban: str, session: Session) -> Optional[AccountAppl
     return AccountApplication.get_by_iban(session, iban)
 
 
+def export_applications(export_format: str, chunk_size: int = 1000, **filters) -> Iterator[str]:
+    """Stream matching applications as NDJSON or CSV text chunks.
+
+    Opens its own session because the response body is produced after the request's
+    session dependency has been closed.
+    """
+    if export_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Invalid export format. Allowed: ndjson, csv")
+    if filters.get("account_type"):
+        try:
+            filters["account_type"] = AccountType(filters["account_type"].upper()).value
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid account type")
+    if filters.get("city"):
+        filters["city"] = filters["city"].upper()
+
+    def generate() -> Iterator[str]:
+        columns = [column.name for column in AccountApplication.__table__.columns]
+        if export_format == "csv":
+            yield _csv_lines([columns])
+        with Session(engine) as session:
+            for rows in AccountApplication.stream_rows(session, chunk_size, **filters):
+                if export_format == "csv":
+                    yield _csv_lines([[row[column] for column in columns] for row in rows])
+                else:
+                    yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+
+    return generate()
+
+
+def _csv_lines(rows: List[list]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
 # Analytics Functions
 def get_analytics_by_account_type(session: Session) -> dict:
     """Get count of applications grouped by account type"""
@@ -227,18 +420,7 @@ def get_kin_analytics(session: Session) -> dict:
 
 def get_dashboard_summary(session: Session) -> dict:
     """Get comprehensive dashboard summary with all analytics"""
-    total = AccountApplication.count_total(session)
-    
-    return {
-        "total_applications": total,
-        "account_types": AccountApplication.count_by_account_type(session),
-        "gender_distribution": AccountApplication.count_by_gender(session),
-        "card_types": AccountApplication.count_by_card_type(session),
-        "card_networks": AccountApplication.count_by_card_network(session),
-        "top_cities": dict(list(AccountApplication.count_by_city(session).items())[:10]),
-        "services_adoption": AccountApplication.get_services_stats(session),
-        "kin_stats": AccountApplication.get_kin_stats(session)
-    }
+    return AccountApplication.get_dashboard_stats(session)
 
 
 # ==================== ADVANCED ANALYTICS FUNCTIONS ====================
@@ -450,6 +632,11 @@ def get_high_value_customer_insights(session: Session, threshold: float = 500000
     }
 
 
+def get_high_value_threshold_histogram(session: Session) -> dict:
+    """Turnover histogram for moving the high-value threshold without a rescan"""
+    return AccountApplication.get_turnover_histogram(session)
+
+
 def get_profile_completeness_analytics(session: Session) -> dict:
     """Analyze profile completeness with improvement recommendations"""
     data = AccountApplication.get_profile_completeness(session)
@@ -472,6 +659,32 @@ def get_profile_completeness_analytics(session: Session) -> dict:
     }
 
 
+def get_incomplete_profiles_list(session: Session, below_percentage: float = 50, limit: int = 50,
+                                 after: Optional[str] = None) -> dict:
+    """List applications whose profile completeness is below a percentage, for follow-up"""
+    position = None
+    if after:
+        try:
+            _, key, last_id = decode_cursor(after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        position = (key, last_id)
+    applications = AccountApplication.get_incomplete_profiles(session, below_percentage, limit, position)
+    return {
+        "below_percentage": below_percentage,
+        "items": [
+            {
+                "id": app.id,
+                "name": app.name,
+                "cnic_no": app.cnic_no,
+                "completeness_percentage": round((app.profile_completeness_score / len(PROFILE_FIELDS)) * 100, 2)
+            }
+            for app in applications
+        ],
+        "next_cursor": next_cursor(applications, limit, "profile_completeness_score")
+    }
+
+
 def get_customer_segmentation(session: Session) -> dict:
     """Customer segmentation with actionable insights"""
     data = AccountApplication.get_customer_segments(session)
@@ -501,6 +714,79 @@ def get_customer_segmentation(session: Session) -> dict:
     }
 
 
+def get_customer_segment_members(segment: str, session: Session, after_id: int = 0, limit: int = 100) -> dict:
+    """Paginated member ids of one customer segment"""
+    if segment not in CUSTOMER_SEGMENTS:
+        raise HTTPException(status_code=404, detail=f"Unknown segment. Allowed: {', '.join(CUSTOMER_SEGMENTS)}")
+    member_ids = AccountApplication.get_segment_member_ids(session, segment, after_id, limit)
+    return {
+        "segment": segment,
+        "member_ids": member_ids,
+        "next_after_id": member_ids[-1] if len(member_ids) == limit else None
+    }
+
+
+def _cube_names(text: str, allowed: tuple, kind: str) -> List[str]:
+    """Comma-separated names, each checked against a whitelist"""
+    names = [name.strip() for name in text.split(",") if name.strip()]
+    for name in names:
+        if name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown {kind} '{name}'. Allowed: {', '.join(allowed)}")
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail=f"Each {kind} may only be given once")
+    return names
+
+
+def _cube_filters(text: Optional[str]) -> dict:
+    """Parse `column:value|value,column:value` into {column: [values]}"""
+    filters = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        column, separator, values = part.partition(":")
+        column = column.strip()
+        if not separator or column not in CUBE_FILTERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Filters are column:value|value,... with a column from: {', '.join(CUBE_FILTERS)}"
+            )
+        values = [value.strip().upper() for value in values.split("|") if value.strip()]
+        if column in COUNTER_FLAGS:
+            if not set(values) <= {"TRUE", "FALSE"}:
+                raise HTTPException(status_code=400, detail=f"Filter '{column}' takes true or false")
+            values = [value == "TRUE" for value in values]
+        filters.setdefault(column, []).extend(values)
+    return filters
+
+
+def get_cube_analytics(session: Session, dims: str, measures: str, filters: Optional[str] = None) -> dict:
+    """Group-by cube: whitelisted measures per combination of dimension values, one grouped query"""
+    dimensions = _cube_names(dims, CUBE_DIMENSIONS, "dimension")
+    if len(dimensions) > CUBE_MAX_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"At most {CUBE_MAX_DIMENSIONS} dimensions")
+    measure_names = _cube_names(measures, CUBE_MEASURES, "measure")
+    if not measure_names:
+        raise HTTPException(status_code=400, detail=f"At least one measure. Allowed: {', '.join(CUBE_MEASURES)}")
+    parsed_filters = _cube_filters(filters)
+
+    rows = AccountApplication.get_cube(session, dimensions, measure_names, parsed_filters)
+    return {
+        "dims": dimensions,
+        "measures": measure_names,
+        "filters": parsed_filters,
+        "cells": [
+            {
+                **dict(zip(dimensions, row)),
+                **{
+                    measure: value if measure == "count" or value is None else round(float(value), 2)
+                    for measure, value in zip(measure_names, row[len(dimensions):])
+                }
+            }
+            for row in rows
+        ]
+    }
+
+
 def get_executive_summary(session: Session) -> dict:
     """Generate executive summary with key business metrics and insights"""
     total = AccountApplication.count_total(session)
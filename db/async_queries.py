@@ -0,0 +1,40 @@
+"""
+Async access to the model query classmethods.
+
+The classmethods in db/schemas.py take a sync Session. AsyncSession.run_sync runs
+them on the async connection through SQLAlchemy's greenlet bridge, so every query
+method gets an awaitable twin without duplicating the SQL:
+
+    await AsyncAccountApplication.get_by_cnic(async_session, "12345-1234567-1")
+"""
+from typing import Any, Callable
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db.schemas import AccountApplication, AnalyticsCounter
+
+
+async def run_sync(session: AsyncSession, func: Callable, *args, **kwargs) -> Any:
+    """Await func(sync_session, *args, **kwargs) on an AsyncSession"""
+    return await session.run_sync(lambda sync_session: func(sync_session, *args, **kwargs))
+
+
+class AsyncQueries:
+    """Awaitable facade over a model's `(cls, session, ...)` query classmethods"""
+
+    def __init__(self, model: type):
+        self.model = model
+
+    def __getattr__(self, name: str) -> Callable:
+        method = getattr(self.model, name)
+
+        async def query(session: AsyncSession, *args, **kwargs):
+            return await run_sync(session, method, *args, **kwargs)
+
+        query.__name__ = name
+        query.__doc__ = method.__doc__
+        return query
+
+
+AsyncAccountApplication = AsyncQueries(AccountApplication)
+AsyncAnalyticsCounter = AsyncQueries(AnalyticsCounter)
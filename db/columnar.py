@@ -0,0 +1,671 @@
+"""
+In-memory columnar copy of the analytic columns of AccountApplication (ANALYTICS_COLUMNAR=true).
+
+The columns are loaded once from the primary database into NumPy arrays. Dimensions
+(the counter dimensions, the credit turnover bucket and the profile score) are stored
+as small-int codes into a per-dimension dictionary, together with a bitmap of the rows
+holding each value and running counts and turnover sums per value. Turnovers are
+float64 (NaN for NULL) and the service/kin flags and profile checks are bitmaps.
+Row sets are packed bitsets, so a filter is a few word-wise AND/OR operations and a
+count is a popcount; grouped sums read the running aggregates.
+
+Every write committed by AccountApplication.create / bulk_create / update_by_id /
+delete_by_id is applied to the arrays, and the analytics classmethods answer from them,
+returning the same results as their SQL queries.
+
+The store is per process, like the response cache: writes handled by another process
+(another API worker, `python -m db.manage`) are only seen after a restart.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise RuntimeError(f"ANALYTICS_COLUMNAR=true requires numpy: {e}") from None
+
+from db.connection import engine
+from db.schemas import (
+    AccountApplication, COUNTER_DIMENSIONS, COUNTER_FLAGS, CUSTOMER_SEGMENTS, PROFILE_FIELDS,
+    TURNOVER_BUCKET_DIMENSION, TURNOVER_BUCKET_EDGES
+)
+
+
+SCORE_DIMENSION = "profile_completeness_score"
+# Read from the table; the turnover bucket is derived from the credit turnover
+DIMENSIONS = COUNTER_DIMENSIONS + (TURNOVER_BUCKET_DIMENSION, SCORE_DIMENSION)
+TURNOVERS = ("expected_monthly_turnover_dr", "expected_monthly_turnover_cr")
+# Turnover of each CUBE_MEASURES suffix
+SIDES = {"dr": 0, "cr": 1}
+# Bitmaps: the boolean columns, then one per profile check
+FLAGS = COUNTER_FLAGS + PROFILE_FIELDS
+FLAG_INDEX = {flag: index for index, flag in enumerate(COUNTER_FLAGS)}
+PROFILE_INDEX = {field: len(COUNTER_FLAGS) + index for index, field in enumerate(PROFILE_FIELDS)}
+# Dimension codes start as uint8 and widen when a dimension outgrows them
+CODE_DTYPES = (np.uint8, np.uint16, np.uint32)
+WORD = np.dtype("<u8")
+LOAD_CHUNK_SIZE = 50000
+# Deleted rows are dropped from the arrays once they outnumber the live ones
+COMPACT_MIN_DELETED = 1024
+# Words scanned at a time when listing the members of a row set
+SCAN_BLOCK_WORDS = 1024
+# Cubes with more possible groups than this are grouped by sorting rather than dense arrays
+CUBE_MAX_CELLS = 1 << 20
+
+_EDGES = np.array(TURNOVER_BUCKET_EDGES, dtype=np.float64)
+_EDGE_LABELS = np.array([str(edge) for edge in TURNOVER_BUCKET_EDGES], dtype=object)
+
+
+def _words(rows: int) -> int:
+    return (rows + 63) // 64
+
+
+def _pack(mask: np.ndarray, words: int) -> np.ndarray:
+    """Boolean row mask -> bitset of `words` words (bit i % 64 of word i // 64 is row i)"""
+    packed = np.zeros(words * 8, dtype=np.uint8)
+    bits = np.packbits(mask, bitorder="little")
+    packed[:len(bits)] = bits
+    return packed.view(WORD)
+
+
+def _unpack(words: np.ndarray, rows: int) -> np.ndarray:
+    return np.unpackbits(words.view(np.uint8), count=rows, bitorder="little").view(bool)
+
+
+def _bit(position: int) -> tuple:
+    return position >> 6, np.uint64(1 << (position & 63))
+
+
+def _resized(array: np.ndarray, length: int, fill) -> np.ndarray:
+    """Copy of `array` with its last axis extended to `length`, padded with `fill`"""
+    grown = np.full(array.shape[:-1] + (length,), fill, dtype=array.dtype)
+    grown[..., :array.shape[-1]] = array
+    return grown
+
+
+def _bucket_labels(credit: np.ndarray) -> list:
+    """AccountApplication.turnover_bucket of each credit turnover (None for NULL)"""
+    labels = _EDGE_LABELS[np.maximum(np.searchsorted(_EDGES, credit, side="right") - 1, 0)]
+    labels[np.isnan(credit)] = None
+    return labels.tolist()
+
+
+class RowSet:
+    """
+    Set of stored rows as a bitset; `~` complements within the live rows. A set made by
+    ColumnarStore.isin remembers its (dimension, codes), so counts over it can be read
+    from the value counts instead of popcounting.
+    """
+
+    __slots__ = ("words", "_live", "source")
+
+    def __init__(self, words: np.ndarray, live: np.ndarray, source: Optional[tuple] = None):
+        self.words = words
+        self._live = live
+        self.source = source
+
+    def __and__(self, other: "RowSet") -> "RowSet":
+        return RowSet(self.words & other.words, self._live)
+
+    def __or__(self, other: "RowSet") -> "RowSet":
+        return RowSet(self.words | other.words, self._live)
+
+    def __invert__(self) -> "RowSet":
+        return RowSet(~self.words & self._live, self._live)
+
+    def __len__(self) -> int:
+        return int(np.bitwise_count(self.words).sum())
+
+
+class _Dimension:
+    """
+    A dictionary-encoded column: the code of every row, and per value a bitmap of its
+    rows, its row count and its turnover count/sum. Code 0 is NULL.
+    """
+
+    def __init__(self, capacity: int):
+        self.values: list = [None]
+        self._codes: dict = {None: 0}
+        self._order: Optional[list] = None
+        self.codes = np.zeros(capacity, dtype=CODE_DTYPES[0])
+        self.bitmaps = np.zeros((1, _words(capacity)), dtype=WORD)
+        self.counts = np.zeros(1, dtype=np.int64)
+        self.turnover_counts = np.zeros((len(TURNOVERS), 1), dtype=np.int64)
+        self.turnover_sums = np.zeros((len(TURNOVERS), 1))
+
+    def code(self, value) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+            self._order = None
+        return code
+
+    def existing_codes(self, values: Iterable) -> List[int]:
+        return [self._codes[value] for value in values if value in self._codes]
+
+    def set_codes(self, rows: slice, values: Iterable) -> None:
+        codes = [self.code(value) for value in values]
+        highest = max(codes)
+        if highest > np.iinfo(self.codes.dtype).max:
+            self.codes = self.codes.astype(next(dtype for dtype in CODE_DTYPES if highest <= np.iinfo(dtype).max))
+        self.codes[rows] = codes
+
+    def fit(self) -> None:
+        """Give values added to the dictionary their (empty) bitmap and aggregates"""
+        missing = len(self.values) - len(self.counts)
+        if missing:
+            self.bitmaps = np.vstack([self.bitmaps, np.zeros((missing, self.bitmaps.shape[1]), dtype=WORD)])
+            self.counts = np.append(self.counts, np.zeros(missing, dtype=np.int64))
+            self.turnover_counts = np.hstack([self.turnover_counts, np.zeros((len(TURNOVERS), missing), dtype=np.int64)])
+            self.turnover_sums = np.hstack([self.turnover_sums, np.zeros((len(TURNOVERS), missing))])
+
+    def order(self) -> list:
+        """Codes in ORDER BY value order (NULL first, as SQLite sorts it)"""
+        if self._order is None:
+            self._order = sorted(range(len(self.values)), key=lambda code: (code != 0, self.values[code] or ""))
+        return self._order
+
+
+class ColumnarStore:
+    """
+    The analytic columns of every application, one row each. The dense per-row arrays
+    are the source of truth; bitmaps and aggregates are indexes over them, updated per
+    write and rebuilt after a load or compaction. Deleted rows stay in place (out of
+    every bitmap) until compaction.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.size = 0  # rows in use, deleted ones included
+        self.live_count = 0
+        self._positions = {}  # application id -> row
+        self._ids_sorted = True
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._turnovers = np.full((len(TURNOVERS), 0), np.nan)
+        self._flag_bits = np.zeros(0, dtype=np.uint32)  # bit i: FLAGS[i]
+        self._live = np.zeros(0, dtype=WORD)
+        self._flags = np.zeros((len(FLAGS), 0), dtype=WORD)
+        self._flag_counts = np.zeros(len(FLAGS), dtype=np.int64)
+        self._dimensions = {dimension: _Dimension(0) for dimension in DIMENSIONS}
+        self._extremes = [None] * len(TURNOVERS)  # (min, max) per turnover; None: recompute
+        self._pairs = {}  # (first, second) dimension -> row count per pair of values, kept once read
+
+    def _grow(self, rows: int) -> None:
+        capacity = len(self._ids)
+        if rows <= capacity:
+            return
+        capacity = _words(max(rows, capacity * 2, 1024)) * 64
+        words = _words(capacity)
+        self._ids = _resized(self._ids, capacity, 0)
+        self._turnovers = _resized(self._turnovers, capacity, np.nan)
+        self._flag_bits = _resized(self._flag_bits, capacity, 0)
+        self._live = _resized(self._live, words, 0)
+        self._flags = _resized(self._flags, words, 0)
+        for dimension in self._dimensions.values():
+            dimension.codes = _resized(dimension.codes, capacity, 0)
+            dimension.bitmaps = _resized(dimension.bitmaps, words, 0)
+
+    # ---- Loading and writes ----
+
+    @staticmethod
+    def _load_statement():
+        """
+        SQL Query: SELECT id, <dimensions>, <turnovers>, profile_completeness_score,
+                   <flag and profile check bits> FROM accountapplication ORDER BY id
+        """
+        from sqlmodel import case, select
+
+        app = AccountApplication
+        checks = app._profile_checks()
+        flag_bits = (
+            sum(case((getattr(app, flag) == True, 1 << index), else_=0) for flag, index in FLAG_INDEX.items())
+            + sum(case((checks[field], 1 << index), else_=0) for field, index in PROFILE_INDEX.items())
+        )
+        return select(
+            app.id, *(getattr(app, dimension) for dimension in COUNTER_DIMENSIONS),
+            *(getattr(app, turnover) for turnover in TURNOVERS),
+            app.profile_completeness_score, flag_bits
+        ).order_by(app.id)
+
+    @staticmethod
+    def _row(application) -> tuple:
+        """A written application (ORM instance or row namespace) in the layout of _load_statement"""
+        def value(field):
+            current = getattr(application, field)
+            return getattr(current, "value", current)
+
+        checks = AccountApplication.profile_field_checks(application)
+        flag_bits = sum(1 << index for flag, index in FLAG_INDEX.items() if value(flag))
+        flag_bits += sum(1 << index for index, check in zip(PROFILE_INDEX.values(), checks) if check)
+        return (
+            application.id, *(value(dimension) for dimension in COUNTER_DIMENSIONS),
+            *(value(turnover) for turnover in TURNOVERS),
+            application.profile_completeness_score, flag_bits
+        )
+
+    def load(self) -> None:
+        """Load every application from the primary database, once"""
+        with self._lock:
+            if self.loaded:
+                return
+            self._reset()
+            with engine.connect() as connection:
+                result = connection.execution_options(yield_per=LOAD_CHUNK_SIZE).execute(self._load_statement())
+                for rows in result.partitions():
+                    self._grow(self.size + len(rows))
+                    self._store(self.size, rows)
+                    self.size += len(rows)
+            self._positions = dict(zip(self._ids[:self.size].tolist(), range(self.size)))
+            self._rebuild()
+            self.loaded = True
+
+    def apply(self, upserted: Iterable = (), removed: Iterable[int] = ()) -> None:
+        """Apply committed writes: created/updated applications and deleted application ids"""
+        with self._lock:
+            if not self.loaded:
+                # The load, whenever it runs, reads the committed rows itself
+                return
+            for application_id in removed:
+                position = self._positions.pop(application_id, None)
+                if position is not None:
+                    self._index(position, -1)
+                    self._turnovers[:, position] = np.nan
+            for application in upserted:
+                row = self._row(application)
+                position = self._positions.get(row[0])
+                if position is None:
+                    position = self.size
+                    self._grow(position + 1)
+                    if position and row[0] < self._ids[position - 1]:
+                        self._ids_sorted = False
+                    self._positions[row[0]] = position
+                    self.size += 1
+                else:
+                    self._index(position, -1)
+                self._store(position, [row])
+                self._index(position, 1)
+            deleted = self.size - self.live_count
+            if deleted > max(COMPACT_MIN_DELETED, self.live_count):
+                self._compact()
+
+    def _store(self, start: int, rows: list) -> None:
+        """Write rows in the _load_statement layout to the dense arrays"""
+        rows_slice = slice(start, start + len(rows))
+        columns = list(zip(*rows))
+        self._ids[rows_slice] = columns[0]
+        for index, dimension in enumerate(COUNTER_DIMENSIONS, start=1):
+            self._dimensions[dimension].set_codes(rows_slice, columns[index])
+        first = len(COUNTER_DIMENSIONS) + 1
+        # None becomes NaN
+        turnovers = np.array(columns[first:first + len(TURNOVERS)], dtype=np.float64)
+        self._turnovers[:, rows_slice] = turnovers
+        self._dimensions[TURNOVER_BUCKET_DIMENSION].set_codes(rows_slice, _bucket_labels(turnovers[TURNOVERS.index("expected_monthly_turnover_cr")]))
+        self._dimensions[SCORE_DIMENSION].set_codes(rows_slice, columns[-2])
+        self._flag_bits[rows_slice] = columns[-1]
+
+    def _index(self, position: int, sign: int) -> None:
+        """Add (sign=1) or remove (sign=-1) one stored row from the bitmaps and aggregates"""
+        word, bit = _bit(position)
+        turnovers = self._turnovers[:, position]
+        present = ~np.isnan(turnovers)
+        values = np.where(present, turnovers, 0.0)
+        for dimension in self._dimensions.values():
+            dimension.fit()
+            code = dimension.codes[position]
+            dimension.counts[code] += sign
+            dimension.turnover_counts[:, code] += sign * present
+            dimension.turnover_sums[:, code] += sign * values
+            if sign > 0:
+                dimension.bitmaps[code, word] |= bit
+            else:
+                dimension.bitmaps[code, word] &= ~bit
+        for first, second in self._pairs:
+            self._pair_counts(first, second)[self._dimensions[first].codes[position], self._dimensions[second].codes[position]] += sign
+        flag_bits = int(self._flag_bits[position])
+        for index in range(len(FLAGS)):
+            if flag_bits >> index & 1:
+                self._flag_counts[index] += sign
+                if sign > 0:
+                    self._flags[index, word] |= bit
+                else:
+                    self._flags[index, word] &= ~bit
+        if sign > 0:
+            self._live[word] |= bit
+        else:
+            self._live[word] &= ~bit
+        self.live_count += sign
+        for side, value in enumerate(turnovers):
+            extremes = self._extremes[side]
+            if extremes is None or np.isnan(value):
+                continue
+            low, high = extremes
+            if sign > 0:
+                self._extremes[side] = (value if low is None else min(low, value), value if high is None else max(high, value))
+            elif value == low or value == high:
+                self._extremes[side] = None
+
+    def _rebuild(self) -> None:
+        """Recompute the bitmaps and aggregates of rows 0..size, all of them live"""
+        rows, words = self.size, len(self._live)
+        self._live = _pack(np.ones(rows, dtype=bool), words)
+        self.live_count = rows
+        turnovers = self._turnovers[:, :rows]
+        present = ~np.isnan(turnovers)
+        for dimension in self._dimensions.values():
+            codes = dimension.codes[:rows]
+            size = len(dimension.values)
+            dimension.counts = np.bincount(codes, minlength=size).astype(np.int64)
+            dimension.turnover_counts = np.array(
+                [np.bincount(codes[present[side]], minlength=size) for side in range(len(TURNOVERS))], dtype=np.int64
+            ).reshape(len(TURNOVERS), size)
+            dimension.turnover_sums = np.array([
+                np.bincount(codes[present[side]], weights=turnovers[side][present[side]], minlength=size)
+                for side in range(len(TURNOVERS))
+            ], dtype=np.float64).reshape(len(TURNOVERS), size)
+            dimension.bitmaps = np.stack([_pack(codes == code, words) for code in range(size)])
+        flag_bits = self._flag_bits[:rows]
+        for index in range(len(FLAGS)):
+            mask = (flag_bits >> index) & 1 == 1
+            self._flags[index] = _pack(mask, words)
+            self._flag_counts[index] = np.count_nonzero(mask)
+        self._extremes = [None] * len(TURNOVERS)
+        self._pairs = {}
+
+    def _compact(self) -> None:
+        """Drop deleted rows from the arrays"""
+        keep = np.flatnonzero(_unpack(self._live, self.size))
+        rows = len(keep)
+        self._ids[:rows] = self._ids[keep]
+        self._turnovers[:, :rows] = self._turnovers[:, keep]
+        self._turnovers[:, rows:] = np.nan
+        self._flag_bits[:rows] = self._flag_bits[keep]
+        for dimension in self._dimensions.values():
+            dimension.codes[:rows] = dimension.codes[keep]
+            dimension.codes[rows:] = 0
+        self.size = rows
+        self._positions = dict(zip(self._ids[:rows].tolist(), range(rows)))
+        self._rebuild()
+
+    def _pair_counts(self, first: str, second: str) -> np.ndarray:
+        """Live row count per (first code, second code); computed on first use, then kept by _index"""
+        rows, columns = self._dimensions[first], self._dimensions[second]
+        shape = (len(rows.values), len(columns.values))
+        counts = self._pairs.get((first, second))
+        if counts is None:
+            live = _unpack(self._live, self.size)
+            pairs = rows.codes[:self.size][live].astype(np.intp) * shape[1] + columns.codes[:self.size][live]
+            counts = self._pairs[first, second] = np.bincount(pairs, minlength=shape[0] * shape[1]).reshape(shape)
+        elif counts.shape != shape:
+            # Values added since: pad with empty rows/columns
+            grown = np.zeros(shape, dtype=counts.dtype)
+            grown[:counts.shape[0], :counts.shape[1]] = counts
+            counts = self._pairs[first, second] = grown
+        return counts
+
+    # ---- Reads ----
+
+    @contextmanager
+    def reading(self):
+        """Hold the store (loading it on first use) so row sets and counts taken inside agree"""
+        with self._lock:
+            self.load()
+            yield self
+
+    def count(self, where: Optional[RowSet] = None) -> int:
+        """COUNT(*) [WHERE rows]"""
+        with self.reading():
+            if where is None:
+                return self.live_count
+            if where.source is not None:
+                dimension, codes = where.source
+                return int(self._dimensions[dimension].counts[codes].sum())
+            return len(where)
+
+    def flag(self, name: str) -> RowSet:
+        """Rows with a boolean column set, or (for a PROFILE_FIELDS name) the profile check passed"""
+        with self.reading():
+            return RowSet(self._flags[FLAG_INDEX.get(name, PROFILE_INDEX.get(name))], self._live)
+
+    def isin(self, dimension: str, values: Iterable) -> RowSet:
+        """Rows where `dimension IN (values)`; NULL never matches"""
+        with self.reading():
+            column = self._dimensions[dimension]
+            codes = [code for code in column.existing_codes(values) if code]
+            if not codes:
+                return RowSet(np.zeros_like(self._live), self._live, (dimension, codes))
+            return RowSet(np.bitwise_or.reduce(column.bitmaps[codes], axis=0), self._live, (dimension, codes))
+
+    def not_in(self, dimension: str, values: Iterable) -> RowSet:
+        """Rows where `dimension NOT IN (values)`; NULL never matches"""
+        with self.reading():
+            return ~self.isin(dimension, values) & ~self.is_null(dimension)
+
+    def is_null(self, dimension: str) -> RowSet:
+        with self.reading():
+            return RowSet(self._dimensions[dimension].bitmaps[0], self._live)
+
+    def at_least(self, turnover: str, threshold: float) -> RowSet:
+        """Rows where `turnover >= threshold`; NULL never matches"""
+        with self.reading():
+            if turnover == "expected_monthly_turnover_cr" and threshold in TURNOVER_BUCKET_EDGES[1:]:
+                # At a histogram edge: the union of the buckets from there up
+                return self.isin(TURNOVER_BUCKET_DIMENSION, [str(edge) for edge in TURNOVER_BUCKET_EDGES if edge >= threshold])
+            values = self._turnovers[TURNOVERS.index(turnover)]
+            return RowSet(_pack(values >= threshold, len(self._live)), self._live)
+
+    def counts(self, dimension: str, where: Optional[RowSet] = None) -> List[tuple]:
+        """SELECT dimension, COUNT(*) [WHERE rows] GROUP BY dimension ORDER BY dimension"""
+        with self.reading():
+            column = self._dimensions[dimension]
+            if where is None:
+                counts = column.counts
+            elif where.source is not None:
+                source, codes = where.source
+                counts = self._pair_counts(source, dimension)[codes].sum(axis=0)
+            else:
+                counts = np.bitwise_count(column.bitmaps & where.words).sum(axis=1)
+            return [(column.values[code], int(counts[code])) for code in column.order() if counts[code]]
+
+    def _cube_filter(self, filters: dict) -> RowSet:
+        """Rows matching every `column IN (values)` of a cube's filters"""
+        where = RowSet(self._live, self._live)
+        for column, values in filters.items():
+            if column in FLAG_INDEX:
+                flag = self.flag(column)
+                rows = RowSet(np.zeros_like(self._live), self._live)
+                if True in values:
+                    rows = rows | flag
+                if False in values:
+                    rows = rows | ~flag
+            else:
+                rows = self.isin(column, values)
+            where = where & rows
+        return where
+
+    def _group_stats(self, side: int, rows: np.ndarray, keys: np.ndarray, size: int, extremes: bool) -> tuple:
+        """(count, sum, min, max) of one turnover per group key; min/max only when asked"""
+        values = self._turnovers[side, rows]
+        present = ~np.isnan(values)
+        keys, values = keys[present], values[present]
+        low = high = None
+        if extremes:
+            low, high = np.full(size, np.inf), np.full(size, -np.inf)
+            np.minimum.at(low, keys, values)
+            np.maximum.at(high, keys, values)
+        return np.bincount(keys, minlength=size), np.bincount(keys, weights=values, minlength=size), low, high
+
+    def cube(self, dimensions: Sequence[str], measures: Sequence[str], filters: dict) -> List[tuple]:
+        """
+        AccountApplication.get_cube's rows. Unfiltered counts, sums and averages by one
+        dimension come from the running aggregates, unfiltered counts by two from the pair
+        counts; otherwise the selected rows' codes are grouped with bincount.
+        """
+        with self.reading():
+            columns = [self._dimensions[dimension] for dimension in dimensions]
+            shape = tuple(len(column.values) for column in columns)
+            extremes = any(measure.split("_")[0] in ("min", "max") for measure in measures)
+            groups = None
+            if not filters and len(columns) == 1 and not extremes:
+                counts = columns[0].counts
+                stats = {
+                    side: (columns[0].turnover_counts[side], columns[0].turnover_sums[side], None, None)
+                    for side in range(len(TURNOVERS))
+                }
+            elif not filters and len(columns) == 2 and set(measures) == {"count"}:
+                counts, stats = self._pair_counts(*dimensions).ravel(), {}
+            else:
+                rows = np.flatnonzero(_unpack(self._cube_filter(filters).words, self.size))
+                if columns:
+                    keys = np.ravel_multi_index([column.codes[rows] for column in columns], shape)
+                else:
+                    keys = np.zeros(len(rows), dtype=np.intp)
+                size = int(np.prod(shape))
+                if size > CUBE_MAX_CELLS:
+                    # Too many possible groups for dense arrays: number the groups present
+                    groups, keys = np.unique(keys, return_inverse=True)
+                    size = len(groups)
+                counts = np.bincount(keys, minlength=size)
+                sides = {SIDES[measure.split("_")[1]] for measure in measures if measure != "count"}
+                stats = {side: self._group_stats(side, rows, keys, size, extremes) for side in sides}
+
+            if columns:
+                cells = np.flatnonzero(counts)
+                codes = np.unravel_index(cells if groups is None else groups[cells], shape)
+                # ORDER BY the dimensions, each in its value order
+                ranks = [np.argsort(column.order())[code] for column, code in zip(columns, codes)]
+                order = np.lexsort(ranks[::-1])
+                cells, codes = cells[order], [code[order] for code in codes]
+            else:
+                # One row for the whole selection, as an aggregate without GROUP BY
+                cells, codes = np.zeros(1, dtype=np.intp), []
+
+            results = []
+            for index, cell in enumerate(cells.tolist()):
+                row = [column.values[code[index]] for column, code in zip(columns, codes)]
+                for measure in measures:
+                    if measure == "count":
+                        row.append(int(counts[cell]))
+                        continue
+                    aggregate, side = measure.split("_")
+                    count, total, low, high = stats[SIDES[side]]
+                    if not count[cell]:
+                        row.append(None)
+                    elif aggregate in ("sum", "avg"):
+                        row.append(float(total[cell] / count[cell] if aggregate == "avg" else total[cell]))
+                    else:
+                        row.append(float((low if aggregate == "min" else high)[cell]))
+                results.append(tuple(row))
+            return results
+
+    def mean_in(self, turnover: str, dimension: str, values: Iterable, negate: bool = False) -> Optional[float]:
+        """AVG(turnover) WHERE dimension [NOT] IN (values), from the per-value sums"""
+        with self.reading():
+            column = self._dimensions[dimension]
+            side = TURNOVERS.index(turnover)
+            selected = set(column.existing_codes(values))
+            codes = [code for code in range(1, len(column.values)) if (code in selected) != negate]
+            count = column.turnover_counts[side, codes].sum()
+            return float(column.turnover_sums[side, codes].sum() / count) if count else None
+
+    def flag_counts(self) -> dict:
+        """{flag: {True: n, False: m}} for every boolean column (as AnalyticsCounter.flag_counts)"""
+        with self.reading():
+            return {
+                flag: {True: int(self._flag_counts[index]), False: self.live_count - int(self._flag_counts[index])}
+                for flag, index in FLAG_INDEX.items()
+            }
+
+    def _extreme(self, side: int) -> tuple:
+        if self._extremes[side] is None:
+            values = self._turnovers[side, :self.size]
+            values = values[~np.isnan(values)]
+            self._extremes[side] = (float(values.min()), float(values.max())) if len(values) else (None, None)
+        return self._extremes[side]
+
+    def totals(self) -> dict:
+        """Table-wide count and turnover aggregates (as AnalyticsCounter.totals)"""
+        with self.reading():
+            column = self._dimensions[DIMENSIONS[0]]
+            totals = {"count": self.live_count}
+            for side, name in enumerate(("dr", "cr")):
+                count = int(column.turnover_counts[side].sum())
+                low, high = self._extreme(side)
+                totals[f"{name}_count"] = count
+                totals[f"{name}_sum"] = float(column.turnover_sums[side].sum()) if count else None
+                totals[f"{name}_min"] = float(low) if count else None
+                totals[f"{name}_max"] = float(high) if count else None
+            return totals
+
+    def turnover_buckets(self) -> List[tuple]:
+        """(bucket lower edge, count) of the credit turnover histogram, as stored by AnalyticsCounter"""
+        return [(edge, count) for edge, count in self.counts(TURNOVER_BUCKET_DIMENSION) if edge is not None]
+
+    def profile_completeness(self) -> tuple:
+        """
+        (count, score sum, fully complete, >= 80 %, < 50 %, *completed count per PROFILE_FIELDS),
+        the row of AccountApplication.get_profile_completeness's aggregate
+        """
+        with self.reading():
+            total_fields = len(PROFILE_FIELDS)
+            column = self._dimensions[SCORE_DIMENSION]
+            scores = [(score, int(count)) for score, count in zip(column.values, column.counts) if score is not None]
+            return (
+                self.live_count,
+                sum(score * count for score, count in scores),
+                sum(count for score, count in scores if score == total_fields),
+                sum(count for score, count in scores if score * 100 >= 80 * total_fields),
+                sum(count for score, count in scores if score * 100 < 50 * total_fields),
+                *(int(self._flag_counts[PROFILE_INDEX[field]]) for field in PROFILE_FIELDS)
+            )
+
+    def segment(self, name: str) -> RowSet:
+        """Rows of a customer segment (mirrors AccountApplication._segment_predicates)"""
+        with self.reading():
+            internet, mobile = self.flag("internet_banking"), self.flag("mobile_banking")
+            if name == "premium_digital_natives":
+                return self.isin("card_type", ["PLATINUM", "SIGNATURE", "INFINITE"]) & internet & mobile
+            if name == "high_value_traditional":
+                return self.at_least("expected_monthly_turnover_cr", 300000) & ~internet & ~mobile
+            if name == "young_professionals":
+                return self.isin("occupation", ["STUDENT", "SERVICE_PRIVATE", "IT_PROFESSIONAL"]) & (internet | mobile)
+            if name == "business_owners":
+                return self.isin("occupation", ["BUSINESS", "SELF_EMPLOYED"])
+            if name == "value_seekers":
+                return (self.isin("card_type", ["CLASSIC"]) | self.is_null("card_type")) & ~internet
+            if name == "fully_engaged":
+                return internet & mobile & self.flag("sms_alerts") & self.not_in("card_type", [""])
+            raise KeyError(name)
+
+    def segment_counts(self) -> tuple:
+        """(total, *count per CUSTOMER_SEGMENTS)"""
+        with self.reading():
+            return (self.live_count, *(len(self.segment(name)) for name in CUSTOMER_SEGMENTS))
+
+    def segment_member_ids(self, segment: str, after_id: int = 0, limit: int = 100) -> List[int]:
+        """Ids of a segment's members above after_id, ascending"""
+        with self.reading():
+            members = self.segment(segment).words
+            if limit <= 0:
+                return []
+            if not self._ids_sorted:
+                ids = self._ids[np.flatnonzero(_unpack(members, self.size))]
+                return np.sort(ids[ids > after_id])[:limit].tolist()
+            # Rows are in id order: scan from the first id past after_id until the page is full
+            found = []
+            start = int(np.searchsorted(self._ids[:self.size], after_id, side="right")) // 64
+            for first in range(start, len(members), SCAN_BLOCK_WORDS):
+                block = members[first:first + SCAN_BLOCK_WORDS]
+                ids = self._ids[np.flatnonzero(_unpack(block, len(block) * 64)) + first * 64]
+                found.extend(ids[ids > after_id][:limit - len(found)].tolist())
+                if len(found) >= limit:
+                    break
+            return found
+
+
+columnar_store = ColumnarStore()
@@ -1,6 +1,8 @@
 from sqlmodel import create_engine, Session
 from dotenv import load_dotenv
+from fastapi import Request
 import os
+import time
 
 # Load environment variables
 load_dotenv()
@@ -14,16 +16,148 @@ if DATABASE_URL and DATABASE_URL.startswith("sqlite"):
     if os.path.exists("/tmp") and not os.access(".", os.W_OK):
         DATABASE_URL = "sqlite:////tmp/database.db"
 
+# Analytics read the incrementally maintained counter table instead of scanning
+# accountapplication; set ANALYTICS_COUNTERS=false to always query the base table
+ANALYTICS_COUNTERS_ENABLED = os.getenv("ANALYTICS_COUNTERS", "true").lower() not in ("false", "0", "no")
+
+# Analytics answer from an in-memory NumPy copy of the analytic columns (db/columnar.py),
+# kept up to date by this process's writes; opt-in with ANALYTICS_COLUMNAR=true (needs numpy)
+ANALYTICS_COLUMNAR_ENABLED = os.getenv("ANALYTICS_COLUMNAR", "false").lower() in ("true", "1", "yes")
+
+# Log every SQL statement (DB_ECHO=true); per-request query counts and timings are
+# reported in the Server-Timing header instead (see utils/instrumentation.py)
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("true", "1", "yes")
+
+# Serverless cold starts (FAST_STARTUP=true, the default on Vercel): skip the startup
+# schema upkeep when the database records the current schema version (db.migrations),
+# and open the pooled connections before the first request
+FAST_STARTUP_ENABLED = os.getenv("FAST_STARTUP", "true" if os.getenv("VERCEL") else "false").lower() in ("true", "1", "yes")
+
+# Optional read replica (DATABASE_READ_URL): analytics and search routes read through
+# read_engine, writes and every other route use the primary. For a local replica use a
+# second SQLite file or a read-only connection to the same one
+# (sqlite:///file:./test.db?mode=ro&uri=true). Unset, read_engine is the primary.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or None
+
+# Read-your-writes: after a successful write, the client's reads go to the primary for
+# this long (utils.read_your_writes sets the cookie); should exceed the replica lag
+READ_STICKY_SECONDS = float(os.getenv("READ_STICKY_SECONDS", "5"))
+READ_STICKY_COOKIE = "read_primary_until"
+
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url and "sqlite" in url else {}
+
+
 # Create engine with connection pool settings for serverless
 engine = create_engine(
     DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False} if DATABASE_URL and "sqlite" in DATABASE_URL else {},
+    echo=DB_ECHO,
+    connect_args=_connect_args(DATABASE_URL),
     pool_pre_ping=True
 )
 
+read_engine = engine
+if DATABASE_READ_URL:
+    read_engine = create_engine(
+        DATABASE_READ_URL,
+        echo=DB_ECHO,
+        connect_args=_connect_args(DATABASE_READ_URL),
+        pool_pre_ping=True
+    )
+
 
 # Dependency to get database session
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    """Whether the client wrote within READ_STICKY_SECONDS (its read-your-writes cookie is live)"""
+    try:
+        until = float(request.cookies.get(READ_STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    # Values further ahead than one window are not ours; ignore them
+    return now < until <= now + READ_STICKY_SECONDS
+
+
+# Dependency to get a session for read-only routes (analytics, search)
+def get_read_session(request: Request):
+    with Session(engine if reads_pinned_to_primary(request) else read_engine) as session:
+        yield session
+
+
+# Opt-in async mode (DB_ASYNC=true): route handlers run on an async engine
+# (aiosqlite for SQLite, asyncpg for PostgreSQL) instead of the threadpool.
+# The sync engine above stays available for startup migrations and CLI commands.
+DB_ASYNC_ENABLED = os.getenv("DB_ASYNC", "false").lower() in ("true", "1", "yes")
+
+
+def to_async_url(url: str) -> str:
+    """Swap a sync database URL to its async driver"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+async_engine = None
+async_read_engine = None
+if DB_ASYNC_ENABLED:
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    try:
+        async_engine = create_async_engine(
+            to_async_url(DATABASE_URL),
+            echo=DB_ECHO,
+            pool_pre_ping=True
+        )
+        async_read_engine = async_engine
+        if DATABASE_READ_URL:
+            async_read_engine = create_async_engine(
+                to_async_url(DATABASE_READ_URL),
+                echo=DB_ECHO,
+                pool_pre_ping=True
+            )
+    except ImportError as e:
+        raise RuntimeError(
+            f"DB_ASYNC=true requires the async driver for this database (aiosqlite or asyncpg): {e}"
+        ) from e
+
+
+# Dependency to get async database session
+async def get_async_session():
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+
+# Dependency to get an async session for read-only routes
+async def get_async_read_session(request: Request):
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async with AsyncSession(async_engine if reads_pinned_to_primary(request) else async_read_engine) as session:
+        yield session
+
+
+def _ping() -> None:
+    for target in {engine, read_engine}:
+        with target.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+
+
+async def warm_connections() -> None:
+    """Check out (and return to the pools) one connection per engine so the first request finds it open"""
+    from starlette.concurrency import run_in_threadpool
+
+    # Through the threadpool sync routes run on, which also starts it before the first request
+    await run_in_threadpool(_ping)
+    for target in {async_engine, async_read_engine} - {None}:
+        async with target.connect() as connection:
+            await connection.exec_driver_sql("SELECT 1")
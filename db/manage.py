@@ -0,0 +1,52 @@
+"""
+Database maintenance commands.
+
+Usage:
+    python -m db.manage rebuild-counters
+    python -m db.manage create-indexes
+    python -m db.manage migrate
+"""
+import argparse
+from sqlmodel import SQLModel, Session
+from db.connection import engine
+from db.schemas import AnalyticsCounter
+from db.migrations import ensure_indexes, migrate as migrate_schema
+
+
+def rebuild_counters() -> None:
+    """Reconcile the analytics counter table against accountapplication"""
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        rows = AnalyticsCounter.rebuild(session)
+    print(f"Rebuilt analytics counters: {rows} rows written")
+
+
+def create_indexes() -> None:
+    """Create missing indexes and unique constraints on an existing database"""
+    SQLModel.metadata.create_all(engine)
+    for name, status in ensure_indexes(engine).items():
+        print(f"{name}: {status}")
+
+
+def migrate() -> None:
+    """Add missing columns and indexes, then backfill derived columns"""
+    for name, status in migrate_schema(engine).items():
+        print(f"{name}: {status}")
+
+
+COMMANDS = {
+    "rebuild-counters": rebuild_counters,
+    "create-indexes": create_indexes,
+    "migrate": migrate,
+}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Database maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+    COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    main()
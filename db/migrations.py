@@ -0,0 +1,112 @@
+"""
+Schema upkeep for databases created before the current models.
+
+SQLModel.metadata.create_all only creates missing tables, so columns and indexes
+added to an existing table are created here instead (ALTER TABLE ... ADD COLUMN and
+CREATE INDEX IF NOT EXISTS semantics on both SQLite and PostgreSQL), followed by
+backfills of derived columns.
+
+Once startup's upkeep completes, the fingerprint of the models is recorded in
+SchemaVersion; FAST_STARTUP starts compare it instead of introspecting the database.
+"""
+import hashlib
+import json
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex
+from sqlmodel import SQLModel, Session
+
+from db.schemas import (
+    AccountApplication, AnalyticsCounter, SchemaVersion, COUNTER_DIMENSIONS, COUNTER_FLAGS, PROFILE_FIELDS, TURNOVER_BUCKET_EDGES
+)
+
+
+# SchemaVersion row holding the fingerprint of the models
+SCHEMA_VERSION_NAME = "models"
+
+
+def ensure_columns(engine: Engine) -> dict:
+    """Add nullable columns declared on the models but missing from existing tables"""
+    results = {}
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            name = f"{table.name}.{column.name}"
+            if not column.nullable:
+                results[name] = "skipped: NOT NULL columns need a manual migration"
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            results[name] = "added"
+    return results
+
+
+def ensure_indexes(engine: Engine) -> dict:
+    """Create every declared index that is missing; returns {index name: status}"""
+    results = {}
+    for table in SQLModel.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            try:
+                with engine.begin() as connection:
+                    # Not checkfirst: reflection skips expression indexes
+                    connection.execute(CreateIndex(index, if_not_exists=True))
+                results[index.name] = "ok"
+            except DBAPIError as e:
+                # Typically a unique index over existing duplicate values
+                results[index.name] = f"failed: {e.orig}"
+    return results
+
+
+def migrate(engine: Engine) -> dict:
+    """Bring an existing database up to the current models; returns {item: status}"""
+    SQLModel.metadata.create_all(engine)
+    results = ensure_columns(engine)
+    with Session(engine) as session:
+        # Duplicate counter keys would fail their unique index
+        results["analyticscounter duplicates"] = f"{AnalyticsCounter.merge_duplicates(session)} merged"
+    results.update(ensure_indexes(engine))
+    with Session(engine) as session:
+        results["accountapplication.profile_completeness_score backfill"] = (
+            f"{AccountApplication.backfill_profile_scores(session)} rows"
+        )
+    return results
+
+
+def schema_fingerprint() -> str:
+    """Hash of the declared tables, columns and indexes and of the derived data kept at startup"""
+    definition = {
+        "tables": [
+            {
+                "name": table.name,
+                "columns": [(column.name, str(column.type), column.nullable, column.primary_key) for column in table.columns],
+                "indexes": sorted((index.name, [column.name for column in index.columns], index.unique) for index in table.indexes),
+            }
+            for table in SQLModel.metadata.sorted_tables
+        ],
+        "profile_fields": PROFILE_FIELDS,
+        "counters": [COUNTER_DIMENSIONS, COUNTER_FLAGS, TURNOVER_BUCKET_EDGES],
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+
+
+def schema_is_current(engine: Engine) -> bool:
+    """Whether the database records the current schema_fingerprint() (one primary-key read, no DDL)"""
+    try:
+        with Session(engine) as session:
+            return SchemaVersion.get_version(session, SCHEMA_VERSION_NAME) == schema_fingerprint()
+    except DBAPIError:
+        # No schemaversion table yet
+        return False
+
+
+def record_schema_version(engine: Engine) -> None:
+    with Session(engine) as session:
+        SchemaVersion.record(session, SCHEMA_VERSION_NAME, schema_fingerprint())
@@ -1,10 +1,14 @@
 from sqlmodel import Field, SQLModel, Session, select
-from typing import Optional, List
+from typing import Dict, Optional, List, Iterator, Sequence
 from enum import Enum as PyEnum
-from sqlalchemy import Enum
-from datetime import date
+from sqlalchemy import Enum, Index, text
+from datetime import date, datetime, timezone
+import bisect
+from contextlib import nullcontext
+from functools import lru_cache
 from pydantic import field_validator, model_validator, ValidationError
 import re
+from db.connection import ANALYTICS_COLUMNAR_ENABLED, ANALYTICS_COUNTERS_ENABLED
 from utils.validations import (
     validate_uppercase,
     validate_cnic,
@@ -14,6 +18,7 @@ from utils.validations import (
     validate_contact,
     validate_email
 )
+from utils.metrics import label_query_methods
 
 
 class AccountType(PyEnum):
@@ -76,8 +81,77 @@ class ResidentialStatus(PyEnum):
     OTHER = "OTHER"
 
 
+# Customer segments reported by get_customer_segments, in response order
+CUSTOMER_SEGMENTS = (
+    "premium_digital_natives", "high_value_traditional", "young_professionals",
+    "business_owners", "value_seekers", "fully_engaged"
+)
+
+# Lower edges of the monthly credit turnover histogram (Rs), maintained in AnalyticsCounter
+TURNOVER_BUCKET_EDGES = (
+    0, 10000, 25000, 50000, 100000, 200000, 300000, 500000,
+    750000, 1000000, 2500000, 5000000, 10000000
+)
+
+# Service flags reported by the services/dashboard analytics, in response order
+SERVICE_FIELDS = ("internet_banking", "mobile_banking", "check_book", "sms_alerts", "zakat_deduction")
+
+
+def _count_if(condition):
+    """SQL: COALESCE(SUM(CASE WHEN <condition> THEN 1 ELSE 0 END), 0)"""
+    from sqlmodel import func, case
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _columnar_store():
+    """The in-memory ColumnarStore when ANALYTICS_COLUMNAR is enabled, else None"""
+    if not ANALYTICS_COLUMNAR_ENABLED:
+        return None
+    from db.columnar import columnar_store
+    return columnar_store
+
+
+def _columnar_apply(upserted=(), removed=()) -> None:
+    """Apply committed application writes to the columnar store, when enabled"""
+    store = _columnar_store()
+    if store is not None:
+        store.apply(upserted, removed)
+
+
+# Stable sort keys accepted by keyset pagination; each has a (key, id) index below
+KEYSET_SORT_KEYS = ("id", "city", "expected_monthly_turnover_cr", "profile_completeness_score")
+
+# Fields counted by the profile completeness score, in response order
+PROFILE_FIELDS = (
+    "fathers_husbands_name", "mothers_name", "date_of_birth", "nationality", "place_of_birth",
+    "address_complete", "occupation", "financial_info", "residential_status", "next_of_kin", "card_selected"
+)
+
+
+@label_query_methods
 class AccountApplication(SQLModel, table=True):
     """Account Application Form Schema"""
+    # Managed index set; db.migrations.ensure_indexes creates any missing ones on existing databases
+    __table_args__ = (
+        # Point lookups (get_by_cnic / get_by_account_number / get_by_iban) - one application each
+        Index("ux_accountapplication_cnic_no", "cnic_no", unique=True),
+        Index("ux_accountapplication_account_no", "account_no", unique=True),
+        Index("ux_accountapplication_iban", "iban", unique=True),
+        # Keyset pagination sort keys
+        Index("ix_accountapplication_city_id", "city", "id"),
+        Index("ix_accountapplication_turnover_cr_id", "expected_monthly_turnover_cr", "id"),
+        # Analytics dimensions; composites cover the cross-analyses and city turnover
+        Index("ix_accountapplication_account_type", "account_type"),
+        Index("ix_accountapplication_gender_account_type", "gender", "account_type"),
+        Index("ix_accountapplication_occupation_card_type", "occupation", "card_type"),
+        Index("ix_accountapplication_card_type_card_network", "card_type", "card_network"),
+        Index("ix_accountapplication_marital_status", "marital_status"),
+        Index("ix_accountapplication_residential_status", "residential_status"),
+        Index("ix_accountapplication_city_turnover_cr", "city", "expected_monthly_turnover_cr"),
+        # Follow-up lists of incomplete profiles
+        Index("ix_accountapplication_profile_score_id", "profile_completeness_score", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     account_no: Optional[str] = None
     date: Optional[str] = None
@@ -145,6 +219,9 @@ class AccountApplication(SQLModel, table=True):
     # Zakat Deduction
     zakat_deduction: bool = Field(default=False)
 
+    # Number of PROFILE_FIELDS completed (0-11), maintained on every write
+    profile_completeness_score: Optional[int] = None
+
     @field_validator('name', 'title_of_account', 'fathers_husbands_name', 'mothers_name', 'nationality', 'place_of_birth', 'house_no_block_street', 'area_location', 'city', 'purpose_of_account', 'source_of_income', 'next_of_kin_name', 'next_of_kin_address', 'occupation_other', 'residential_status_other', 'name_on_card')
     @classmethod
     def validate_uppercase_fields(cls, v):
@@ -219,12 +296,73 @@ class AccountApplication(SQLModel, table=True):
         return session.get(cls, application_id)
 
     @classmethod
-    def create(cls, session: Session, application_data: 'AccountApplication') -> 'AccountApplication':
-        """SQL Query: INSERT INTO accountapplication (...) VALUES (...)"""
-        session.add(application_data)
+    def create(cls, session: Session, row: dict) -> dict:
+        """
+        SQL Query: INSERT INTO accountapplication (...) VALUES (...) RETURNING *
+
+        Inserts an already-validated row dict (enum values as strings) and returns the
+        stored row, id included, without constructing or refreshing an ORM instance.
+        """
+        from types import SimpleNamespace
+
+        columns = cls.__table__.columns
+        row = {k: v for k, v in row.items() if k in columns}
+        row["profile_completeness_score"] = cls.compute_profile_score(SimpleNamespace(**row))
+        created = dict(session.connection().execute(cls._insert_statement(), row).mappings().one())
+        AnalyticsCounter.record(session, None, AnalyticsCounter.snapshot(SimpleNamespace(**created)))
+        NumberSequence.reserve(session, DATA_GENERATION_SEQUENCE, 1)
         session.commit()
-        session.refresh(application_data)
-        return application_data
+        _columnar_apply([SimpleNamespace(**created)])
+        return created
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _insert_statement(cls):
+        """INSERT INTO accountapplication (...) VALUES (...) RETURNING *, built once"""
+        from sqlalchemy import insert
+
+        return insert(cls.__table__).returning(*cls.__table__.columns)
+
+    @classmethod
+    def bulk_create(cls, session: Session, rows: List[dict], chunk_size: int = 500) -> List[int]:
+        """
+        SQL Query: INSERT INTO accountapplication (...) VALUES (...), (...) RETURNING id
+
+        Inserts already-validated row dicts in executemany batches of `chunk_size` inside
+        a single transaction and returns the generated ids in input order.
+        """
+        from sqlmodel import insert
+        from types import SimpleNamespace
+
+        columns = set(cls.__table__.columns.keys())
+        ids = []
+        created = []
+        for start in range(0, len(rows), chunk_size):
+            chunk = [{k: v for k, v in row.items() if k in columns} for row in rows[start:start + chunk_size]]
+            for row in chunk:
+                row["profile_completeness_score"] = cls.compute_profile_score(SimpleNamespace(**row))
+            result = session.exec(
+                insert(cls).returning(cls.id, sort_by_parameter_order=True),
+                params=chunk
+            )
+            chunk_ids = result.scalars().all()
+            ids.extend(chunk_ids)
+            AnalyticsCounter.record_changes(
+                session, [(None, AnalyticsCounter.snapshot(SimpleNamespace(**row))) for row in chunk]
+            )
+            created.extend(SimpleNamespace(**dict(row, id=application_id)) for row, application_id in zip(chunk, chunk_ids))
+        if ids:
+            NumberSequence.reserve(session, DATA_GENERATION_SEQUENCE, 1)
+        session.commit()
+        _columnar_apply(created)
+        return ids
+
+    @classmethod
+    def existing_cnics(cls, session: Session, cnic_numbers: List[str]) -> set:
+        """SQL Query: SELECT cnic_no FROM accountapplication WHERE cnic_no IN (...)"""
+        if not cnic_numbers:
+            return set()
+        return set(session.exec(select(cls.cnic_no).where(cls.cnic_no.in_(cnic_numbers))).all())
 
     @classmethod
     def update_by_id(cls, session: Session, application_id: int, update_data: dict) -> Optional['AccountApplication']:
@@ -233,12 +371,18 @@ class AccountApplication(SQLModel, table=True):
         if not application:
             return None
 
+        before = AnalyticsCounter.snapshot(application)
         for field, value in update_data.items():
             if hasattr(application, field):
                 setattr(application, field, value)
+        application.profile_completeness_score = cls.compute_profile_score(application)
 
+        session.flush()
+        AnalyticsCounter.record(session, before, AnalyticsCounter.snapshot(application))
+        NumberSequence.reserve(session, DATA_GENERATION_SEQUENCE, 1)
         session.commit()
         session.refresh(application)
+        _columnar_apply([application])
         return application
 
     @classmethod
@@ -248,8 +392,13 @@ class AccountApplication(SQLModel, table=True):
         if not application:
             return False
 
+        before = AnalyticsCounter.snapshot(application)
         session.delete(application)
+        session.flush()
+        AnalyticsCounter.record(session, before, None)
+        NumberSequence.reserve(session, DATA_GENERATION_SEQUENCE, 1)
         session.commit()
+        _columnar_apply(removed=[application_id])
         return True
 
     @classmethod
@@ -257,6 +406,16 @@ class AccountApplication(SQLModel, table=True):
         """SQL Query: SELECT * FROM accountapplication WHERE cnic_no = ?"""
         return session.exec(select(cls).where(cls.cnic_no == cnic_no)).first()
 
+    @classmethod
+    def get_by_account_number(cls, session: Session, account_no: str) -> Optional['AccountApplication']:
+        """SQL Query: SELECT * FROM accountapplication WHERE account_no = ?"""
+        return session.exec(select(cls).where(cls.account_no == account_no)).first()
+
+    @classmethod
+    def get_by_iban(cls, session: Session, iban: str) -> Optional['AccountApplication']:
+        """SQL Query: SELECT * FROM accountapplication WHERE iban = ?"""
+        return session.exec(select(cls).where(cls.iban == iban)).first()
+
     @classmethod
     def get_by_account_type(cls, session: Session, account_type: AccountType) -> List['AccountApplication']:
         """SQL Query: SELECT * FROM accountapplication WHERE account_type = ?"""
@@ -271,6 +430,11 @@ class AccountApplication(SQLModel, table=True):
     def count_total(cls, session: Session) -> int:
         """SQL Query: SELECT COUNT(*) FROM accountapplication"""
         from sqlmodel import func
+        store = _columnar_store()
+        if store is not None:
+            return store.count()
+        if ANALYTICS_COUNTERS_ENABLED:
+            return AnalyticsCounter.totals(session)["count"]
         return session.exec(select(func.count(cls.id))).one()
 
     @classmethod
@@ -278,133 +442,198 @@ class AccountApplication(SQLModel, table=True):
         """SQL Query: SELECT * FROM accountapplication LIMIT ? OFFSET ?"""
         return session.exec(select(cls).offset(skip).limit(limit)).all()
 
+    @classmethod
+    def filter_clauses(cls, cnic_no: Optional[str] = None, account_type: Optional[str] = None,
+                       city: Optional[str] = None, account_no: Optional[str] = None,
+                       iban: Optional[str] = None) -> list:
+        """WHERE clauses for the search filters, skipping the ones not given"""
+        filters = {
+            cls.cnic_no: cnic_no,
+            cls.account_type: account_type,
+            cls.city: city,
+            cls.account_no: account_no,
+            cls.iban: iban
+        }
+        return [column == value for column, value in filters.items() if value is not None]
+
+    @classmethod
+    def stream_rows(cls, session: Session, chunk_size: int = 1000, **filters) -> Iterator[List[dict]]:
+        """
+        SQL Query: SELECT * FROM accountapplication WHERE ... ORDER BY id
+
+        Yields chunks of plain row mappings from a server-side cursor (yield_per), so
+        memory stays constant regardless of how many rows match.
+        """
+        from sqlalchemy import select as core_select
+        statement = (
+            core_select(cls.__table__)
+            .where(*cls.filter_clauses(**filters))
+            .order_by(cls.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for partition in session.exec(statement).mappings().partitions():
+            yield [dict(row) for row in partition]
+
+    @classmethod
+    def get_page_after(cls, session: Session, limit: int = 10, sort: str = "id",
+                       after: Optional[tuple] = None, skip: int = 0, where: tuple = ()) -> List['AccountApplication']:
+        """
+        SQL Query: SELECT * FROM accountapplication WHERE (sort_key, id) > (?, ?)
+                   ORDER BY sort_key NULLS FIRST, id LIMIT ?
+
+        Keyset pagination: `after` is the (sort_key, id) of the last row of the previous
+        page, so every page is an index range scan regardless of depth. Without `after`
+        the page starts at `skip` rows (OFFSET) for backwards compatibility.
+        """
+        from sqlmodel import and_, or_
+        statement = select(cls).where(*where)
+        if sort == "id":
+            if after is not None:
+                statement = statement.where(cls.id > after[1])
+            statement = statement.order_by(cls.id)
+        else:
+            column = getattr(cls, sort)
+            if after is not None:
+                key, last_id = after
+                if key is None:
+                    # NULL keys sort first: finish the NULL run, then every non-NULL key
+                    statement = statement.where(or_(and_(column.is_(None), cls.id > last_id), column.is_not(None)))
+                else:
+                    statement = statement.where(or_(column > key, and_(column == key, cls.id > last_id)))
+            statement = statement.order_by(column.asc().nulls_first(), cls.id)
+        if after is None and skip:
+            statement = statement.offset(skip)
+        return session.exec(statement.limit(limit)).all()
+
     # Analytics Query Methods
+    @classmethod
+    def _count_by(cls, session: Session, dimension: str, null_label: str) -> dict:
+        """Counts per value of a dimension, read from the columnar store or the counter table when enabled"""
+        from sqlmodel import func
+        store = _columnar_store()
+        if store is not None:
+            results = store.counts(dimension)
+        elif ANALYTICS_COUNTERS_ENABLED:
+            results = AnalyticsCounter.counts(session, dimension)
+        else:
+            column = getattr(cls, dimension)
+            results = session.exec(
+                select(column, func.count(cls.id))
+                .group_by(column)
+            ).all()
+        return {value or null_label: count for value, count in results}
+
     @classmethod
     def count_by_account_type(cls, session: Session) -> dict:
         """Get count of applications grouped by account type"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.account_type, func.count(cls.id))
-            .group_by(cls.account_type)
-        ).all()
-        return {acc_type or "UNKNOWN": count for acc_type, count in results}
+        return cls._count_by(session, "account_type", "UNKNOWN")
 
     @classmethod
     def count_by_city(cls, session: Session) -> dict:
         """Get count of applications grouped by city"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.city, func.count(cls.id))
-            .group_by(cls.city)
-        ).all()
-        return {city or "UNKNOWN": count for city, count in results}
+        return cls._count_by(session, "city", "UNKNOWN")
 
     @classmethod
     def count_by_gender(cls, session: Session) -> dict:
         """Get count of applications grouped by gender"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.gender, func.count(cls.id))
-            .group_by(cls.gender)
-        ).all()
-        return {gender or "UNKNOWN": count for gender, count in results}
+        return cls._count_by(session, "gender", "UNKNOWN")
 
     @classmethod
     def count_by_occupation(cls, session: Session) -> dict:
         """Get count of applications grouped by occupation"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.occupation, func.count(cls.id))
-            .group_by(cls.occupation)
-        ).all()
-        return {occupation or "UNKNOWN": count for occupation, count in results}
+        return cls._count_by(session, "occupation", "UNKNOWN")
 
     @classmethod
     def count_by_card_type(cls, session: Session) -> dict:
         """Get count of applications grouped by card type"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.card_type, func.count(cls.id))
-            .group_by(cls.card_type)
-        ).all()
-        return {card_type or "NO_CARD": count for card_type, count in results}
+        return cls._count_by(session, "card_type", "NO_CARD")
 
     @classmethod
     def count_by_card_network(cls, session: Session) -> dict:
         """Get count of applications grouped by card network"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.card_network, func.count(cls.id))
-            .group_by(cls.card_network)
-        ).all()
-        return {network or "NO_CARD": count for network, count in results}
+        return cls._count_by(session, "card_network", "NO_CARD")
 
     @classmethod
     def count_by_marital_status(cls, session: Session) -> dict:
         """Get count of applications grouped by marital status"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.marital_status, func.count(cls.id))
-            .group_by(cls.marital_status)
-        ).all()
-        return {status or "UNKNOWN": count for status, count in results}
+        return cls._count_by(session, "marital_status", "UNKNOWN")
 
     @classmethod
     def count_by_residential_status(cls, session: Session) -> dict:
         """Get count of applications grouped by residential status"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.residential_status, func.count(cls.id))
-            .group_by(cls.residential_status)
-        ).all()
-        return {status or "UNKNOWN": count for status, count in results}
+        return cls._count_by(session, "residential_status", "UNKNOWN")
 
     @classmethod
     def get_services_stats(cls, session: Session) -> dict:
-        """Get count of applications with each service enabled"""
-        from sqlmodel import func
-        
-        internet_banking = session.exec(
-            select(func.count(cls.id)).where(cls.internet_banking == True)
-        ).one()
-        mobile_banking = session.exec(
-            select(func.count(cls.id)).where(cls.mobile_banking == True)
+        """Get count of applications with each service enabled (single scan)"""
+        store = _columnar_store()
+        if store is not None or ANALYTICS_COUNTERS_ENABLED:
+            flags = store.flag_counts() if store is not None else AnalyticsCounter.flag_counts(session)
+            return {service: flags[service][True] for service in SERVICE_FIELDS}
+        row = session.exec(
+            select(*(_count_if(getattr(cls, service) == True) for service in SERVICE_FIELDS))
         ).one()
-        check_book = session.exec(
-            select(func.count(cls.id)).where(cls.check_book == True)
-        ).one()
-        sms_alerts = session.exec(
-            select(func.count(cls.id)).where(cls.sms_alerts == True)
-        ).one()
-        zakat_deduction = session.exec(
-            select(func.count(cls.id)).where(cls.zakat_deduction == True)
-        ).one()
-        
-        return {
-            "internet_banking": internet_banking,
-            "mobile_banking": mobile_banking,
-            "check_book": check_book,
-            "sms_alerts": sms_alerts,
-            "zakat_deduction": zakat_deduction
-        }
+        return dict(zip(SERVICE_FIELDS, row))
 
     @classmethod
     def get_kin_stats(cls, session: Session) -> dict:
-        """Get count of applications with/without next of kin"""
-        from sqlmodel import func
-        
-        with_kin = session.exec(
-            select(func.count(cls.id)).where(cls.has_next_of_kin == True)
-        ).one()
-        without_kin = session.exec(
-            select(func.count(cls.id)).where(cls.has_next_of_kin == False)
-        ).one()
+        """Get count of applications with/without next of kin (single scan)"""
+        store = _columnar_store()
+        if store is not None or ANALYTICS_COUNTERS_ENABLED:
+            kin = (store.flag_counts() if store is not None else AnalyticsCounter.flag_counts(session))["has_next_of_kin"]
+            with_kin, without_kin = kin[True], kin[False]
+        else:
+            with_kin, without_kin = session.exec(
+                select(
+                    _count_if(cls.has_next_of_kin == True),
+                    _count_if(cls.has_next_of_kin == False)
+                )
+            ).one()
         
         return {
             "with_next_of_kin": with_kin,
             "without_next_of_kin": without_kin
         }
 
+    @classmethod
+    def get_dashboard_stats(cls, session: Session) -> dict:
+        """
+        Dashboard counters in one scan: total, services adoption and kin stats are
+        computed with SUM(CASE ...) in a single SELECT, then one GROUP BY per dimension.
+        """
+        from sqlmodel import func
+
+        store = _columnar_store()
+        if store is not None or ANALYTICS_COUNTERS_ENABLED:
+            flags = store.flag_counts() if store is not None else AnalyticsCounter.flag_counts(session)
+            service_counts = [flags[service][True] for service in SERVICE_FIELDS]
+            with_kin, without_kin = flags["has_next_of_kin"][True], flags["has_next_of_kin"][False]
+            total = with_kin + without_kin
+        else:
+            row = session.exec(
+                select(
+                    func.count(cls.id),
+                    *(_count_if(getattr(cls, service) == True) for service in SERVICE_FIELDS),
+                    _count_if(cls.has_next_of_kin == True),
+                    _count_if(cls.has_next_of_kin == False)
+                )
+            ).one()
+            total, *service_counts, with_kin, without_kin = row
+
+        return {
+            "total_applications": total,
+            "account_types": cls.count_by_account_type(session),
+            "gender_distribution": cls.count_by_gender(session),
+            "card_types": cls.count_by_card_type(session),
+            "card_networks": cls.count_by_card_network(session),
+            "top_cities": dict(list(cls.count_by_city(session).items())[:10]),
+            "services_adoption": dict(zip(SERVICE_FIELDS, service_counts)),
+            "kin_stats": {
+                "with_next_of_kin": with_kin,
+                "without_next_of_kin": without_kin
+            }
+        }
+
     # ==================== ADVANCED ANALYTICS ====================
     
     @classmethod
@@ -416,6 +645,34 @@ class AccountApplication(SQLModel, table=True):
     def get_financial_stats(cls, session: Session) -> dict:
         """Get financial statistics - avg, min, max turnover"""
         from sqlmodel import func
+
+        store = _columnar_store()
+        if store is not None or ANALYTICS_COUNTERS_ENABLED:
+            totals = store.totals() if store is not None else AnalyticsCounter.totals(session)
+            dr_stats = AnalyticsCounter.turnover_stats(totals, "dr")
+            cr_stats = AnalyticsCounter.turnover_stats(totals, "cr")
+        else:
+            dr_stats, cr_stats = cls._scan_financial_stats(session)
+
+        return {
+            "debit_turnover": {
+                "average": float(dr_stats[0]) if dr_stats[0] else 0,
+                "minimum": float(dr_stats[1]) if dr_stats[1] else 0,
+                "maximum": float(dr_stats[2]) if dr_stats[2] else 0,
+                "total": float(dr_stats[3]) if dr_stats[3] else 0
+            },
+            "credit_turnover": {
+                "average": float(cr_stats[0]) if cr_stats[0] else 0,
+                "minimum": float(cr_stats[1]) if cr_stats[1] else 0,
+                "maximum": float(cr_stats[2]) if cr_stats[2] else 0,
+                "total": float(cr_stats[3]) if cr_stats[3] else 0
+            }
+        }
+
+    @classmethod
+    def _scan_financial_stats(cls, session: Session) -> tuple:
+        """(avg, min, max, sum) of debit and credit turnover computed over the base table"""
+        from sqlmodel import func
         
         # Debit turnover stats
         dr_stats = session.exec(
@@ -437,29 +694,47 @@ class AccountApplication(SQLModel, table=True):
             ).where(cls.expected_monthly_turnover_cr != None)
         ).first()
         
-        return {
-            "debit_turnover": {
-                "average": float(dr_stats[0]) if dr_stats[0] else 0,
-                "minimum": float(dr_stats[1]) if dr_stats[1] else 0,
-                "maximum": float(dr_stats[2]) if dr_stats[2] else 0,
-                "total": float(dr_stats[3]) if dr_stats[3] else 0
-            },
-            "credit_turnover": {
-                "average": float(cr_stats[0]) if cr_stats[0] else 0,
-                "minimum": float(cr_stats[1]) if cr_stats[1] else 0,
-                "maximum": float(cr_stats[2]) if cr_stats[2] else 0,
-                "total": float(cr_stats[3]) if cr_stats[3] else 0
-            }
-        }
+        return dr_stats, cr_stats
+
+    @classmethod
+    def _cube_measure(cls, measure: str):
+        """count, or <sum|avg|min|max>_<cr|dr> of the monthly credit/debit turnover"""
+        from sqlmodel import func
+        if measure == "count":
+            return func.count(cls.id)
+        aggregate, side = measure.split("_")
+        return getattr(func, aggregate)(getattr(cls, f"expected_monthly_turnover_{side}"))
+
+    @classmethod
+    def get_cube(cls, session: Session, dimensions: Sequence[str], measures: Sequence[str],
+                 filters: Optional[Dict[str, list]] = None) -> List[tuple]:
+        """
+        SQL Query: SELECT <dimensions>, <measures> FROM accountapplication
+                   WHERE <column> IN (<values>) AND ...
+                   GROUP BY <dimensions> ORDER BY <dimensions>
+
+        Dimensions, measures and filter columns come from CUBE_DIMENSIONS, CUBE_MEASURES
+        and CUBE_FILTERS. Returns (*dimension values, *measure values) per group, NULL
+        dimension values first; without dimensions, one row for the whole (filtered) table.
+        """
+        filters = filters or {}
+        store = _columnar_store()
+        if store is not None:
+            return store.cube(dimensions, measures, filters)
+        columns = [getattr(cls, dimension) for dimension in dimensions]
+        statement = (
+            select(*columns, *(cls._cube_measure(measure) for measure in measures))
+            .where(*(getattr(cls, column).in_(values) for column, values in filters.items()))
+        )
+        if columns:
+            statement = statement.group_by(*columns).order_by(*columns)
+        # Rows as tuples even for a single selected column
+        return session.connection().execute(statement).all()
 
     @classmethod
     def get_cross_analysis_gender_account(cls, session: Session) -> dict:
         """Cross-tabulation: Gender vs Account Type"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.gender, cls.account_type, func.count(cls.id))
-            .group_by(cls.gender, cls.account_type)
-        ).all()
+        results = cls.get_cube(session, ("gender", "account_type"), ("count",))
         
         cross_data = {}
         for gender, acc_type, count in results:
@@ -473,11 +748,7 @@ class AccountApplication(SQLModel, table=True):
     @classmethod
     def get_cross_analysis_occupation_card(cls, session: Session) -> dict:
         """Cross-tabulation: Occupation vs Card Type"""
-        from sqlmodel import func
-        results = session.exec(
-            select(cls.occupation, cls.card_type, func.count(cls.id))
-            .group_by(cls.occupation, cls.card_type)
-        ).all()
+        results = cls.get_cube(session, ("occupation", "card_type"), ("count",))
         
         cross_data = {}
         for occupation, card_type, count in results:
@@ -490,19 +761,11 @@ class AccountApplication(SQLModel, table=True):
 
     @classmethod
     def get_city_performance(cls, session: Session) -> List[dict]:
-        """Get comprehensive city-wise performance metrics"""
-        from sqlmodel import func
-        
-        results = session.exec(
-            select(
-                cls.city,
-                func.count(cls.id),
-                func.avg(cls.expected_monthly_turnover_cr),
-                func.sum(cls.expected_monthly_turnover_cr)
-            )
-            .group_by(cls.city)
-            .order_by(func.count(cls.id).desc())
-        ).all()
+        """Get comprehensive city-wise performance metrics, by application count"""
+        results = sorted(
+            cls.get_cube(session, ("city",), ("count", "avg_cr", "sum_cr")),
+            key=lambda row: -row[1]
+        )
         
         return [
             {
@@ -516,19 +779,12 @@ class AccountApplication(SQLModel, table=True):
 
     @classmethod
     def get_avg_turnover_by_occupation(cls, session: Session) -> List[dict]:
-        """Get average turnover grouped by occupation"""
-        from sqlmodel import func
-        
-        results = session.exec(
-            select(
-                cls.occupation,
-                func.count(cls.id),
-                func.avg(cls.expected_monthly_turnover_dr),
-                func.avg(cls.expected_monthly_turnover_cr)
-            )
-            .group_by(cls.occupation)
-            .order_by(func.avg(cls.expected_monthly_turnover_cr).desc())
-        ).all()
+        """Get average turnover grouped by occupation, highest average credit first"""
+        # avg credit DESC, NULLs last as SQLite orders them
+        results = sorted(
+            cls.get_cube(session, ("occupation",), ("count", "avg_dr", "avg_cr")),
+            key=lambda row: (row[3] is None, -(row[3] or 0))
+        )
         
         return [
             {
@@ -547,47 +803,58 @@ class AccountApplication(SQLModel, table=True):
         
         premium_cards = ['PLATINUM', 'SIGNATURE', 'INFINITE']
         
-        # Gender distribution
-        gender_dist = session.exec(
-            select(cls.gender, func.count(cls.id))
-            .where(cls.card_type.in_(premium_cards))
-            .group_by(cls.gender)
-        ).all()
+        store = _columnar_store()
+        if store is not None:
+            with store.reading():
+                premium = store.isin("card_type", premium_cards)
+                gender_dist = store.counts("gender", premium)
+                occupation_dist = store.counts("occupation", premium)
+                # ORDER BY count DESC, city: a stable sort of the value-ordered counts
+                city_dist = sorted(store.counts("city", premium), key=lambda row: -row[1])[:10]
+                premium_avg = store.mean_in("expected_monthly_turnover_cr", "card_type", premium_cards)
+                non_premium_avg = store.mean_in("expected_monthly_turnover_cr", "card_type", premium_cards, negate=True)
+        else:
+            # Gender distribution
+            gender_dist = session.exec(
+                select(cls.gender, func.count(cls.id))
+                .where(cls.card_type.in_(premium_cards))
+                .group_by(cls.gender)
+            ).all()
         
-        # Occupation distribution
-        occupation_dist = session.exec(
-            select(cls.occupation, func.count(cls.id))
-            .where(cls.card_type.in_(premium_cards))
-            .group_by(cls.occupation)
-        ).all()
-        
-        # City distribution
-        city_dist = session.exec(
-            select(cls.city, func.count(cls.id))
-            .where(cls.card_type.in_(premium_cards))
-            .group_by(cls.city)
-            .order_by(func.count(cls.id).desc())
-            .limit(10)
-        ).all()
+            # Occupation distribution
+            occupation_dist = session.exec(
+                select(cls.occupation, func.count(cls.id))
+                .where(cls.card_type.in_(premium_cards))
+                .group_by(cls.occupation)
+            ).all()
         
-        # Average turnover for premium vs non-premium
-        premium_avg = session.exec(
-            select(func.avg(cls.expected_monthly_turnover_cr))
-            .where(cls.card_type.in_(premium_cards))
-        ).first()
+            # City distribution
+            city_dist = session.exec(
+                select(cls.city, func.count(cls.id))
+                .where(cls.card_type.in_(premium_cards))
+                .group_by(cls.city)
+                .order_by(func.count(cls.id).desc(), cls.city)
+                .limit(10)
+            ).all()
         
-        non_premium_avg = session.exec(
-            select(func.avg(cls.expected_monthly_turnover_cr))
-            .where(cls.card_type.not_in(premium_cards))
-        ).first()
+            # Average turnover for premium vs non-premium
+            premium_avg = session.exec(
+                select(func.avg(cls.expected_monthly_turnover_cr))
+                .where(cls.card_type.in_(premium_cards))
+            ).first()
         
+            non_premium_avg = session.exec(
+                select(func.avg(cls.expected_monthly_turnover_cr))
+                .where(cls.card_type.not_in(premium_cards))
+            ).first()
+
         return {
             "total_premium_holders": sum(count for _, count in gender_dist),
             "gender_distribution": {g or "UNKNOWN": c for g, c in gender_dist},
             "occupation_distribution": {o or "UNKNOWN": c for o, c in occupation_dist},
             "top_cities": {city or "UNKNOWN": c for city, c in city_dist},
-            "avg_monthly_credit_premium": round(float(premium_avg[0]), 2) if premium_avg and premium_avg[0] else 0,
-            "avg_monthly_credit_non_premium": round(float(non_premium_avg[0]), 2) if non_premium_avg and non_premium_avg[0] else 0
+            "avg_monthly_credit_premium": round(float(premium_avg), 2) if premium_avg else 0,
+            "avg_monthly_credit_non_premium": round(float(non_premium_avg), 2) if non_premium_avg else 0
         }
 
     @classmethod
@@ -595,43 +862,54 @@ class AccountApplication(SQLModel, table=True):
         """Analyze digital services adoption patterns"""
         from sqlmodel import func
         
-        total = session.exec(select(func.count(cls.id))).one()
+        store = _columnar_store()
+        if store is not None:
+            with store.reading():
+                internet, mobile = store.flag("internet_banking"), store.flag("mobile_banking")
+                total = store.count()
+                full_digital = store.count(internet & mobile)
+                internet_only = store.count(internet & ~mobile)
+                mobile_only = store.count(~internet & mobile)
+                no_digital = store.count(~internet & ~mobile)
+                digital_by_account = store.counts("account_type", internet | mobile)
+        else:
+            total = session.exec(select(func.count(cls.id))).one()
         
-        # Both internet and mobile banking
-        full_digital = session.exec(
-            select(func.count(cls.id))
-            .where(cls.internet_banking == True)
-            .where(cls.mobile_banking == True)
-        ).one()
+            # Both internet and mobile banking
+            full_digital = session.exec(
+                select(func.count(cls.id))
+                .where(cls.internet_banking == True)
+                .where(cls.mobile_banking == True)
+            ).one()
         
-        # Only internet banking
-        internet_only = session.exec(
-            select(func.count(cls.id))
-            .where(cls.internet_banking == True)
-            .where(cls.mobile_banking == False)
-        ).one()
+            # Only internet banking
+            internet_only = session.exec(
+                select(func.count(cls.id))
+                .where(cls.internet_banking == True)
+                .where(cls.mobile_banking == False)
+            ).one()
         
-        # Only mobile banking
-        mobile_only = session.exec(
-            select(func.count(cls.id))
-            .where(cls.internet_banking == False)
-            .where(cls.mobile_banking == True)
-        ).one()
+            # Only mobile banking
+            mobile_only = session.exec(
+                select(func.count(cls.id))
+                .where(cls.internet_banking == False)
+                .where(cls.mobile_banking == True)
+            ).one()
         
-        # No digital banking
-        no_digital = session.exec(
-            select(func.count(cls.id))
-            .where(cls.internet_banking == False)
-            .where(cls.mobile_banking == False)
-        ).one()
-        
-        # Digital adoption by account type
-        digital_by_account = session.exec(
-            select(cls.account_type, func.count(cls.id))
-            .where((cls.internet_banking == True) | (cls.mobile_banking == True))
-            .group_by(cls.account_type)
-        ).all()
+            # No digital banking
+            no_digital = session.exec(
+                select(func.count(cls.id))
+                .where(cls.internet_banking == False)
+                .where(cls.mobile_banking == False)
+            ).one()
         
+            # Digital adoption by account type
+            digital_by_account = session.exec(
+                select(cls.account_type, func.count(cls.id))
+                .where((cls.internet_banking == True) | (cls.mobile_banking == True))
+                .group_by(cls.account_type)
+            ).all()
+
         return {
             "total_customers": total,
             "full_digital_customers": full_digital,
@@ -647,163 +925,827 @@ class AccountApplication(SQLModel, table=True):
     def get_high_value_customers(cls, session: Session, threshold: float = 500000) -> dict:
         """Identify and analyze high-value customers (above threshold monthly credit)"""
         from sqlmodel import func
-        
-        # High value customers
-        high_value = session.exec(
-            select(cls)
-            .where(cls.expected_monthly_turnover_cr >= threshold)
-            .order_by(cls.expected_monthly_turnover_cr.desc())
-        ).all()
-        
-        total_high_value = len(high_value)
-        total_all = session.exec(select(func.count(cls.id))).one()
-        
-        # Analyze high value customer profiles
-        card_dist = {}
-        occupation_dist = {}
-        city_dist = {}
-        account_dist = {}
-        
-        for customer in high_value:
-            card_dist[customer.card_type or "NO_CARD"] = card_dist.get(customer.card_type or "NO_CARD", 0) + 1
-            occupation_dist[customer.occupation or "UNKNOWN"] = occupation_dist.get(customer.occupation or "UNKNOWN", 0) + 1
-            city_dist[customer.city or "UNKNOWN"] = city_dist.get(customer.city or "UNKNOWN", 0) + 1
-            account_dist[customer.account_type or "UNKNOWN"] = account_dist.get(customer.account_type or "UNKNOWN", 0) + 1
-        
+
+        store = _columnar_store()
+        # Every query is a range scan of the (expected_monthly_turnover_cr, id) index
+        high_value = cls.expected_monthly_turnover_cr >= threshold
+
+        def distribution(dimension: str, null_label: str, limit: Optional[int] = None) -> dict:
+            if store is not None:
+                # ORDER BY count DESC, value: a stable sort of the value-ordered counts
+                results = sorted(store.counts(dimension, high_value_rows), key=lambda row: -row[1])[:limit]
+                return {value or null_label: count for value, count in results}
+            column = getattr(cls, dimension)
+            statement = (
+                select(column, func.count(cls.id))
+                .where(high_value)
+                .group_by(column)
+                .order_by(func.count(cls.id).desc(), column)
+            )
+            if limit:
+                statement = statement.limit(limit)
+            return {value or null_label: count for value, count in session.exec(statement).all()}
+
+        with store.reading() if store is not None else nullcontext():
+            if store is not None:
+                high_value_rows = store.at_least("expected_monthly_turnover_cr", threshold)
+                total_high_value = store.count(high_value_rows)
+            else:
+                total_high_value = session.exec(select(func.count(cls.id)).where(high_value)).one()
+            total_all = cls.count_total(session)
+
+            return {
+                "threshold": threshold,
+                "total_high_value_customers": total_high_value,
+                "percentage_of_total": round((total_high_value / total_all) * 100, 2) if total_all > 0 else 0,
+                "preferred_card_types": distribution("card_type", "NO_CARD"),
+                "top_occupations": distribution("occupation", "UNKNOWN", 5),
+                "top_cities": distribution("city", "UNKNOWN", 5),
+                "account_type_preference": distribution("account_type", "UNKNOWN")
+            }
+
+    @staticmethod
+    def turnover_bucket(value: float) -> str:
+        """Histogram bucket label (lower edge) for a monthly credit turnover"""
+        edge = TURNOVER_BUCKET_EDGES[max(bisect.bisect_right(TURNOVER_BUCKET_EDGES, value) - 1, 0)]
+        return str(edge)
+
+    @classmethod
+    def turnover_bucket_expr(cls):
+        """SQL CASE equivalent of turnover_bucket"""
+        from sqlmodel import case
+        column = cls.expected_monthly_turnover_cr
+        return case(
+            *((column >= edge, str(edge)) for edge in reversed(TURNOVER_BUCKET_EDGES[1:])),
+            else_=str(TURNOVER_BUCKET_EDGES[0])
+        )
+
+    @classmethod
+    def get_turnover_histogram(cls, session: Session) -> dict:
+        """Monthly credit turnover histogram with cumulative counts at each bucket edge"""
+        from sqlmodel import func
+        store = _columnar_store()
+        if store is not None:
+            results = store.turnover_buckets()
+        elif ANALYTICS_COUNTERS_ENABLED:
+            results = AnalyticsCounter.counts(session, TURNOVER_BUCKET_DIMENSION)
+        else:
+            bucket = cls.turnover_bucket_expr()
+            results = session.exec(
+                select(bucket, func.count(cls.id))
+                .where(cls.expected_monthly_turnover_cr != None)
+                .group_by(bucket)
+            ).all()
+        counts = {int(edge): count for edge, count in results}
+
+        buckets = []
+        at_or_above = {}
+        remaining = sum(counts.values())
+        for index, edge in enumerate(TURNOVER_BUCKET_EDGES):
+            upper = TURNOVER_BUCKET_EDGES[index + 1] if index + 1 < len(TURNOVER_BUCKET_EDGES) else None
+            buckets.append({"from": edge, "to": upper, "count": counts.get(edge, 0)})
+            at_or_above[str(edge)] = remaining
+            remaining -= counts.get(edge, 0)
+
         return {
-            "threshold": threshold,
-            "total_high_value_customers": total_high_value,
-            "percentage_of_total": round((total_high_value / total_all) * 100, 2) if total_all > 0 else 0,
-            "preferred_card_types": dict(sorted(card_dist.items(), key=lambda x: x[1], reverse=True)),
-            "top_occupations": dict(sorted(occupation_dist.items(), key=lambda x: x[1], reverse=True)[:5]),
-            "top_cities": dict(sorted(city_dist.items(), key=lambda x: x[1], reverse=True)[:5]),
-            "account_type_preference": account_dist
+            "customers_with_turnover": sum(counts.values()),
+            "buckets": buckets,
+            "customers_at_or_above": at_or_above
         }
 
     @classmethod
-    def get_profile_completeness(cls, session: Session) -> dict:
-        """Analyze how complete customer profiles are"""
-        all_apps = session.exec(select(cls)).all()
-        
-        completeness_scores = []
-        field_completion = {
-            "fathers_husbands_name": 0,
-            "mothers_name": 0,
-            "date_of_birth": 0,
-            "nationality": 0,
-            "place_of_birth": 0,
-            "address_complete": 0,
-            "occupation": 0,
-            "financial_info": 0,
-            "residential_status": 0,
-            "next_of_kin": 0,
-            "card_selected": 0
+    def _profile_checks(cls) -> dict:
+        """PROFILE_FIELDS -> SQL predicate (mirrors compute_profile_score)"""
+        from sqlmodel import and_, or_
+
+        def present(column):
+            return and_(column.is_not(None), column != "")
+
+        def nonzero(column):
+            return and_(column.is_not(None), column != 0)
+
+        return {
+            "fathers_husbands_name": present(cls.fathers_husbands_name),
+            "mothers_name": present(cls.mothers_name),
+            "date_of_birth": present(cls.date_of_birth),
+            "nationality": present(cls.nationality),
+            "place_of_birth": present(cls.place_of_birth),
+            "address_complete": and_(present(cls.house_no_block_street), present(cls.city), present(cls.postal_code)),
+            "occupation": present(cls.occupation),
+            "financial_info": or_(nonzero(cls.expected_monthly_turnover_cr), nonzero(cls.expected_monthly_turnover_dr)),
+            "residential_status": present(cls.residential_status),
+            "next_of_kin": and_(cls.has_next_of_kin == True, present(cls.next_of_kin_name)),
+            "card_selected": present(cls.card_type)
         }
-        
-        for app in all_apps:
-            score = 0
-            total_fields = 11
-            
-            if app.fathers_husbands_name:
-                score += 1
-                field_completion["fathers_husbands_name"] += 1
-            if app.mothers_name:
-                score += 1
-                field_completion["mothers_name"] += 1
-            if app.date_of_birth:
-                score += 1
-                field_completion["date_of_birth"] += 1
-            if app.nationality:
-                score += 1
-                field_completion["nationality"] += 1
-            if app.place_of_birth:
-                score += 1
-                field_completion["place_of_birth"] += 1
-            if app.house_no_block_street and app.city and app.postal_code:
-                score += 1
-                field_completion["address_complete"] += 1
-            if app.occupation:
-                score += 1
-                field_completion["occupation"] += 1
-            if app.expected_monthly_turnover_cr or app.expected_monthly_turnover_dr:
-                score += 1
-                field_completion["financial_info"] += 1
-            if app.residential_status:
-                score += 1
-                field_completion["residential_status"] += 1
-            if app.has_next_of_kin and app.next_of_kin_name:
-                score += 1
-                field_completion["next_of_kin"] += 1
-            if app.card_type:
-                score += 1
-                field_completion["card_selected"] += 1
-            
-            completeness_scores.append((score / total_fields) * 100)
-        
-        total_apps = len(all_apps)
-        avg_completeness = sum(completeness_scores) / total_apps if total_apps > 0 else 0
+
+    @staticmethod
+    def profile_field_checks(app: 'AccountApplication') -> tuple:
+        """Whether each of PROFILE_FIELDS is completed on an application (mirrors _profile_checks)"""
+        checks = (
+            app.fathers_husbands_name,
+            app.mothers_name,
+            app.date_of_birth,
+            app.nationality,
+            app.place_of_birth,
+            app.house_no_block_street and app.city and app.postal_code,
+            app.occupation,
+            app.expected_monthly_turnover_cr or app.expected_monthly_turnover_dr,
+            app.residential_status,
+            app.has_next_of_kin and app.next_of_kin_name,
+            app.card_type
+        )
+        return tuple(bool(check) for check in checks)
+
+    @staticmethod
+    def compute_profile_score(app: 'AccountApplication') -> int:
+        """Number of PROFILE_FIELDS completed on an application"""
+        return sum(AccountApplication.profile_field_checks(app))
+
+    @classmethod
+    def backfill_profile_scores(cls, session: Session) -> int:
+        """SQL Query: UPDATE accountapplication SET profile_completeness_score = ... WHERE profile_completeness_score IS NULL"""
+        from sqlmodel import update, case
+        score = sum(case((check, 1), else_=0) for check in cls._profile_checks().values())
+        result = session.exec(
+            update(cls)
+            .where(cls.profile_completeness_score.is_(None))
+            .values(profile_completeness_score=score)
+        )
+        session.commit()
+        return result.rowcount
+
+    @classmethod
+    def get_profile_completeness(cls, session: Session) -> dict:
+        """Analyze how complete customer profiles are (one aggregate over the persisted score)"""
+        from sqlmodel import func
+
+        total_fields = len(PROFILE_FIELDS)
+        store = _columnar_store()
+        if store is not None:
+            row = store.profile_completeness()
+        else:
+            score = cls.profile_completeness_score
+            checks = cls._profile_checks()
+            row = session.exec(
+                select(
+                    func.count(cls.id),
+                    func.coalesce(func.sum(score), 0),
+                    _count_if(score == total_fields),
+                    _count_if(score * 100 >= 80 * total_fields),
+                    _count_if(score * 100 < 50 * total_fields),
+                    *(_count_if(checks[field]) for field in PROFILE_FIELDS)
+                )
+            ).one()
+        total_apps, score_sum, fully_complete, above_80, below_50, *field_counts = row
+
+        avg_completeness = (score_sum / total_fields) * 100 / total_apps if total_apps > 0 else 0
         
         return {
             "total_applications": total_apps,
             "average_completeness_percentage": round(avg_completeness, 2),
-            "fully_complete_profiles": sum(1 for s in completeness_scores if s == 100),
-            "above_80_percent": sum(1 for s in completeness_scores if s >= 80),
-            "below_50_percent": sum(1 for s in completeness_scores if s < 50),
+            "fully_complete_profiles": fully_complete,
+            "above_80_percent": above_80,
+            "below_50_percent": below_50,
             "field_completion_rates": {
-                k: round((v / total_apps) * 100, 2) if total_apps > 0 else 0 
-                for k, v in field_completion.items()
+                field: round((count / total_apps) * 100, 2) if total_apps > 0 else 0
+                for field, count in zip(PROFILE_FIELDS, field_counts)
             }
         }
 
     @classmethod
-    def get_customer_segments(cls, session: Session) -> dict:
-        """Segment customers based on multiple factors"""
-        all_apps = session.exec(select(cls)).all()
-        
-        segments = {
-            "premium_digital_natives": [],  # Premium cards + full digital
-            "high_value_traditional": [],   # High turnover, no digital
-            "young_professionals": [],       # Students/service + digital
-            "business_owners": [],           # Business occupation
-            "value_seekers": [],             # Basic cards, basic services
-            "fully_engaged": []              # All services enabled
+    def get_incomplete_profiles(cls, session: Session, below_percentage: float = 50, limit: int = 50,
+                                after: Optional[tuple] = None) -> List['AccountApplication']:
+        """SQL Query: SELECT * FROM accountapplication WHERE profile_completeness_score < ?
+                      ORDER BY profile_completeness_score, id LIMIT ?"""
+        max_score = below_percentage * len(PROFILE_FIELDS) / 100
+        return cls.get_page_after(
+            session, limit, "profile_completeness_score", after,
+            where=(cls.profile_completeness_score < max_score,)
+        )
+
+    @classmethod
+    def _segment_predicates(cls) -> dict:
+        """Customer segment name -> SQL predicate"""
+        from sqlmodel import and_, or_
+        return {
+            # Premium cards + full digital
+            "premium_digital_natives": and_(
+                cls.card_type.in_(['PLATINUM', 'SIGNATURE', 'INFINITE']),
+                cls.internet_banking == True, cls.mobile_banking == True
+            ),
+            # High turnover, no digital
+            "high_value_traditional": and_(
+                cls.expected_monthly_turnover_cr >= 300000,
+                cls.internet_banking == False, cls.mobile_banking == False
+            ),
+            # Students/service + digital
+            "young_professionals": and_(
+                cls.occupation.in_(['STUDENT', 'SERVICE_PRIVATE', 'IT_PROFESSIONAL']),
+                or_(cls.internet_banking == True, cls.mobile_banking == True)
+            ),
+            # Business occupation
+            "business_owners": cls.occupation.in_(['BUSINESS', 'SELF_EMPLOYED']),
+            # Basic cards, basic services
+            "value_seekers": and_(
+                or_(cls.card_type == 'CLASSIC', cls.card_type.is_(None)),
+                cls.internet_banking == False
+            ),
+            # All services enabled
+            "fully_engaged": and_(
+                cls.internet_banking == True, cls.mobile_banking == True, cls.sms_alerts == True,
+                cls.card_type.is_not(None), cls.card_type != ""
+            )
         }
-        
-        for app in all_apps:
-            # Premium Digital Natives
-            if app.card_type in ['PLATINUM', 'SIGNATURE', 'INFINITE'] and app.internet_banking and app.mobile_banking:
-                segments["premium_digital_natives"].append(app.id)
-            
-            # High Value Traditional
-            if (app.expected_monthly_turnover_cr and app.expected_monthly_turnover_cr >= 300000 and 
-                not app.internet_banking and not app.mobile_banking):
-                segments["high_value_traditional"].append(app.id)
-            
-            # Young Professionals (assuming students and new employees)
-            if app.occupation in ['STUDENT', 'SERVICE_PRIVATE', 'IT_PROFESSIONAL'] and (app.internet_banking or app.mobile_banking):
-                segments["young_professionals"].append(app.id)
-            
-            # Business Owners
-            if app.occupation in ['BUSINESS', 'SELF_EMPLOYED']:
-                segments["business_owners"].append(app.id)
-            
-            # Value Seekers
-            if app.card_type in ['CLASSIC', None] and not app.internet_banking:
-                segments["value_seekers"].append(app.id)
-            
-            # Fully Engaged
-            if (app.internet_banking and app.mobile_banking and 
-                app.sms_alerts and app.card_type):
-                segments["fully_engaged"].append(app.id)
-        
-        total = len(all_apps)
+
+    @classmethod
+    def get_customer_segments(cls, session: Session) -> dict:
+        """Segment customers based on multiple factors (one SUM(CASE ...) per segment, single scan)"""
+        from sqlmodel import func
+
+        store = _columnar_store()
+        if store is not None:
+            total, *counts = store.segment_counts()
+        else:
+            total, *counts = session.exec(
+                select(func.count(cls.id), *(_count_if(predicate) for predicate in cls._segment_predicates().values()))
+            ).one()
+
         return {
             "total_customers": total,
             "segments": {
-                k: {
-                    "count": len(v),
-                    "percentage": round((len(v) / total) * 100, 2) if total > 0 else 0
+                name: {
+                    "count": count,
+                    "percentage": round((count / total) * 100, 2) if total > 0 else 0
                 }
-                for k, v in segments.items()
+                for name, count in zip(CUSTOMER_SEGMENTS, counts)
             }
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def get_segment_member_ids(cls, session: Session, segment: str, after_id: int = 0, limit: int = 100) -> List[int]:
+        """SQL Query: SELECT id FROM accountapplication WHERE <segment predicate> AND id > ? ORDER BY id LIMIT ?"""
+        store = _columnar_store()
+        if store is not None:
+            return store.segment_member_ids(segment, after_id, limit)
+        predicate = cls._segment_predicates()[segment]
+        return session.exec(
+            select(cls.id)
+            .where(predicate, cls.id > after_id)
+            .order_by(cls.id)
+            .limit(limit)
+        ).all()
+
+
+# Dimensions rolled up by AnalyticsCounter (one row per distinct value)
+COUNTER_DIMENSIONS = (
+    "account_type", "city", "gender", "occupation", "card_type",
+    "card_network", "marital_status", "residential_status"
+)
+# Boolean columns rolled up as "TRUE"/"FALSE" rows
+COUNTER_FLAGS = SERVICE_FIELDS + ("has_next_of_kin",)
+# Pseudo-dimension holding the table-wide totals and turnover min/max
+TOTAL_DIMENSION = "__total__"
+# NumberSequence advanced by every transaction that changes analytics results; response
+# caches in every process compare it to know whether their entries are current
+DATA_GENERATION_SEQUENCE = "data_generation"
+# Pseudo-dimension holding the credit turnover histogram (value = bucket lower edge)
+TURNOVER_BUCKET_DIMENSION = "turnover_cr_bucket"
+
+class AccountApplicationPage(SQLModel):
+    """A page of applications and the cursor for the next page (None on the last page)"""
+    items: List[AccountApplication]
+    next_cursor: Optional[str] = None
+
+
+# /analytics/cube: columns it groups by and filters on, and its measures (count, or an
+# aggregate of the monthly credit/debit turnover)
+CUBE_DIMENSIONS = COUNTER_DIMENSIONS
+CUBE_FILTERS = COUNTER_DIMENSIONS + COUNTER_FLAGS
+CUBE_MEASURES = ("count",) + tuple(
+    f"{aggregate}_{side}" for side in ("cr", "dr") for aggregate in ("sum", "avg", "min", "max")
+)
+CUBE_MAX_DIMENSIONS = 3
+
+
+class AnalyticsCounter(SQLModel, table=True):
+    """
+    Incrementally maintained rollup of AccountApplication.
+
+    One row per (dimension, value) with the application count and the debit/credit
+    turnover count and sum. The TOTAL_DIMENSION row additionally tracks turnover
+    min/max. Rows are upserted by AccountApplication.create/update_by_id/delete_by_id
+    in the same transaction as the write, so analytics read O(#categories) rows.
+    """
+    __table_args__ = (
+        # One row per key, so concurrent writers upsert instead of inserting duplicates; NULL
+        # values (the total row, missing categories) are keyed as '', which validation rejects
+        Index("ux_analyticscounter_dimension_value", "dimension", text("coalesce(value, '')"), unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    dimension: str = Field(index=True)
+    value: Optional[str] = None
+    count: int = Field(default=0)
+    turnover_dr_count: int = Field(default=0)
+    turnover_dr_sum: float = Field(default=0)
+    turnover_dr_min: Optional[float] = None
+    turnover_dr_max: Optional[float] = None
+    turnover_cr_count: int = Field(default=0)
+    turnover_cr_sum: float = Field(default=0)
+    turnover_cr_min: Optional[float] = None
+    turnover_cr_max: Optional[float] = None
+
+    @staticmethod
+    def snapshot(application: 'AccountApplication') -> dict:
+        """Capture the columns that feed the counters"""
+        fields = COUNTER_DIMENSIONS + COUNTER_FLAGS + ("expected_monthly_turnover_dr", "expected_monthly_turnover_cr")
+        return {field: getattr(getattr(application, field), "value", getattr(application, field)) for field in fields}
+
+    @staticmethod
+    def _keys(snapshot: dict) -> List[tuple]:
+        """(dimension, value) rows an application contributes to"""
+        keys = [(TOTAL_DIMENSION, None)]
+        keys += [(dimension, snapshot[dimension]) for dimension in COUNTER_DIMENSIONS]
+        keys += [(flag, "TRUE" if snapshot[flag] else "FALSE") for flag in COUNTER_FLAGS]
+        if snapshot["expected_monthly_turnover_cr"] is not None:
+            keys.append((TURNOVER_BUCKET_DIMENSION, AccountApplication.turnover_bucket(snapshot["expected_monthly_turnover_cr"])))
+        return keys
+
+    @classmethod
+    def _where_key(cls, dimension: str, value: Optional[str]):
+        value_clause = cls.value.is_(None) if value is None else cls.value == value
+        return (cls.dimension == dimension) & value_clause
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _upsert_statement(cls, dialect: str):
+        """
+        SQL: INSERT INTO analyticscounter (...) VALUES (...)
+        ON CONFLICT (dimension, coalesce(value, '')) DO UPDATE SET count = count + excluded.count, ...,
+        turnover_dr_min = CASE WHEN turnover_dr_min IS NULL OR excluded.turnover_dr_min < turnover_dr_min
+        THEN excluded.turnover_dr_min ELSE turnover_dr_min END, ...
+
+        Adds the deltas to the counter row, creating it if missing, in one atomic statement.
+        Built once per dialect (SQLite or PostgreSQL).
+        """
+        from sqlalchemy import literal_column
+        from sqlmodel import case, func
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        table = cls.__table__
+        statement = insert(table)
+        excluded = statement.excluded
+
+        def widened(column: str, wider):
+            current, added = table.c[column], excluded[column]
+            return case((current.is_(None) | wider(added, current), added), else_=current)
+
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.dimension, func.coalesce(table.c.value, literal_column("''"))],
+            set_={
+                **{column: table.c[column] + excluded[column] for column in (
+                    "count", "turnover_dr_count", "turnover_dr_sum", "turnover_cr_count", "turnover_cr_sum"
+                )},
+                **{f"turnover_{side}_min": widened(f"turnover_{side}_min", lambda a, b: a < b) for side in ("dr", "cr")},
+                **{f"turnover_{side}_max": widened(f"turnover_{side}_max", lambda a, b: a > b) for side in ("dr", "cr")},
+            }
+        )
+
+    @classmethod
+    def record(cls, session: Session, before: Optional[dict], after: Optional[dict]) -> None:
+        """
+        Apply the change from `before` to `after` (None for create/delete) to the counters.
+        Must run after the base row change is flushed so min/max recomputation sees it.
+        """
+        cls.record_changes(session, [(before, after)])
+
+    @classmethod
+    def record_changes(cls, session: Session, changes: List[tuple]) -> None:
+        """Apply many (before, after) changes with one upsert per affected counter row"""
+        from sqlmodel import case, func, update
+
+        deltas = {}
+        signed = [(before, -1) for before, _ in changes] + [(after, 1) for _, after in changes]
+        for snapshot, sign in signed:
+            if snapshot is None:
+                continue
+            dr = snapshot["expected_monthly_turnover_dr"]
+            cr = snapshot["expected_monthly_turnover_cr"]
+            contribution = (
+                sign,
+                sign if dr is not None else 0, sign * (dr or 0),
+                sign if cr is not None else 0, sign * (cr or 0)
+            )
+            for key in cls._keys(snapshot):
+                current = deltas.get(key, (0, 0, 0, 0, 0))
+                deltas[key] = tuple(a + b for a, b in zip(current, contribution))
+
+        # Turnover extremes added and removed by the changes, for the total row
+        extremes = {}
+        for side in ("dr", "cr"):
+            field = f"expected_monthly_turnover_{side}"
+            added = [after[field] for _, after in changes if after and after[field] is not None]
+            removed = [before[field] for before, _ in changes if before and before[field] is not None]
+            extremes[side] = (min(added, default=None), max(added, default=None),
+                              min(removed, default=None), max(removed, default=None))
+
+        rows = []
+        for (dimension, value), delta in deltas.items():
+            total = dimension == TOTAL_DIMENSION
+            if not any(delta) and not total:
+                continue
+            count, dr_count, dr_sum, cr_count, cr_sum = delta
+            rows.append({
+                "dimension": dimension, "value": value, "count": count,
+                "turnover_dr_count": dr_count, "turnover_dr_sum": dr_sum,
+                "turnover_dr_min": extremes["dr"][0] if total else None,
+                "turnover_dr_max": extremes["dr"][1] if total else None,
+                "turnover_cr_count": cr_count, "turnover_cr_sum": cr_sum,
+                "turnover_cr_min": extremes["cr"][0] if total else None,
+                "turnover_cr_max": extremes["cr"][1] if total else None,
+            })
+        if not rows:
+            return
+        # Plain Core statements on the session's connection (same transaction): counters are
+        # never loaded as ORM objects, so the ORM's per-statement bookkeeping is skipped
+        connection = session.connection()
+        connection.execute(cls._upsert_statement(connection.dialect.name), rows)
+
+        # A removed value at or beyond an extreme may have been the only one: rescan that
+        # extreme from the base table, in the same UPDATE so it is never read and written back
+        rescans = {}
+        for side, (_, _, removed_min, removed_max) in extremes.items():
+            column = getattr(AccountApplication, f"expected_monthly_turnover_{side}")
+            low, high = getattr(cls, f"turnover_{side}_min"), getattr(cls, f"turnover_{side}_max")
+            if removed_min is not None:
+                rescans[low.key] = case((low >= removed_min, select(func.min(column)).scalar_subquery()), else_=low)
+                rescans[high.key] = case((high <= removed_max, select(func.max(column)).scalar_subquery()), else_=high)
+        if rescans:
+            connection.execute(update(cls).where(cls._where_key(TOTAL_DIMENSION, None)).values(**rescans))
+
+    @classmethod
+    def counts(cls, session: Session, dimension: str) -> List[tuple]:
+        """SQL Query: SELECT value, count FROM analyticscounter WHERE dimension = ? AND count > 0 ORDER BY value"""
+        return session.exec(
+            select(cls.value, cls.count)
+            .where(cls.dimension == dimension, cls.count > 0)
+            .order_by(cls.value)
+        ).all()
+
+    @classmethod
+    def flag_counts(cls, session: Session) -> dict:
+        """{flag: {True: n, False: m}} for every boolean column, in one query"""
+        results = session.exec(
+            select(cls.dimension, cls.value, cls.count)
+            .where(cls.dimension.in_(COUNTER_FLAGS))
+        ).all()
+        flags = {flag: {True: 0, False: 0} for flag in COUNTER_FLAGS}
+        for dimension, value, count in results:
+            flags[dimension][value == "TRUE"] = count
+        return flags
+
+    @classmethod
+    def totals(cls, session: Session) -> dict:
+        """Table-wide count and turnover aggregates from the total row"""
+        row = session.exec(
+            select(
+                cls.count, cls.turnover_dr_count, cls.turnover_dr_sum, cls.turnover_dr_min, cls.turnover_dr_max,
+                cls.turnover_cr_count, cls.turnover_cr_sum, cls.turnover_cr_min, cls.turnover_cr_max
+            ).where(cls.dimension == TOTAL_DIMENSION)
+        ).first()
+        keys = ("count", "dr_count", "dr_sum", "dr_min", "dr_max", "cr_count", "cr_sum", "cr_min", "cr_max")
+        if row is None:
+            return dict(zip(keys, (0, 0, None, None, None, 0, None, None, None)))
+        return dict(zip(keys, row))
+
+    @staticmethod
+    def turnover_stats(totals: dict, side: str) -> tuple:
+        """(avg, min, max, sum) for 'dr' or 'cr', matching the shape of the SQL aggregate"""
+        count = totals[f"{side}_count"]
+        if not count:
+            return None, None, None, None
+        total = totals[f"{side}_sum"]
+        return total / count, totals[f"{side}_min"], totals[f"{side}_max"], total
+
+    @classmethod
+    def rebuild(cls, session: Session) -> int:
+        """Recompute every counter row from accountapplication; returns the number of rows written"""
+        from sqlmodel import func, delete
+
+        app = AccountApplication
+        dr, cr = app.expected_monthly_turnover_dr, app.expected_monthly_turnover_cr
+        measures = (func.count(app.id), func.count(dr), func.coalesce(func.sum(dr), 0),
+                    func.count(cr), func.coalesce(func.sum(cr), 0))
+
+        session.exec(delete(cls))
+        rows = []
+        total, dr_count, dr_sum, cr_count, cr_sum, dr_min, dr_max, cr_min, cr_max = session.exec(
+            select(*measures, func.min(dr), func.max(dr), func.min(cr), func.max(cr))
+        ).one()
+        rows.append(cls(
+            dimension=TOTAL_DIMENSION, count=total,
+            turnover_dr_count=dr_count, turnover_dr_sum=dr_sum, turnover_dr_min=dr_min, turnover_dr_max=dr_max,
+            turnover_cr_count=cr_count, turnover_cr_sum=cr_sum, turnover_cr_min=cr_min, turnover_cr_max=cr_max
+        ))
+        for dimension in COUNTER_DIMENSIONS + COUNTER_FLAGS:
+            column = getattr(app, dimension)
+            for value, count, dr_count, dr_sum, cr_count, cr_sum in session.exec(
+                select(column, *measures).group_by(column)
+            ).all():
+                if dimension in COUNTER_FLAGS:
+                    value = "TRUE" if value else "FALSE"
+                rows.append(cls(
+                    dimension=dimension, value=value, count=count,
+                    turnover_dr_count=dr_count, turnover_dr_sum=dr_sum,
+                    turnover_cr_count=cr_count, turnover_cr_sum=cr_sum
+                ))
+        bucket = app.turnover_bucket_expr()
+        for value, count, dr_count, dr_sum, cr_count, cr_sum in session.exec(
+            select(bucket, *measures).where(cr != None).group_by(bucket)
+        ).all():
+            rows.append(cls(
+                dimension=TURNOVER_BUCKET_DIMENSION, value=value, count=count,
+                turnover_dr_count=dr_count, turnover_dr_sum=dr_sum,
+                turnover_cr_count=cr_count, turnover_cr_sum=cr_sum
+            ))
+        session.add_all(rows)
+        NumberSequence.reserve(session, DATA_GENERATION_SEQUENCE, 1)
+        session.commit()
+        return len(rows)
+
+    @classmethod
+    def merge_duplicates(cls, session: Session) -> int:
+        """
+        Fold counter rows sharing a (dimension, value) key, which concurrent writers could
+        insert before the key was unique, into the first one; returns the number of rows removed
+        """
+        from sqlmodel import delete
+
+        kept = {}
+        duplicates = []
+        for row in session.exec(select(cls).order_by(cls.id)).all():
+            first = kept.setdefault((row.dimension, row.value), row)
+            if first is row:
+                continue
+            for field in ("count", "turnover_dr_count", "turnover_dr_sum", "turnover_cr_count", "turnover_cr_sum"):
+                setattr(first, field, getattr(first, field) + getattr(row, field))
+            for side in ("dr", "cr"):
+                for field, pick in ((f"turnover_{side}_min", min), (f"turnover_{side}_max", max)):
+                    values = [value for value in (getattr(first, field), getattr(row, field)) if value is not None]
+                    setattr(first, field, pick(values) if values else None)
+            duplicates.append(row.id)
+        if duplicates:
+            session.exec(delete(cls).where(cls.id.in_(duplicates)))
+        session.commit()
+        return len(duplicates)
+
+    @classmethod
+    def ensure_built(cls, session: Session) -> None:
+        """Build the counters on first start, or when a dimension added since is missing"""
+        present = set(session.exec(select(cls.dimension).distinct()).all())
+        totals = cls.totals(session)
+        expected = {TOTAL_DIMENSION}
+        if totals["count"]:
+            expected.update(COUNTER_DIMENSIONS + COUNTER_FLAGS)
+        if totals["cr_count"]:
+            expected.add(TURNOVER_BUCKET_DIMENSION)
+        if not expected <= present:
+            cls.rebuild(session)
+
+
+class SchemaVersion(SQLModel, table=True):
+    """
+    Schema version the database was last brought up to (db.migrations.schema_fingerprint).
+
+    Written once startup's schema upkeep (migrate and the counter build) completes, so a
+    FAST_STARTUP start can skip that upkeep with a single primary-key read.
+    """
+    name: str = Field(primary_key=True)
+    version: str
+    applied_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @classmethod
+    def get_version(cls, session: Session, name: str) -> Optional[str]:
+        """SQL Query: SELECT * FROM schemaversion WHERE name = ?"""
+        row = session.get(cls, name)
+        return row.version if row else None
+
+    @classmethod
+    def record(cls, session: Session, name: str, version: str) -> None:
+        """SQL Query: INSERT INTO schemaversion ... / UPDATE schemaversion SET version = ? WHERE name = ?"""
+        session.merge(cls(name=name, version=version))
+        session.commit()
+
+
+class NumberSequence(SQLModel, table=True):
+    """
+    Named monotonic sequence handed out in blocks.
+
+    next_value is the first value not yet reserved by any process. Reserving a block
+    is a single atomic UPDATE, so concurrent processes always receive disjoint ranges.
+    """
+    name: str = Field(primary_key=True)
+    next_value: int = Field(default=1)
+
+    @classmethod
+    def current(cls, session: Session, name: str) -> int:
+        """SQL Query: SELECT next_value FROM numbersequence WHERE name = ? (0 before first use)"""
+        value = session.exec(select(cls.next_value).where(cls.name == name)).first()
+        return value or 0
+
+    @classmethod
+    def reserve(cls, session: Session, name: str, size: int) -> int:
+        """
+        SQL Query: UPDATE numbersequence SET next_value = next_value + :size
+        WHERE name = :name RETURNING next_value
+
+        Reserve `size` values and return the first one. The caller owns
+        [first, first + size) and commits the session.
+        """
+        from sqlmodel import update, insert
+        from sqlalchemy.exc import IntegrityError
+        for _ in range(2):
+            end = session.exec(
+                update(cls).where(cls.name == name)
+                .values(next_value=cls.next_value + size)
+                .returning(cls.next_value)
+            ).scalar_one_or_none()
+            if end is not None:
+                return end - size
+            # First use of this sequence: create it with the block already reserved.
+            # A concurrent creator makes the insert fail; retry the update.
+            try:
+                with session.begin_nested():
+                    session.exec(insert(cls).values(name=name, next_value=1 + size))
+                return 1
+            except IntegrityError:
+                continue
+        raise RuntimeError(f"Could not reserve a block from sequence {name!r}")
+
+
+class OcrJob(SQLModel, table=True):
+    """
+    A batch of uploaded form PDFs extracted in the background (see ocr/jobs.py).
+
+    status moves queued -> running -> completed; processed counts documents with a
+    final status and failed the ones that produced no valid application.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default="queued", index=True)
+    create_applications: bool = Field(default=True)
+    total: int = Field(default=0)
+    processed: int = Field(default=0)
+    failed: int = Field(default=0)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+
+    @classmethod
+    def submit(cls, session: Session, documents: List[tuple], create_applications: bool) -> tuple:
+        """
+        SQL Query: INSERT INTO ocrjob (...) VALUES (...);
+        INSERT INTO ocrjobdocument (job_id, position, filename, content) VALUES (...), (...)
+
+        Persist a job and its (filename, PDF bytes) documents in one transaction;
+        returns (job, document ids in upload order).
+        """
+        job = cls(total=len(documents), create_applications=create_applications)
+        session.add(job)
+        session.flush()
+        rows = [
+            OcrJobDocument(job_id=job.id, position=position, filename=filename, content=content)
+            for position, (filename, content) in enumerate(documents)
+        ]
+        session.add_all(rows)
+        session.flush()
+        document_ids = [row.id for row in rows]
+        session.commit()
+        session.refresh(job)
+        return job, document_ids
+
+    @classmethod
+    def requeue_interrupted(cls, session: Session) -> List[int]:
+        """
+        SQL Query: UPDATE ocrjobdocument SET status = 'queued' WHERE status = 'running';
+        SELECT id FROM ocrjobdocument WHERE status = 'queued' ORDER BY id
+
+        Documents left running by a stopped process go back to the queue; returns every
+        queued document id.
+        """
+        from sqlmodel import update
+        session.exec(update(OcrJobDocument).where(OcrJobDocument.status == "running").values(status="queued"))
+        session.commit()
+        return list(session.exec(
+            select(OcrJobDocument.id).where(OcrJobDocument.status == "queued").order_by(OcrJobDocument.id)
+        ).all())
+
+    @classmethod
+    def claim_document(cls, session: Session, document_id: int) -> Optional[tuple]:
+        """
+        SQL Query: UPDATE ocrjobdocument SET status = 'running' WHERE id = ? AND status = 'queued'
+        RETURNING job_id, content; UPDATE ocrjob SET status = 'running' WHERE id = ? AND status = 'queued'
+
+        Atomically take a queued document; returns (content, create_applications), or None
+        when another worker already took it.
+        """
+        from sqlmodel import update
+        claimed = session.exec(
+            update(OcrJobDocument)
+            .where(OcrJobDocument.id == document_id, OcrJobDocument.status == "queued")
+            .values(status="running")
+            .returning(OcrJobDocument.job_id, OcrJobDocument.content)
+        ).first()
+        if claimed is None:
+            session.commit()
+            return None
+        job_id, content = claimed
+        session.exec(update(cls).where(cls.id == job_id, cls.status == "queued").values(status="running"))
+        create_applications = session.exec(select(cls.create_applications).where(cls.id == job_id)).one()
+        session.commit()
+        return content, create_applications
+
+    @classmethod
+    def record_result(cls, session: Session, document_id: int, status: str,
+                      application_id: Optional[int] = None, result: Optional[dict] = None) -> None:
+        """
+        SQL Query: UPDATE ocrjobdocument SET status = ?, application_id = ?, result = ?, content = NULL
+        WHERE id = ?; UPDATE ocrjob SET processed = processed + 1, failed = failed + ?, status = ... WHERE id = ?
+
+        Store a document's final status and advance its job; the PDF bytes are dropped.
+        """
+        import json
+        from sqlalchemy import case
+        from sqlmodel import update
+        job_id = session.exec(
+            update(OcrJobDocument)
+            .where(OcrJobDocument.id == document_id, OcrJobDocument.status == "running")
+            .values(status=status, application_id=application_id, content=None,
+                    result=json.dumps(result, default=str) if result is not None else None)
+            .returning(OcrJobDocument.job_id)
+        ).scalar_one_or_none()
+        if job_id is None:
+            # Already recorded (the document was requeued and processed twice)
+            session.commit()
+            return
+        finished = cls.processed + 1 >= cls.total
+        session.exec(
+            update(cls).where(cls.id == job_id).values(
+                processed=cls.processed + 1,
+                failed=cls.failed + (1 if status in ("invalid", "failed") else 0),
+                status=case((finished, "completed"), else_="running"),
+                finished_at=case((finished, datetime.now(timezone.utc)), else_=cls.finished_at)
+            )
+        )
+        session.commit()
+
+    @classmethod
+    def get_status(cls, session: Session, job_id: int) -> Optional[dict]:
+        """
+        SQL Query: SELECT * FROM ocrjob WHERE id = ?;
+        SELECT id, position, filename, status, application_id, result FROM ocrjobdocument
+        WHERE job_id = ? ORDER BY position
+        """
+        import json
+        job = session.get(cls, job_id)
+        if job is None:
+            return None
+        documents = session.exec(
+            select(OcrJobDocument.position, OcrJobDocument.filename, OcrJobDocument.status,
+                   OcrJobDocument.application_id, OcrJobDocument.result)
+            .where(OcrJobDocument.job_id == job_id)
+            .order_by(OcrJobDocument.position)
+        ).all()
+        return {
+            **job.model_dump(),
+            "application_ids": [row.application_id for row in documents if row.application_id is not None],
+            "documents": [
+                {
+                    "position": row.position,
+                    "filename": row.filename,
+                    "status": row.status,
+                    "application_id": row.application_id,
+                    "result": json.loads(row.result) if row.result else None
+                }
+                for row in documents
+            ]
+        }
+
+
+class OcrJobDocument(SQLModel, table=True):
+    """
+    One uploaded PDF of an OcrJob.
+
+    content holds the upload until the document reaches a final status (created,
+    extracted, invalid or failed) so queued work survives a restart; result holds the
+    extracted values, confidences and errors.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="ocrjob.id", index=True)
+    position: int
+    filename: Optional[str] = None
+    status: str = Field(default="queued", index=True)
+    content: Optional[bytes] = None
+    application_id: Optional[int] = None
+    result: Optional[str] = None
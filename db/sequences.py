@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import deque
+from typing import Deque, List, Tuple
+
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+from sqlmodel import Session
+
+from db.connection import engine
+from db.schemas import NumberSequence
+from utils.validations import account_number_from_sequence, iban_from_account_number
+
+
+# Values reserved per round trip to the sequence table; unused values in a block are
+# lost when the process exits, which only leaves gaps in the numbering
+ACCOUNT_NUMBER_BLOCK_SIZE = int(os.getenv("ACCOUNT_NUMBER_BLOCK_SIZE", "100"))
+# 4-digit bank code embedded in generated IBANs
+IBAN_BANK_CODE = os.getenv("IBAN_BANK_CODE", "0001")
+
+if not (len(IBAN_BANK_CODE) == 4 and IBAN_BANK_CODE.isdigit()):
+    raise ValueError("IBAN_BANK_CODE must be 4 digits")
+
+
+class BlockAllocator:
+    """
+    Hands out values of a NumberSequence from blocks reserved in the database.
+
+    Each process reserves a block in its own short transaction and serves values from
+    memory until the block runs out, so values are unique across processes without a
+    uniqueness query per insert.
+    """
+
+    def __init__(self, name: str, block_size: int):
+        self.name = name
+        self.block_size = block_size
+        self._blocks: Deque[List[int]] = deque()  # [next, end) ranges not handed out yet
+        self._lock = threading.Lock()
+
+    def _reserve(self, size: int) -> int:
+        if in_greenlet():
+            # Called from AsyncSession.run_sync (DB_ASYNC): reserve on the async engine
+            # so the event loop is not blocked by a sync connection
+            return await_only(self._reserve_async(size))
+        # Separate session: the reservation must survive a rollback of the caller's write
+        with Session(engine) as session:
+            first = NumberSequence.reserve(session, self.name, size)
+            session.commit()
+        return first
+
+    async def _reserve_async(self, size: int) -> int:
+        from db.connection import async_engine
+        from sqlmodel.ext.asyncio.session import AsyncSession
+
+        async with AsyncSession(async_engine) as session:
+            first = await session.run_sync(NumberSequence.reserve, self.name, size)
+            await session.commit()
+        return first
+
+    def _take(self, count: int) -> List[int]:
+        values = []
+        with self._lock:
+            while self._blocks and len(values) < count:
+                block = self._blocks[0]
+                take = min(count - len(values), block[1] - block[0])
+                values.extend(range(block[0], block[0] + take))
+                block[0] += take
+                if block[0] >= block[1]:
+                    self._blocks.popleft()
+        return values
+
+    def allocate(self, count: int = 1) -> List[int]:
+        """Return `count` unused sequence values"""
+        values = self._take(count)
+        while len(values) < count:
+            # Reserve without holding the lock: in async mode other requests on the
+            # event loop keep allocating while this one awaits the database
+            size = max(self.block_size, count - len(values))
+            first = self._reserve(size)
+            with self._lock:
+                self._blocks.append([first, first + size])
+            values.extend(self._take(count - len(values)))
+        return values
+
+
+account_number_allocator = BlockAllocator("account_number", ACCOUNT_NUMBER_BLOCK_SIZE)
+
+
+def allocate_account_identifiers(count: int = 1) -> List[Tuple[str, str]]:
+    """Allocate `count` (account_no, iban) pairs"""
+    identifiers = []
+    for value in account_number_allocator.allocate(count):
+        account_no = account_number_from_sequence(value)
+        identifiers.append((account_no, iban_from_account_number(account_no, IBAN_BANK_CODE)))
+    return identifiers
@@ -1,14 +1,35 @@
+import threading
 from fastapi import FastAPI
-from sqlmodel import SQLModel
-from db.connection import engine
+from sqlmodel import Session
+from db.connection import (
+    engine, read_engine, async_engine, async_read_engine, ANALYTICS_COLUMNAR_ENABLED, DATABASE_READ_URL,
+    DB_ASYNC_ENABLED, FAST_STARTUP_ENABLED, warm_connections
+)
+from db.schemas import AnalyticsCounter
+from db.migrations import migrate, record_schema_version, schema_is_current
 from routes.routes import router
+from ocr.jobs import OCR_JOBS_ENABLED, job_queue
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from utils.instrumentation import RequestInstrumentationMiddleware, install_query_hooks
+from utils.metrics import MetricsMiddleware, install_query_metrics
 
 
 # Create tables
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    # Fast start: the upkeep below already ran for these models (one primary-key read)
+    if FAST_STARTUP_ENABLED and schema_is_current(engine):
+        return
+    complete = True
+    for name, status in migrate(engine).items():
+        if status.startswith(("failed", "skipped")):
+            complete = False
+            print(f"Migration {name}: {status}")
+    with Session(engine) as session:
+        AnalyticsCounter.ensure_built(session)
+    # An incomplete migration is retried on every start
+    if complete:
+        record_schema_version(engine)
 
 
 # Lifespan event handler
@@ -16,9 +37,19 @@ def create_db_and_tables():
 async def lifespan(app: FastAPI):
     # Startup
     create_db_and_tables()
+    if FAST_STARTUP_ENABLED:
+        await warm_connections()
     print("Database connected and tables created!")
+    if ANALYTICS_COLUMNAR_ENABLED:
+        # Load the analytic columns off the startup path; analytics requests wait for it
+        from db.columnar import columnar_store
+        threading.Thread(target=columnar_store.load, name="columnar-load", daemon=True).start()
+    if OCR_JOBS_ENABLED:
+        # Requeue interrupted documents and create the pool after startup
+        job_queue.start_in_background()
     yield
     # Shutdown
+    job_queue.stop()
     print("Shutting down...")
 
 
@@ -34,8 +65,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include routers
-app.include_router(router, tags=["Items"])
+# Per-request query count, DB time and serialization time (Server-Timing header)
+app.add_middleware(RequestInstrumentationMiddleware)
+install_query_hooks(engine)
+if read_engine is not engine:
+    install_query_hooks(read_engine)
+if async_engine is not None:
+    install_query_hooks(async_engine.sync_engine)
+if async_read_engine is not async_engine:
+    install_query_hooks(async_read_engine.sync_engine)
+
+# Prometheus metrics served at /metrics
+app.add_middleware(MetricsMiddleware)
+install_query_metrics(engine, "sync")
+if read_engine is not engine:
+    install_query_metrics(read_engine, "read")
+if async_engine is not None:
+    install_query_metrics(async_engine.sync_engine, "async")
+if async_read_engine is not async_engine:
+    install_query_metrics(async_read_engine.sync_engine, "async-read")
+
+# Read replica: a client that just wrote reads from the primary for a few seconds
+if DATABASE_READ_URL:
+    from utils.read_your_writes import ReadYourWritesMiddleware
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Include routers (async handlers on the async engine when DB_ASYNC is enabled)
+if DB_ASYNC_ENABLED:
+    from routes.async_routes import build_async_router
+    app.include_router(build_async_router(router), tags=["Items"])
+else:
+    app.include_router(router, tags=["Items"])
 
 
 
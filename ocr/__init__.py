@@ -0,0 +1,22 @@
+# Form ingestion package. The readers (ocr.extraction, and pdfplumber through it) are
+# imported on first use, so starting the API does not pay for them.
+import os
+
+# Uploads larger than this are rejected before parsing
+MAX_PDF_BYTES = int(os.getenv("OCR_MAX_PDF_BYTES", str(10 * 1024 * 1024)))
+
+_EXTRACTION_EXPORTS = ("ExtractionError", "extract_application")
+
+
+def __getattr__(name: str):
+    if name in _EXTRACTION_EXPORTS:
+        from ocr import extraction
+        return getattr(extraction, name)
+    raise AttributeError(f"module 'ocr' has no attribute {name!r}")
+
+
+__all__ = [
+    "ExtractionError",
+    "MAX_PDF_BYTES",
+    "extract_application"
+]
@@ -0,0 +1,419 @@
+"""
+Field extraction from filled account-opening forms laid out like form.pdf.
+
+The page's text layer is rebuilt into lines: the underscore fill lines are dropped and
+word breaks are inferred from glyph gaps (which also joins the form's letter-spaced
+words such as "S A V I N G"). Text fields are read between their label and the label
+that follows them; checkboxes are read from mark characters (X, ✓, ...) placed in
+the box next to the option they tick.
+"""
+import io
+import os
+import re
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple
+
+from model import AccountType, CardType, Occupation, ResidentialStatus
+from ocr import MAX_PDF_BYTES, normalize
+
+
+# Only this many leading pages of a packet are searched for the form
+MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "20"))
+
+# A gap wider than this fraction of the font size is a word break
+WORD_GAP = 0.12
+# Glyphs whose vertical centres are this close (points) share a line
+LINE_TOLERANCE = 4.0
+MARKS = frozenset("Xx✓✔✗✘☒☑■●√")
+# Page anchor: the first page carrying this label is the application form
+FORM_ANCHOR = re.compile(r"Type ?of ?Account")
+NO_FORM_FOUND = "No account-opening form found (scanned images without a text layer are not supported)"
+
+
+class ExtractionError(ValueError):
+    """The upload is not a readable account-opening form"""
+
+
+@dataclass
+class PageText:
+    """Page text with the x centre of every character (-1.0 for line breaks) and its glyph (None for inserted breaks)"""
+    text: str
+    positions: List[float]
+    glyphs: List[Optional[dict]]
+
+
+def _label(text: str) -> str:
+    """Regex for a printed label, tolerant of the word breaks and apostrophes of the text layer"""
+    return re.escape(text).replace(r"\ ", " ?").replace("'", "['’]")
+
+
+def page_text(chars: List[dict]) -> PageText:
+    """Rebuild reading-order text from pdfplumber chars"""
+    glyphs = [char for char in chars if char["text"].strip() and char["text"] != "_"]
+    glyphs.sort(key=lambda char: ((char["top"] + char["bottom"]) / 2, char["x0"]))
+
+    lines, line, line_middle = [], [], None
+    for char in glyphs:
+        middle = (char["top"] + char["bottom"]) / 2
+        if line and middle - line_middle > LINE_TOLERANCE:
+            lines.append(line)
+            line = []
+        if not line:
+            line_middle = middle
+        line.append(char)
+    if line:
+        lines.append(line)
+
+    text, positions, placed = [], [], []
+    for line in lines:
+        line.sort(key=lambda char: char["x0"])
+        previous = None
+        for char in line:
+            if previous is not None and char["x0"] - previous["x1"] > WORD_GAP * max(char["size"], previous["size"]):
+                text.append(" ")
+                positions.append((previous["x1"] + char["x0"]) / 2)
+                placed.append(None)
+            # Ligatures are one glyph with several characters
+            text.append(char["text"])
+            positions.extend([(char["x0"] + char["x1"]) / 2] * len(char["text"]))
+            placed.extend([char] * len(char["text"]))
+            previous = char
+        text.append("\n")
+        positions.append(-1.0)
+        placed.append(None)
+    return PageText("".join(text), positions, placed)
+
+
+def _boxed_date(raw: Optional[str]) -> normalize.Normalized:
+    """Dates written into the d d m m y y cells keep the printed placeholders in the text layer"""
+    return normalize.date(re.sub(r"[dmy]", "", raw) if raw else raw)
+
+
+# (field, label before the value, label after it or None for end of line, normaliser)
+TEXT_FIELDS: Tuple[Tuple[str, str, Optional[str], Callable], ...] = (
+    ("title_of_account", _label("TITLE OF ACCOUNT:"), _label("(in Block Letters)"), normalize.upper_text),
+    ("name_on_card", _label("NAME ON CARD:"), None, normalize.upper_text),
+    ("name", "^" + _label("Name:"), _label("(as per CNIC"), normalize.upper_text),
+    ("fathers_husbands_name", _label("Husband Name:"), _label("Mother's Name:"), normalize.upper_text),
+    ("mothers_name", _label("Mother's Name:"), None, normalize.upper_text),
+    ("marital_status", _label("Marital Status:"), _label("Gender:"), normalize.marital_status),
+    ("gender", _label("Gender:"), None, normalize.gender),
+    ("nationality", _label("Nationality:"), r"Place ?of ?B\w+:", normalize.upper_text),
+    ("place_of_birth", r"Place ?of ?B\w+:", r"Date ?of ?B\w+:", normalize.upper_text),
+    ("date_of_birth", r"Date ?of ?B\w+:", None, normalize.date),
+    ("cnic_no", _label("CNIC No."), _label("Expiry date:"), normalize.cnic),
+    ("cnic_expiry_date", _label("Expiry date:"), None, _boxed_date),
+    ("house_no_block_street", _label("House No., Block & Street:"), None, normalize.upper_text),
+    ("area_location", _label("Area/Location:"), _label("City:"), normalize.upper_text),
+    ("city", r"\b" + _label("City:"), _label("Postal Code:"), normalize.upper_text),
+    ("postal_code", _label("Postal Code:"), None, normalize.digits),
+    ("purpose_of_account", _label("Purpose of A/C:"), _label("Source of Income:"), normalize.upper_text),
+    ("source_of_income", _label("Source of Income:"), _label("Exp. Monthly"), normalize.upper_text),
+    ("expected_monthly_turnover_dr", _label("Turnover Dr"), r",? ?Cr", normalize.amount),
+    ("expected_monthly_turnover_cr", _label("Turnover Dr") + r"[^\n]*?Cr", r",? ?" + _label("Rs(M)"), normalize.amount),
+    ("residing_since", _label("Residing Since"), None, normalize.text),
+    ("next_of_kin_name", _label("Mr./Mrs./Miss./Ms."), _label("S,W,D/O:"), normalize.upper_text),
+    ("next_of_kin_relation", _label("S,W,D/O:"), None, normalize.relation),
+    ("next_of_kin_cnic", _label("CNIC (Optional):"), _label("Relationship:"), normalize.cnic),
+    ("next_of_kin_relationship", _label("Relationship:"), _label("Contact No:"), normalize.upper_text),
+    ("next_of_kin_contact_no", _label("Contact No:"), None, normalize.digits),
+    ("next_of_kin_address", _label("Address: Residential"), r",? ?" + _label("E-Mail:"), normalize.upper_text),
+    ("next_of_kin_email", _label("E-Mail:"), None, normalize.text),
+)
+
+_TEXT_PATTERNS = {
+    name: re.compile(start + r" ?(?P<value>[^\n]*?) ?(?:" + (end or "$") + ")", re.MULTILINE)
+    for name, start, end, _ in TEXT_FIELDS
+}
+
+
+@dataclass(frozen=True)
+class Choice:
+    """A row of checkbox options"""
+    scope: re.Pattern  # group "scope" is the text holding the options
+    options: Tuple[Tuple[str, object], ...]  # (label regex, value)
+    box_after: bool = False  # the box follows its option's label (default: precedes it)
+    free_text: Optional[str] = None  # label followed by handwriting rather than options
+
+
+def _scope(start: str, end: Optional[str] = None) -> re.Pattern:
+    return re.compile(start + r"(?P<scope>[^\n]*?)(?:" + (end or "$") + ")", re.MULTILINE)
+
+
+YES_NO = ((r"\bYes\b", True), (r"\bNo\b", False))
+
+ACCOUNT_TYPE = Choice(
+    _scope(_label("Type of Account")),
+    ((r"CURRENT", AccountType.CURRENT.value), (r"SAVINGS?", AccountType.SAVINGS.value), (r"S?AHU ?LAT", AccountType.AHU_LAT.value)),
+    box_after=True
+)
+OCCUPATION = Choice(
+    re.compile(r"^(?P<scope>[^\n]*" + _label("Service (Govt./Private)") + r"[^\n]*)$", re.MULTILINE),
+    (
+        # One box covers both; SERVICE_PRIVATE is reported with reduced confidence
+        (_label("Service (Govt./Private)"), Occupation.SERVICE_PRIVATE.value),
+        (r"Farmer", Occupation.FARMER.value),
+        (r"House ?Wife", Occupation.HOUSE_WIFE.value),
+        (r"Student", Occupation.STUDENT.value),
+        (r"Other:", Occupation.OTHER.value),
+    ),
+    free_text=r"Other:"
+)
+RESIDENTIAL_STATUS = Choice(
+    _scope(_label("Residential Status:"), _label("Residing Since")),
+    (
+        (r"House ?Owned", ResidentialStatus.HOUSE_OWNED.value),
+        (r"Rental", ResidentialStatus.RENTAL.value),
+        (r"Family", ResidentialStatus.FAMILY.value),
+        (r"Other", ResidentialStatus.OTHER.value),
+    ),
+    free_text=r"Other"
+)
+SERVICES = {
+    "internet_banking": Choice(_scope(_label("Internet Banking"), _label("Mobile Banking")), YES_NO),
+    "mobile_banking": Choice(_scope(_label("Mobile Banking")), YES_NO),
+    "check_book": Choice(_scope(_label("Check Book")), YES_NO),
+    "sms_alerts": Choice(_scope(_label("SMS Alerts")), YES_NO),
+    "zakat_deduction": Choice(_scope(_label("ZAKAT DEDUCTION:")), YES_NO),
+}
+GOLD_CARD = Choice(_scope(_label("CARD TYPE: Gold"), _label("Classic")), YES_NO)
+CLASSIC_CARD = Choice(_scope(_label("Classic")), YES_NO)
+
+CHOICES: Dict[str, Choice] = {
+    "account_type": ACCOUNT_TYPE,
+    "occupation": OCCUPATION,
+    "residential_status": RESIDENTIAL_STATUS,
+    **SERVICES,
+    "gold_card": GOLD_CARD,
+    "classic_card": CLASSIC_CARD,
+}
+
+# Reads a CHOICES entry by name: (ticked values, free text)
+ChoiceReader = Callable[[str], Tuple[List[object], Optional[str]]]
+
+
+def _words(page: PageText, start: int, end: int) -> List[Tuple[str, float, float]]:
+    """(word, x0, x1) for the words in page.text[start:end]"""
+    words = []
+    for match in re.finditer(r"\S+", page.text[start:end]):
+        first, last = start + match.start(), start + match.end() - 1
+        words.append((match.group(), page.positions[first], page.positions[last]))
+    return words
+
+
+@dataclass
+class ChoiceLayout:
+    """Where a choice row's options and marks are on the page"""
+    options: List[Tuple[object, float, float]]  # (value, x0, x1) of each printed option
+    marks: List[float]  # x centres of the marks that tick an option
+    free_text: Optional[str] = None
+    free_label: Optional[Tuple[float, float]] = None  # (x0, x1) of the free-text label
+
+
+def choice_layout(page: PageText, choice: Choice) -> Optional[ChoiceLayout]:
+    match = choice.scope.search(page.text)
+    if not match:
+        return None
+    words = _words(page, match.start("scope"), match.end("scope"))
+
+    # Marks are words of their own; printed labels are matched with the marks taken out
+    marks = [(x0 + x1) / 2 for word, x0, x1 in words if word in MARKS]
+    labels = [(word, x0, x1) for word, x0, x1 in words if word not in MARKS]
+    label_text = " ".join(word for word, _, _ in labels)
+    starts, offset = [], 0
+    for word, _, _ in labels:
+        starts.append(offset)
+        offset += len(word) + 1
+
+    def label_span(char_start: int, char_end: int) -> Tuple[int, int]:
+        first = max(index for index, start in enumerate(starts) if start <= char_start)
+        last = max(index for index, start in enumerate(starts) if start < char_end)
+        return first, last
+
+    layout = ChoiceLayout([], marks)
+    if choice.free_text:
+        free_match = re.search(choice.free_text, label_text)
+        if free_match:
+            first, last = label_span(free_match.start(), free_match.end())
+            layout.free_text = normalize.clean(label_text[free_match.end():])
+            layout.free_label = (labels[first][1], labels[last][2])
+            # Marks inside the handwriting belong to it, not to the options
+            layout.marks = [x for x in marks if x < labels[first][1]]
+
+    for pattern, value in choice.options:
+        option_match = re.search(pattern, label_text)
+        if option_match:
+            first, last = label_span(option_match.start(), option_match.end())
+            layout.options.append((value, labels[first][1], labels[last][2]))
+    return layout
+
+
+def ticked_options(layout: ChoiceLayout, box_after: bool) -> List[object]:
+    """Values of the options the marks tick, in reading order"""
+    ticked = []
+    for x in layout.marks:
+        inside = [value for value, x0, x1 in layout.options if x0 <= x <= x1]
+        if box_after:
+            candidates = [(x - x1, value) for value, x0, x1 in layout.options if x1 < x]
+        else:
+            candidates = [(x0 - x, value) for value, x0, x1 in layout.options if x0 > x]
+        value = inside[0] if inside else min(candidates, key=lambda candidate: candidate[0])[1] if candidates else None
+        if value is not None and value not in ticked:
+            ticked.append(value)
+    return ticked
+
+
+def read_choice(page: PageText, choice: Choice) -> Tuple[List[object], Optional[str]]:
+    """Values of the ticked options in reading order, and any text written after `free_text`"""
+    layout = choice_layout(page, choice)
+    if layout is None:
+        return [], None
+    return ticked_options(layout, choice.box_after), layout.free_text
+
+
+def _single(ticked: List[object]) -> normalize.Normalized:
+    if not ticked:
+        return None, 0.0
+    return ticked[0], normalize.EXACT if len(ticked) == 1 else normalize.UNCERTAIN
+
+
+def _read_choices(read: ChoiceReader, fields: dict, confidence: dict) -> None:
+    fields["account_type"], confidence["account_type"] = _single(read("account_type")[0])
+
+    ticked, other = read("occupation")
+    occupation, score = _single(ticked)
+    if occupation == Occupation.SERVICE_PRIVATE.value:
+        score = min(score, normalize.UNCERTAIN)
+    if other and occupation in (None, Occupation.OTHER.value):
+        # Occupations without a box of their own are written after "Other:"
+        named, named_score = normalize.occupation(other)
+        if named and named != Occupation.OTHER.value:
+            occupation, score, other = named, min(named_score, score or normalize.UNCERTAIN), None
+        else:
+            occupation, score = Occupation.OTHER.value, score or normalize.UNCERTAIN
+    fields["occupation"], confidence["occupation"] = occupation, score
+    fields["occupation_other"], confidence["occupation_other"] = normalize.upper_text(other)
+
+    ticked, other = read("residential_status")
+    status, score = _single(ticked)
+    if other and status is None:
+        status, score = ResidentialStatus.OTHER.value, normalize.UNCERTAIN
+    fields["residential_status"], confidence["residential_status"] = status, score
+    fields["residential_status_other"], confidence["residential_status_other"] = normalize.upper_text(other)
+
+    for name in SERVICES:
+        value, score = _single(read(name)[0])
+        # Unticked services are not requested
+        fields[name], confidence[name] = bool(value), score
+
+    gold, gold_score = _single(read("gold_card")[0])
+    classic, classic_score = _single(read("classic_card")[0])
+    if gold and classic:
+        fields["card_type"], confidence["card_type"] = CardType.GOLD.value, normalize.UNCERTAIN
+    elif gold or classic:
+        fields["card_type"], confidence["card_type"] = (CardType.GOLD.value, gold_score) if gold else (CardType.CLASSIC.value, classic_score)
+    else:
+        fields["card_type"], confidence["card_type"] = None, max(gold_score, classic_score)
+
+
+def assemble_fields(raw_text: Dict[str, Optional[str]], read: ChoiceReader) -> Tuple[dict, Dict[str, float]]:
+    """Normalise the raw text of each text field and read the choices into AccountApplicationCreate fields"""
+    fields, confidence = {}, {}
+    for name, _, _, normalizer in TEXT_FIELDS:
+        fields[name], confidence[name] = normalizer(raw_text.get(name))
+    _read_choices(read, fields, confidence)
+
+    kin = ("next_of_kin_name", "next_of_kin_cnic")
+    fields["has_next_of_kin"] = any(fields[name] for name in kin)
+    confidence["has_next_of_kin"] = max(confidence[name] for name in kin) if fields["has_next_of_kin"] else normalize.EXACT
+    return fields, confidence
+
+
+def extract_fields(page: PageText) -> Tuple[dict, Dict[str, float]]:
+    """AccountApplicationCreate fields and per-field confidence (0-1) from a form page"""
+    raw_text = {}
+    for name, pattern in _TEXT_PATTERNS.items():
+        match = pattern.search(page.text)
+        raw_text[name] = match.group("value") if match else None
+    return assemble_fields(raw_text, lambda name: read_choice(page, CHOICES[name]))
+
+
+def _open_page(pdf_bytes: bytes, number: int):
+    """pdfminer page `number` (1-based), parsing only the page tree up to it; None past the last page"""
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+
+    document = PDFDocument(PDFParser(io.BytesIO(pdf_bytes)))
+    return next(islice(PDFPage.create_pages(document), number - 1, None), None)
+
+
+def page_count(pdf_bytes: bytes) -> int:
+    """Pages searched for the form: the document's pages, at most MAX_PAGES"""
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.psparser import PSException
+
+    if len(pdf_bytes) > MAX_PDF_BYTES:
+        raise ExtractionError(f"PDF is larger than {MAX_PDF_BYTES} bytes")
+    try:
+        document = PDFDocument(PDFParser(io.BytesIO(pdf_bytes)))
+        return sum(1 for _ in islice(PDFPage.create_pages(document), MAX_PAGES))
+    except PSException as e:
+        raise ExtractionError(f"Not a readable PDF: {e}")
+
+
+def extract_page(pdf_bytes: bytes, number: int) -> Optional[dict]:
+    """
+    extract_application's result for page `number` (1-based) when it is the form, else None.
+
+    Only that page is parsed. Pages laid out like the blank form are read through its
+    field template (ocr.template); anything else falls back to reading the whole page,
+    whose layout objects are released as soon as its text is read.
+    """
+    import pdfplumber
+    from pdfminer.psparser import PSException
+    from ocr.template import form_template
+
+    template = form_template()
+    try:
+        if template is not None:
+            page = _open_page(pdf_bytes, number)
+            read = template.read_page(page) if page is not None else None
+            if read is not None:
+                fields, confidence = read
+                return {"fields": fields, "confidence": confidence, "page": number}
+        with pdfplumber.open(io.BytesIO(pdf_bytes), pages=[number]) as pdf:
+            if not pdf.pages:
+                return None
+            page = pdf.pages[0]
+            try:
+                text = page_text(page.chars)
+            finally:
+                page.close()
+    except PSException as e:
+        raise ExtractionError(f"Not a readable PDF: {e}")
+    if not FORM_ANCHOR.search(text.text):
+        return None
+    fields, confidence = extract_fields(text)
+    return {"fields": fields, "confidence": confidence, "page": number}
+
+
+def extract_application(pdf_bytes: bytes) -> dict:
+    """
+    Read the first form page of a PDF into AccountApplicationCreate fields.
+
+    Returns {"fields": {...}, "confidence": {field: 0-1}, "page": page number}. Values
+    are normalised (block letters, CNIC XXXXX-XXXXXXX-X, dates DD MM YY) but not
+    validated. Raises ExtractionError for unreadable PDFs and pages without a text layer.
+
+    Pages are parsed one at a time, in order, until the form is found; only the first
+    MAX_PAGES are searched.
+    """
+    for number in range(1, page_count(pdf_bytes) + 1):
+        extraction = extract_page(pdf_bytes, number)
+        if extraction is not None:
+            return extraction
+    raise ExtractionError(NO_FORM_FOUND)
@@ -0,0 +1,367 @@
+"""
+Background extraction of uploaded forms.
+
+Jobs and their PDFs are stored (OcrJob / OcrJobDocument) before they are queued, so
+a restart resumes whatever was not finished. A dispatcher thread claims queued
+documents and has a ProcessPoolExecutor count their pages; the pages are then read by
+the pool, at most OCR_DOCUMENT_PAGES_IN_FLIGHT of a document and two per worker at a
+time. All the parsing runs in the worker processes (ocr.worker), each task within the
+document's deadline and the share of its memory budget reserved for it, and a document
+is settled by its first form page, or failed as soon as it goes over budget.
+The pool's done-callbacks only queue finished tasks: a settle thread validates and
+records the results (creating the applications) back in the API process, hands the
+finished task's slot to the document's next page, and replaces the pool when a worker dies.
+"""
+import functools
+import logging
+import os
+import queue
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from sqlmodel import Session
+
+from db.connection import engine
+from db.schemas import OcrJob
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+
+logger = logging.getLogger("app.ocr")
+
+# Run the job queue in this process (OCR_JOBS=false disables POST /ocr/jobs with 503)
+OCR_JOBS_ENABLED = os.getenv("OCR_JOBS", "true").lower() not in ("false", "0", "no")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+# Documents accepted but not yet processed; submissions beyond this are refused with 429
+OCR_QUEUE_MAX_DOCUMENTS = int(os.getenv("OCR_QUEUE_MAX_DOCUMENTS", "500"))
+# Pages of one document read at once; each is reserved an equal share of the document's memory
+OCR_DOCUMENT_PAGES_IN_FLIGHT = max(int(os.getenv("OCR_DOCUMENT_PAGES_IN_FLIGHT", "2")), 1)
+RETRY_AFTER_SECONDS = 5
+
+
+class QueueFull(Exception):
+    """The queue has no room for the submitted documents right now"""
+
+
+class _Document:
+    """A document in flight: its PDF, page results and remaining budget, settled by its first form page"""
+
+    def __init__(self, document_id: int, create_applications: bool, content: bytes,
+                 deadline: Optional[float] = None, memory_left: Optional[int] = None):
+        self.id = document_id
+        self.create_applications = create_applications
+        self.content = content
+        self.pages: Optional[int] = None  # known once the page count (task 0) has finished
+        self.next_page = 1
+        self.in_flight = 0  # tasks submitted and not yet finished
+        self.deadline = deadline  # time.time() by which every page must be read; None: no limit
+        self.memory_left = memory_left  # bytes neither used nor reserved by tasks in flight; None: no limit
+        self.outcomes: Dict[int, object] = {}  # page number -> extraction, None (not the form) or exception
+        self.futures = []
+        self.settled = False
+        self.lock = threading.Lock()
+
+    def reserve(self, parallel: int) -> Optional[int]:
+        """
+        Reserve memory for a task joining those in flight: an equal share of the unreserved
+        memory among the `parallel` tasks that may run at once, so together they stay within budget
+        """
+        with self.lock:
+            self.in_flight += 1
+            if self.memory_left is None:
+                return None
+            share = self.memory_left // max(parallel - self.in_flight + 1, 1)
+            self.memory_left -= share
+            return share
+
+    def release(self, reserved: Optional[int], used: int) -> bool:
+        """Return what a finished task did not use of its reservation; False if it used more"""
+        with self.lock:
+            self.in_flight -= 1
+            if reserved is None:
+                return True
+            self.memory_left += reserved - used
+            return used <= reserved
+
+    def settle(self, number: int, outcome) -> Optional[List[object]]:
+        """Record a page's outcome (page 0: the page count); returns [document outcome] the first time it is known"""
+        from ocr.extraction import NO_FORM_FOUND, ExtractionError
+        from ocr.worker import OverBudget
+
+        with self.lock:
+            if self.settled:
+                return None
+            if isinstance(outcome, OverBudget) or (number == 0 and isinstance(outcome, Exception)):
+                # Over budget fails the whole document, whatever its other pages hold
+                self.settled = True
+                return [outcome]
+            if number == 0:
+                self.pages = outcome
+                if self.pages:
+                    return None
+                self.settled = True
+                return [ExtractionError(NO_FORM_FOUND)]
+            self.outcomes[number] = outcome
+            for page in range(1, self.pages + 1):
+                if page not in self.outcomes:
+                    # An earlier page may still turn out to be the form
+                    return None
+                if self.outcomes[page] is not None:
+                    break
+            self.settled = True
+            return [self.outcomes[page] if self.outcomes[page] is not None else ExtractionError(NO_FORM_FOUND)]
+
+
+class OcrJobQueue:
+    """Bounded queue of persisted documents extracted by a process pool"""
+
+    def __init__(self, workers: int, max_documents: int):
+        self.workers = max(workers, 1)
+        self.max_documents = max_documents
+        self.pending = 0  # queued or in-flight documents of this process
+        self._lock = threading.Lock()
+        self._document_ids = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+        self._stopping = threading.Event()
+        self._finished_pages: Optional[queue.Queue] = None  # finished page futures for the settle thread
+        self._executor: Optional["ProcessPoolExecutor"] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._settler: Optional[threading.Thread] = None
+        self._starter: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Started, or starting in the background (submissions wait in the queue meanwhile)"""
+        return self._executor is not None or (self._starter is not None and self._starter.is_alive())
+
+    def _new_executor(self) -> "ProcessPoolExecutor":
+        # The pool and the readers are imported here, not at module import: an API
+        # process that never starts the queue (OCR_JOBS=false) does not load them
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+        from ocr.worker import warm
+
+        # spawn: the API process runs threads, which fork() would copy mid-operation
+        return ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"), initializer=warm)
+
+    def start(self) -> int:
+        """Start the dispatcher and requeue unfinished documents; returns how many were resumed"""
+        with Session(engine) as session:
+            document_ids = OcrJob.requeue_interrupted(session)
+        self._stopping.clear()
+        # Slots of pages abandoned by a previous stop() are never released
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+        self._finished_pages = queue.Queue()
+        self._executor = self._new_executor()
+        with self._lock:
+            self.pending += len(document_ids)
+        for document_id in document_ids:
+            self._document_ids.put(document_id)
+        self._settler = threading.Thread(target=self._settle_pages, args=(self._finished_pages,), name="ocr-settler", daemon=True)
+        self._settler.start()
+        self._dispatcher = threading.Thread(target=self._dispatch, args=(self._finished_pages,), name="ocr-dispatcher", daemon=True)
+        self._dispatcher.start()
+        return len(document_ids)
+
+    def start_in_background(self) -> None:
+        """start() on a thread, so the requeue and the pool creation stay off the startup path"""
+        def start():
+            try:
+                resumed = self.start()
+            except Exception:
+                logger.exception("Could not start the OCR job queue")
+                return
+            if resumed:
+                print(f"Resumed {resumed} queued OCR documents")
+
+        self._starter = threading.Thread(target=start, name="ocr-start", daemon=True)
+        self._starter.start()
+
+    def stop(self) -> None:
+        """Stop dispatching; documents in flight are requeued by the next start"""
+        if self._starter is not None:
+            self._starter.join()
+            self._starter = None
+        if self._executor is None:
+            return
+        self._stopping.set()
+        self._document_ids.put(None)
+        self._dispatcher.join()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Pages still being read are dropped; their documents stay running until the next start
+        self._finished_pages.put(None)
+        self._settler.join()
+
+    def submit(self, session: Session, documents: List[tuple], create_applications: bool) -> OcrJob:
+        """Persist and queue (filename, PDF bytes) documents; raises QueueFull when over capacity"""
+        with self._lock:
+            if self.pending + len(documents) > self.max_documents:
+                raise QueueFull(f"{self.pending} documents are waiting; the queue holds {self.max_documents}")
+            self.pending += len(documents)
+        try:
+            job, document_ids = OcrJob.submit(session, documents, create_applications)
+        except Exception:
+            self._finished(len(documents))
+            raise
+        for document_id in document_ids:
+            self._document_ids.put(document_id)
+        return job
+
+    def _finished(self, count: int = 1) -> None:
+        with self._lock:
+            self.pending -= count
+
+    def _acquire_slot(self) -> bool:
+        while not self._slots.acquire(timeout=0.5):
+            if self._stopping.is_set():
+                return False
+        return True
+
+    def _dispatch(self, finished: queue.Queue) -> None:
+        from ocr.worker import count_pages_within_budget, document_allowance
+
+        while True:
+            document_id = self._document_ids.get()
+            if document_id is None or not self._acquire_slot():
+                return
+            try:
+                with Session(engine) as session:
+                    claimed = OcrJob.claim_document(session, document_id)
+            except Exception:
+                logger.exception("Could not dispatch OCR document %s", document_id)
+                self._slots.release()
+                self._finished()
+                continue
+            if claimed is None:
+                # Taken by another process sharing the database
+                self._slots.release()
+                self._finished()
+                continue
+            content, create_applications = claimed
+            document = _Document(document_id, create_applications, content, *document_allowance())
+            # Counting the pages parses the PDF, so it runs in a worker within the document's
+            # budget, holding the slot taken above; its pages are dispatched once it finishes
+            self._submit(document, 0, finished, count_pages_within_budget)
+
+    def _submit(self, document: _Document, number: int, finished: queue.Queue, task, *args) -> bool:
+        """Run task(PDF, *args, deadline, reserved memory) for page `number` on a slot already taken"""
+        executor = self._executor
+        reserved = document.reserve(1 if number == 0 else OCR_DOCUMENT_PAGES_IN_FLIGHT)
+        try:
+            future = executor.submit(task, document.content, *args, document.deadline, reserved)
+        except Exception as e:
+            logger.exception("Could not dispatch page %s of OCR document %s", number, document.id)
+            document.release(reserved, 0)
+            self._slots.release()
+            self._page_outcome(document, number, executor, e)
+            return False
+        document.futures.append(future)
+        future.add_done_callback(functools.partial(_page_done, finished, document, number, executor, reserved))
+        return True
+
+    def _next_pages(self, document: _Document, finished: queue.Queue) -> None:
+        """Dispatch the document's next pages: the first on the slot of its task that just finished, more while slots are free"""
+        from ocr.worker import extract_page_within_budget
+
+        held = True
+        while (not document.settled and document.pages is not None and document.next_page <= document.pages
+               and document.in_flight < OCR_DOCUMENT_PAGES_IN_FLIGHT and (held or self._slots.acquire(blocking=False))):
+            held = False
+            number = document.next_page
+            document.next_page += 1
+            if not self._submit(document, number, finished, extract_page_within_budget, number):
+                break
+        if held:
+            self._slots.release()
+
+    def _settle_pages(self, finished: queue.Queue) -> None:
+        """Settle thread: turn finished tasks into document results and dispatch further pages until stop()"""
+        from ocr.worker import OverBudget
+
+        while True:
+            item = finished.get()
+            if item is None:
+                return
+            document, number, executor, reserved, future = item
+            if future.cancelled():
+                # Shutting down (the document stays running and is requeued on the next start),
+                # or a later page no longer needed once the document was settled
+                self._slots.release()
+                continue
+            try:
+                outcome, memory = future.result()
+            except Exception as e:
+                outcome, memory = e, 0
+            if not document.release(reserved, memory):
+                outcome = OverBudget.memory()
+            try:
+                self._page_outcome(document, number, executor, outcome)
+            except Exception:
+                logger.exception("Could not settle page %s of OCR document %s", number, document.id)
+            self._next_pages(document, finished)
+
+    def _page_outcome(self, document: _Document, number: int, executor: "ProcessPoolExecutor", outcome) -> None:
+        from concurrent.futures.process import BrokenProcessPool
+
+        if isinstance(outcome, BrokenProcessPool):
+            # A worker died (e.g. killed for memory); replace the pool once, unless stopping
+            with self._lock:
+                if self._executor is executor and not self._stopping.is_set():
+                    self._executor = self._new_executor()
+                    executor.shutdown(wait=False)
+        settled = document.settle(number, outcome)
+        if settled is not None:
+            for pending in document.futures:
+                pending.cancel()
+            self._settle(document, settled[0])
+
+    def _settle(self, document: _Document, outcome) -> None:
+        """Validate and record a document's extraction, or its failure"""
+        from concurrent.futures.process import BrokenProcessPool
+        from ocr.extraction import ExtractionError
+
+        try:
+            if isinstance(outcome, ExtractionError):
+                status, application_id, result = "failed", None, {"valid": False, "errors": [{"msg": str(outcome)}]}
+            elif isinstance(outcome, BrokenProcessPool):
+                status, application_id, result = "failed", None, {"valid": False, "errors": [{"msg": "Extraction worker crashed"}]}
+            elif isinstance(outcome, Exception):
+                logger.error("OCR document %s failed", document.id, exc_info=outcome)
+                status, application_id, result = "failed", None, {"valid": False, "errors": [{"msg": "Extraction failed"}]}
+            else:
+                status, application_id, result = _apply(outcome, document.create_applications)
+            with Session(engine) as session:
+                OcrJob.record_result(session, document.id, status, application_id, result)
+        except Exception:
+            logger.exception("Could not record OCR document %s", document.id)
+        finally:
+            self._finished()
+
+
+def _page_done(finished: queue.Queue, document: _Document, number: int, executor: "ProcessPoolExecutor",
+               reserved: Optional[int], future) -> None:
+    # Done-callback, run on the pool's manager thread (or by cancel()): only hand the page on
+    finished.put((document, number, executor, reserved, future))
+
+
+def _apply(extraction: dict, create_applications: bool) -> tuple:
+    """(document status, application id, stored result) for an extraction"""
+    from fastapi import HTTPException
+    from controller.account_application import apply_extraction
+
+    with Session(engine) as session:
+        try:
+            result = apply_extraction(extraction, create_applications, session)
+        except HTTPException as e:
+            # Duplicate CNIC and other conflicts while creating the application
+            return "failed", None, {"valid": False, "errors": [{"msg": e.detail}], "application": extraction["fields"]}
+    created = result.pop("created")
+    if created is not None:
+        return "created", created["id"], result
+    return ("extracted" if result["valid"] else "invalid"), None, result
+
+
+job_queue = OcrJobQueue(OCR_WORKERS, OCR_QUEUE_MAX_DOCUMENTS)
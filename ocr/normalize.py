@@ -0,0 +1,141 @@
+"""
+Normalisation of raw strings read from a form into AccountApplicationCreate values.
+
+Every normaliser returns (value, confidence). Confidence is 0 when nothing was read,
+lower when the value had to be reshaped to fit the expected format, and low when it
+still does not match it (the value is then passed through so validation reports it).
+"""
+import re
+from typing import Optional, Tuple
+
+from model import Gender, MaritalStatus, Occupation
+
+
+Normalized = Tuple[Optional[object], float]
+
+EXACT = 0.95
+RESHAPED = 0.8
+UNCERTAIN = 0.5
+INVALID = 0.2
+
+# Six digits, however they are spaced (one per cell on the form), are DD MM YY as written
+_BOXED_DATE = re.compile(r"(\d{2})(\d{2})(\d{2})")
+_SEPARATED_DATE = re.compile(r"(\d{1,2})[\s./-]+(\d{1,2})[\s./-]+(\d{2}|\d{4})")
+
+GENDER_ALIASES = {"M": Gender.MALE.value, "F": Gender.FEMALE.value}
+MARITAL_STATUS_ALIASES = {"UNMARRIED": MaritalStatus.SINGLE.value, "WIDOW": MaritalStatus.WIDOWED.value}
+
+
+def clean(raw: Optional[str]) -> Optional[str]:
+    """Collapse whitespace and strip separators left over from the form; None when empty"""
+    if raw is None:
+        return None
+    value = re.sub(r"\s+", " ", raw).strip(" ,.:;")
+    return value or None
+
+
+def text(raw: Optional[str]) -> Normalized:
+    value = clean(raw)
+    return (value, EXACT) if value else (None, 0.0)
+
+
+def upper_text(raw: Optional[str]) -> Normalized:
+    """Names and addresses are stored in BLOCK LETTERS"""
+    value = clean(raw)
+    if not value:
+        return None, 0.0
+    return value.upper(), EXACT if value.isupper() else RESHAPED
+
+
+def digits(raw: Optional[str]) -> Normalized:
+    value = clean(raw)
+    if not value:
+        return None, 0.0
+    only_digits = re.sub(r"\D", "", value)
+    if not only_digits:
+        return value, INVALID
+    return only_digits, EXACT if only_digits == value else RESHAPED
+
+
+def cnic(raw: Optional[str]) -> Normalized:
+    """XXXXX-XXXXXXX-X from any spacing or punctuation around 13 digits"""
+    value = clean(raw)
+    only_digits = re.sub(r"\D", "", value or "")
+    if not only_digits:
+        # Blank, or only the printed separators of the boxes
+        return None, 0.0
+    if len(only_digits) != 13:
+        return value, INVALID
+    formatted = f"{only_digits[:5]}-{only_digits[5:12]}-{only_digits[12]}"
+    return formatted, EXACT if formatted == re.sub(r"\s", "", value) else RESHAPED
+
+
+def date(raw: Optional[str]) -> Normalized:
+    """DD MM YY from DD MM YY, DDMMYY, DD/MM/YYYY, D-M-YY and similar"""
+    value = clean(raw)
+    if not value:
+        return None, 0.0
+    match = _BOXED_DATE.fullmatch(re.sub(r"\s", "", value))
+    confidence = EXACT
+    if not match:
+        match = _SEPARATED_DATE.fullmatch(value)
+        confidence = RESHAPED
+    if not match:
+        return value, INVALID
+    day, month, year = (int(part) for part in match.groups())
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return value, INVALID
+    return f"{day:02d} {month:02d} {year % 100:02d}", confidence
+
+
+def amount(raw: Optional[str]) -> Normalized:
+    """Turnover figures, tolerating thousands separators and currency markers"""
+    value = clean(raw)
+    if not value:
+        return None, 0.0
+    number = re.sub(r"(?i)rs\.?|[,\s]", "", value)
+    try:
+        return float(number), EXACT if number == value else RESHAPED
+    except ValueError:
+        return None, INVALID
+
+
+def relation(raw: Optional[str]) -> Normalized:
+    """S, W or D (son, wife, daughter of) from S, S/O, W/O, ..."""
+    value = clean(raw)
+    if not value:
+        return None, 0.0
+    key = re.sub(r"\s", "", value.upper())
+    if key in ("S", "W", "D"):
+        return key, EXACT
+    match = re.fullmatch(r"([SWD])/?O", key)
+    if match:
+        return match.group(1), RESHAPED
+    return key, UNCERTAIN
+
+
+def _enum_value(raw: Optional[str], values, aliases: dict) -> Normalized:
+    value = clean(raw)
+    if not value:
+        return None, 0.0
+    key = re.sub(r"[\s/-]+", "_", value.upper())
+    if key in values:
+        return key, EXACT
+    if key in aliases:
+        return aliases[key], RESHAPED
+    prefixed = [candidate for candidate in values if candidate.startswith(key)]
+    if len(prefixed) == 1:
+        return prefixed[0], UNCERTAIN
+    return None, INVALID
+
+
+def gender(raw: Optional[str]) -> Normalized:
+    return _enum_value(raw, {member.value for member in Gender}, GENDER_ALIASES)
+
+
+def marital_status(raw: Optional[str]) -> Normalized:
+    return _enum_value(raw, {member.value for member in MaritalStatus}, MARITAL_STATUS_ALIASES)
+
+
+def occupation(raw: Optional[str]) -> Normalized:
+    return _enum_value(raw, {member.value for member in Occupation}, {})
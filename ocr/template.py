@@ -0,0 +1,264 @@
+"""
+Field-coordinate templates for the bank form layout.
+
+The blank form (form.pdf) is analysed once with the label patterns of ocr.extraction:
+every text field gets the box between its label and the next one, and every choice row
+the box holding its options along with each option's x range. The template is cached
+on disk under a fingerprint of the blank form and the field definitions, so it is only
+rebuilt when either changes.
+
+A filled form is then read by decoding only the text on the template's lines
+(ocr.textlayer) and taking the glyphs inside each box, instead of parsing the whole
+page and searching its text. Uploads whose printed labels are not where the template
+expects them are left to the full-page reader.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from ocr import normalize
+from ocr.extraction import (
+    CHOICES, FORM_ANCHOR, LINE_TOLERANCE, MARKS, TEXT_FIELDS, WORD_GAP, ChoiceLayout, ExtractionError, PageText,
+    assemble_fields, choice_layout, page_text, ticked_options, _TEXT_PATTERNS, _words
+)
+
+
+logger = logging.getLogger("app.ocr")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Blank form the template is built from; empty disables templates
+FORM_TEMPLATE = os.getenv("OCR_FORM_TEMPLATE", os.path.join(_ROOT, "form.pdf"))
+TEMPLATE_DIR = os.getenv("OCR_TEMPLATE_DIR", os.path.join(_ROOT, "ocr", "templates"))
+# Share of the template's printed glyphs that must be found in place for an upload to match
+MIN_LAYOUT_MATCH = 0.9
+# Bump when the template format or the way regions are derived changes
+TEMPLATE_VERSION = 1
+
+Box = Tuple[float, float, float, float]  # (x0, top, x1, bottom)
+
+
+@dataclass
+class ChoiceRegion:
+    box: Box
+    options: List[Tuple[object, float, float]]  # (value, x0, x1) of each printed option
+    free_label: Optional[Tuple[float, float]] = None  # (x0, x1) of the label handwriting follows
+
+
+@dataclass
+class FormTemplate:
+    fingerprint: str
+    width: float
+    height: float
+    bands: List[Tuple[float, float]]  # (top, bottom) of the lines holding fields
+    signature: List[Tuple[str, float, float]]  # (text, x0, top) of the printed glyphs on those lines
+    text_fields: Dict[str, Box]
+    choices: Dict[str, ChoiceRegion]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FormTemplate":
+        return cls(
+            fingerprint=data["fingerprint"],
+            width=data["width"],
+            height=data["height"],
+            bands=[tuple(band) for band in data["bands"]],
+            signature=[tuple(glyph) for glyph in data["signature"]],
+            text_fields={name: tuple(box) for name, box in data["text_fields"].items()},
+            choices={
+                name: ChoiceRegion(
+                    tuple(region["box"]),
+                    [tuple(option) for option in region["options"]],
+                    tuple(region["free_label"]) if region["free_label"] else None
+                )
+                for name, region in data["choices"].items()
+            }
+        )
+
+    def matches(self, chars: List[dict]) -> bool:
+        """Whether the template's printed glyphs are in place among these"""
+        found = {_glyph_key(char) for char in chars}
+        present = sum(1 for glyph in self.signature if glyph in found)
+        return present >= MIN_LAYOUT_MATCH * len(self.signature)
+
+    def read(self, chars: List[dict]) -> Tuple[dict, Dict[str, float]]:
+        """AccountApplicationCreate fields and per-field confidence from the glyphs on the template's lines"""
+        chars = sorted(chars, key=_middle)
+        middles = [_middle(char) for char in chars]
+        raw_text = {name: page_text(_inside(chars, middles, box)).text for name, box in self.text_fields.items()}
+
+        def read_choice(name: str) -> Tuple[List[object], Optional[str]]:
+            region = self.choices[name]
+            layout = _region_layout(_inside(chars, middles, region.box), region)
+            return ticked_options(layout, CHOICES[name].box_after), layout.free_text
+
+        return assemble_fields(raw_text, read_choice)
+
+    def read_page(self, page) -> Optional[Tuple[dict, Dict[str, float]]]:
+        """read() for a pdfminer page laid out like the template; None when it is not"""
+        from pdfminer.pdfinterp import PDFResourceManager
+        from ocr.textlayer import read_chars
+
+        (x0, y0, x1, y1) = page.mediabox
+        width, height = (y1 - y0, x1 - x0) if page.rotate % 180 else (x1 - x0, y1 - y0)
+        if abs(width - self.width) > 1 or abs(height - self.height) > 1:
+            return None
+        chars = read_chars(page, PDFResourceManager(caching=True), self.bands)
+        return self.read(chars) if self.matches(chars) else None
+
+
+def _glyph_key(char: dict) -> Tuple[str, float, float]:
+    return char["text"], round(char["x0"], 1), round(char["top"], 1)
+
+
+def _middle(char: dict) -> float:
+    return (char["top"] + char["bottom"]) / 2
+
+
+def _inside(chars: List[dict], middles: List[float], box: Box) -> List[dict]:
+    """Glyphs centred in the box, from glyphs sorted by their vertical middle"""
+    x0, top, x1, bottom = box
+    line = chars[bisect_left(middles, top):bisect_right(middles, bottom)]
+    return [char for char in line if x0 < (char["x0"] + char["x1"]) / 2 < x1]
+
+
+def _region_layout(chars: List[dict], region: ChoiceRegion) -> ChoiceLayout:
+    """Marks and free text of a choice row, against the option positions of the template"""
+    page = page_text(chars)
+    marks = [(x0 + x1) / 2 for word, x0, x1 in _words(page, 0, len(page.text)) if word in MARKS]
+    layout = ChoiceLayout(region.options, marks)
+    if region.free_label:
+        free_x0, free_x1 = region.free_label
+        written = page_text([char for char in chars if (char["x0"] + char["x1"]) / 2 > free_x1])
+        layout.free_text = normalize.clean(" ".join(word for word in written.text.split() if word not in MARKS))
+        # Marks inside the handwriting belong to it, not to the options
+        layout.marks = [x for x in marks if x < free_x0]
+    return layout
+
+
+def _glyph_before(page: PageText, index: int) -> Optional[dict]:
+    """Last glyph before text index `index` on the same line"""
+    while index > 0 and page.text[index - 1] != "\n":
+        index -= 1
+        if page.glyphs[index] is not None:
+            return page.glyphs[index]
+    return None
+
+
+def _glyph_from(page: PageText, index: int) -> Optional[dict]:
+    """First glyph at or after text index `index` on the same line"""
+    while index < len(page.text) and page.text[index] != "\n":
+        if page.glyphs[index] is not None:
+            return page.glyphs[index]
+        index += 1
+    return None
+
+
+def _box(page: PageText, start: int, end: int, width: float, line_glyph: dict) -> Box:
+    """The box from the glyph before `start` (or the left edge) to the glyph from `end` (or the right edge)"""
+    before, after = _glyph_before(page, start), _glyph_from(page, end)
+    middle = _middle(line_glyph)
+    return (
+        before["x1"] if before else 0.0,
+        middle - LINE_TOLERANCE,
+        after["x0"] if after else width,
+        middle + LINE_TOLERANCE
+    )
+
+
+def build_template(pdf_bytes: bytes, fingerprint: str) -> FormTemplate:
+    """Locate every field of the blank form; raises ExtractionError when a label is missing"""
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfinterp import PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    from ocr.textlayer import read_chars
+
+    resources = PDFResourceManager(caching=True)
+    for page in PDFPage.create_pages(PDFDocument(PDFParser(io.BytesIO(pdf_bytes)))):
+        chars = read_chars(page, resources)
+        text = page_text(chars)
+        if FORM_ANCHOR.search(text.text):
+            break
+    else:
+        raise ExtractionError("The blank form has no account-opening form page")
+    (x0, y0, x1, y1) = page.mediabox
+    width, height = x1 - x0, y1 - y0
+
+    text_fields = {}
+    for name, pattern in _TEXT_PATTERNS.items():
+        match = pattern.search(text.text)
+        if not match:
+            raise ExtractionError(f"Label of {name} not found on the blank form")
+        label = _glyph_before(text, match.start("value"))
+        text_fields[name] = _box(text, match.start("value"), match.end("value"), width, label)
+
+    choices = {}
+    for name, choice in CHOICES.items():
+        match = choice.scope.search(text.text)
+        layout = choice_layout(text, choice)
+        if not match or len(layout.options) != len(choice.options):
+            raise ExtractionError(f"Options of {name} not found on the blank form")
+        line_glyph = _glyph_from(text, match.start("scope"))
+        box = _box(text, match.start("scope"), match.end("scope"), width, line_glyph)
+        choices[name] = ChoiceRegion(box, layout.options, layout.free_label)
+
+    bands = []
+    for _, top, _, bottom in sorted(list(text_fields.values()) + [region.box for region in choices.values()], key=lambda box: box[1]):
+        if bands and top <= bands[-1][1]:
+            bands[-1] = (bands[-1][0], max(bands[-1][1], bottom))
+        else:
+            bands.append((top, bottom))
+    signature = [_glyph_key(char) for char in chars if any(top <= _middle(char) <= bottom for top, bottom in bands)]
+    return FormTemplate(fingerprint, width, height, bands, signature, text_fields, choices)
+
+
+def layout_fingerprint(pdf_bytes: bytes) -> str:
+    """Hash of the blank form and of everything that decides where its fields are read"""
+    definitions = {
+        "version": TEMPLATE_VERSION,
+        "line_tolerance": LINE_TOLERANCE,
+        "word_gap": WORD_GAP,
+        "text_fields": [(name, start, end) for name, start, end, _ in TEXT_FIELDS],
+        "choices": {
+            name: (choice.scope.pattern, choice.options, choice.box_after, choice.free_text)
+            for name, choice in CHOICES.items()
+        },
+    }
+    digest = hashlib.sha256(pdf_bytes)
+    digest.update(json.dumps(definitions, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def form_template() -> Optional[FormTemplate]:
+    """The template of OCR_FORM_TEMPLATE, from the disk cache or built once; None when unavailable"""
+    if not FORM_TEMPLATE:
+        return None
+    try:
+        with open(FORM_TEMPLATE, "rb") as f:
+            pdf_bytes = f.read()
+        fingerprint = layout_fingerprint(pdf_bytes)
+        path = os.path.join(TEMPLATE_DIR, f"{fingerprint[:32]}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                return FormTemplate.from_dict(json.load(f))
+        template = build_template(pdf_bytes, fingerprint)
+    except Exception as e:
+        logger.warning("Form template unavailable, reading whole pages: %s", e)
+        return None
+
+    try:
+        os.makedirs(TEMPLATE_DIR, exist_ok=True)
+        # Written under a temporary name so concurrent workers never read a partial file
+        with tempfile.NamedTemporaryFile("w", dir=TEMPLATE_DIR, suffix=".tmp", delete=False) as f:
+            json.dump(asdict(template), f)
+        os.replace(f.name, path)
+    except OSError as e:
+        logger.warning("Could not cache the form template in %s: %s", TEMPLATE_DIR, e)
+    return template
@@ -0,0 +1,341 @@
+"""
+Fast reader for the glyphs of a page's text layer.
+
+pdfplumber (through pdfminer) interprets every operator of a page and builds a layout
+object for each glyph, rule and box, which is most of the cost of reading a form. This
+reader tokenises the content stream with one regex, follows only the graphics and text
+state, and builds glyphs only for text shown inside the requested bands. Glyphs are
+dicts with the same text, x0, x1, top, bottom and size as pdfplumber's page.chars.
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdftypes import PDFObjRef, dict_value, list_value, stream_value
+from pdfminer.psparser import LIT
+
+Matrix = Tuple[float, float, float, float, float, float]
+Band = Tuple[float, float]  # (top, bottom) in page coordinates
+
+IDENTITY: Matrix = (1, 0, 0, 1, 0, 0)
+MAX_XOBJECT_DEPTH = 8
+
+_TOKEN = re.compile(
+    rb"[\x00\t\n\x0c\r ]+|%[^\r\n]*"
+    rb"|(?P<number>[+-]?(?:\d+\.?\d*|\.\d+))"
+    rb"|(?P<name>/[^\x00\t\n\x0c\r /\[\]()<>{}%]*)"
+    rb"|(?P<open><<|\[|\{)"
+    rb"|(?P<close>>>|\]|\})"
+    rb"|(?P<hex><[0-9A-Fa-f\x00\t\n\x0c\r ]*>)"
+    rb"|(?P<string>\()"
+    rb"|(?P<keyword>true|false|null)(?![^\x00\t\n\x0c\r /\[\]()<>{}%])"
+    rb"|(?P<operator>[^\x00\t\n\x0c\r /\[\]()<>{}%]+)"
+)
+_SIMPLE_STRING = re.compile(rb"[^()\\]*\)")
+_END_INLINE_IMAGE = re.compile(rb"[\x00\t\n\x0c\r ]EI(?=[\x00\t\n\x0c\r ]|$)")
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+_KEYWORDS = {b"true": True, b"false": False, b"null": None}
+_OPEN = object()
+_LIT_FORM = LIT("Form")
+
+
+def _multiply(m1: Matrix, m0: Matrix) -> Matrix:
+    (a1, b1, c1, d1, e1, f1) = m1
+    (a0, b0, c0, d0, e0, f0) = m0
+    return (
+        a0 * a1 + c0 * b1, b0 * a1 + d0 * b1,
+        a0 * c1 + c0 * d1, b0 * c1 + d0 * d1,
+        a0 * e1 + c0 * f1 + e0, b0 * e1 + d0 * f1 + f0,
+    )
+
+
+def _literal(data: bytes, pos: int) -> Tuple[bytes, int]:
+    """Literal string starting after its "(": (bytes, position after the closing ")")"""
+    simple = _SIMPLE_STRING.match(data, pos)
+    if simple:
+        return data[pos:simple.end() - 1], simple.end()
+    out, depth, end = bytearray(), 1, len(data)
+    while pos < end:
+        char = data[pos:pos + 1]
+        pos += 1
+        if char == b"\\":
+            escaped = data[pos:pos + 1]
+            pos += 1
+            if escaped in _ESCAPES:
+                out += _ESCAPES[escaped]
+            elif escaped in b"01234567" and escaped:
+                digits = re.match(rb"[0-7]{1,3}", data[pos - 1:pos + 2]).group()
+                out.append(int(digits, 8) & 0xFF)
+                pos += len(digits) - 1
+            elif escaped == b"\r":
+                pos += data[pos:pos + 1] == b"\n"
+            elif escaped != b"\n":
+                out += escaped
+            continue
+        if char == b"(":
+            depth += 1
+        elif char == b")":
+            depth -= 1
+            if depth == 0:
+                break
+        out += char
+    return bytes(out), pos
+
+
+def _name(token: bytes) -> str:
+    name = re.sub(rb"#([0-9A-Fa-f]{2})", lambda match: bytes([int(match.group(1), 16)]), token[1:])
+    try:
+        return name.decode("utf-8")
+    except UnicodeDecodeError:
+        return name.decode("latin-1")
+
+
+def _in_bands(top: float, bottom: float, bands: Optional[Sequence[Band]]) -> bool:
+    if bands is None:
+        return True
+    middle = (top + bottom) / 2
+    for band_top, band_bottom in bands:
+        if band_top <= middle <= band_bottom:
+            return True
+    return False
+
+
+class _TextState:
+    __slots__ = ("font", "size", "charspace", "wordspace", "scaling", "leading", "rise", "matrix", "line")
+
+    def __init__(self):
+        self.font, self.size = None, 0.0
+        self.charspace = self.wordspace = self.leading = self.rise = 0.0
+        self.scaling = 100.0
+        self.matrix, self.line = IDENTITY, (0.0, 0.0)
+
+    def copy(self) -> "_TextState":
+        state = _TextState()
+        for slot in self.__slots__:
+            setattr(state, slot, getattr(self, slot))
+        return state
+
+
+class _Reader:
+    def __init__(self, rsrcmgr, height: float, bands: Optional[Sequence[Band]]):
+        self.rsrcmgr = rsrcmgr
+        self.height = height
+        self.bands = bands
+        self.chars: List[dict] = []
+
+    def fonts(self, resources: dict) -> Dict[str, object]:
+        fonts = {}
+        for font_id, spec in dict_value(dict_value(resources).get("Font", {})).items():
+            object_id = spec.objid if isinstance(spec, PDFObjRef) else None
+            fonts[font_id] = (object_id, spec)
+        return fonts
+
+    def run(self, resources: dict, streams: Sequence[object], ctm: Matrix, depth: int = 0) -> None:
+        resources = dict_value(resources) if resources else {}
+        fonts = self.fonts(resources)
+        loaded: Dict[str, object] = {}
+        xobjects = dict_value(resources.get("XObject", {}))
+        data = b"\n".join(stream_value(stream).get_data() for stream in streams)
+
+        state, saved, stack = _TextState(), [], []
+        pos, end, match = 0, len(data), _TOKEN.match
+        while pos < end:
+            token = match(data, pos)
+            if token is None:
+                pos += 1
+                continue
+            pos = token.end()
+            kind = token.lastgroup
+            if kind is None:
+                continue
+            if kind == "number":
+                stack.append(float(token.group()))
+            elif kind == "string":
+                value, pos = _literal(data, pos)
+                stack.append(value)
+            elif kind == "hex":
+                digits = re.sub(rb"[^0-9A-Fa-f]", b"", token.group())
+                stack.append(bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode()))
+            elif kind == "name":
+                stack.append(_name(token.group()))
+            elif kind == "keyword":
+                stack.append(_KEYWORDS[token.group()])
+            elif kind == "open":
+                stack.append(_OPEN)
+            elif kind == "close":
+                items = []
+                while stack and stack[-1] is not _OPEN:
+                    items.append(stack.pop())
+                if stack:
+                    stack.pop()
+                items.reverse()
+                stack.append(items if token.group() == b"]" else None)
+            else:
+                operator = token.group()
+                try:
+                    ctm = self.operate(operator, stack, state, saved, ctm, fonts, loaded, xobjects, resources, depth)
+                except (IndexError, TypeError, ValueError):
+                    # Malformed operands: skip the operator, as pdfminer does outside strict mode
+                    pass
+                if operator == b"ID":
+                    image_end = _END_INLINE_IMAGE.search(data, pos)
+                    pos = image_end.end() if image_end else end
+                stack.clear()
+
+    def operate(self, operator: bytes, stack: list, state: _TextState, saved: list, ctm: Matrix,
+                fonts: dict, loaded: dict, xobjects: dict, resources: dict, depth: int) -> Matrix:
+        if operator == b"TJ":
+            self.show(stack[-1], state, ctm)
+        elif operator == b"Tj":
+            self.show([stack[-1]], state, ctm)
+        elif operator == b"Tm":
+            state.matrix, state.line = tuple(stack[-6:]), (0.0, 0.0)
+        elif operator in (b"Td", b"TD"):
+            tx, ty = stack[-2:]
+            (a, b, c, d, e, f) = state.matrix
+            state.matrix, state.line = (a, b, c, d, tx * a + ty * c + e, tx * b + ty * d + f), (0.0, 0.0)
+            if operator == b"TD":
+                state.leading = ty
+        elif operator == b"Tf":
+            font_id, state.size = stack[-2:]
+            if font_id not in loaded:
+                object_id, spec = fonts.get(font_id, (None, {}))
+                loaded[font_id] = self.rsrcmgr.get_font(object_id, dict_value(spec))
+            state.font = loaded[font_id]
+        elif operator == b"BT":
+            state.matrix, state.line = IDENTITY, (0.0, 0.0)
+        elif operator == b"q":
+            saved.append((ctm, state.copy()))
+        elif operator == b"Q":
+            if saved:
+                ctm, restored = saved.pop()
+                for slot in _TextState.__slots__:
+                    setattr(state, slot, getattr(restored, slot))
+        elif operator == b"cm":
+            ctm = _multiply(tuple(stack[-6:]), ctm)
+        elif operator in (b"T*", b"'"):
+            (a, b, c, d, e, f) = state.matrix
+            state.matrix, state.line = (a, b, c, d, state.leading * c + e, state.leading * d + f), (0.0, 0.0)
+            if operator == b"'":
+                self.show([stack[-1]], state, ctm)
+        elif operator == b'"':
+            state.wordspace, state.charspace = stack[-3:-1]
+            self.show([stack[-1]], state, ctm)
+        elif operator == b"Tc":
+            state.charspace = stack[-1]
+        elif operator == b"Tw":
+            state.wordspace = stack[-1]
+        elif operator == b"Tz":
+            state.scaling = stack[-1]
+        elif operator == b"TL":
+            state.leading = -stack[-1]
+        elif operator == b"Ts":
+            state.rise = stack[-1]
+        elif operator == b"Do" and depth < MAX_XOBJECT_DEPTH and stack[-1] in xobjects:
+            xobject = stream_value(xobjects[stack[-1]])
+            if xobject.get("Subtype") is _LIT_FORM and "BBox" in xobject:
+                matrix = tuple(list_value(xobject.get("Matrix", IDENTITY)))
+                self.run(xobject.get("Resources") or resources, [xobject], _multiply(matrix, ctm), depth + 1)
+        return ctm
+
+    def show(self, sequence: list, state: _TextState, ctm: Matrix) -> None:
+        font = state.font
+        if font is None:
+            return
+        vertical = font.is_vertical()
+        (a, b, c, d, e, f) = _multiply(state.matrix, ctm)
+        size = state.size
+        scaling = state.scaling * 0.01
+        charspace = state.charspace * scaling
+        wordspace = 0 if font.is_multibyte() else state.wordspace * scaling
+        dxscale = 0.001 * size * scaling
+        low = font.get_descent() * size + state.rise
+        high = low + size
+        (x, y) = state.line
+
+        # Upright horizontal text keeps one baseline for the whole operator: skip it unless it is in a band
+        visible = True
+        if b == 0 and c == 0 and not vertical:
+            y0, y1 = sorted((d * low + y * d + f, d * high + y * d + f))
+            visible = _in_bands(self.height - y1, self.height - y0, self.bands)
+
+        need_charspace = False
+        for item in sequence:
+            if isinstance(item, float):
+                if vertical:
+                    y -= item * dxscale
+                else:
+                    x -= item * dxscale
+                need_charspace = True
+                continue
+            if not isinstance(item, bytes):
+                continue
+            for cid in font.decode(item):
+                if need_charspace:
+                    if vertical:
+                        y += charspace
+                    else:
+                        x += charspace
+                advance = font.char_width(cid) * size * scaling
+                matrix = (a, b, c, d, x * a + y * c + e, x * b + y * d + f)
+                if vertical:
+                    # Glyph box around the vertical origin, as pdfminer's LTChar
+                    (vx, vy) = font.char_disp(cid)
+                    vx = size * 0.5 if vx is None else vx * size * 0.001
+                    vy = (1000 - vy) * size * 0.001
+                    self.glyph(font, cid, matrix, (-vx, vy + state.rise + advance), (-vx + size, vy + state.rise), True)
+                    y += advance
+                else:
+                    if visible:
+                        self.glyph(font, cid, matrix, (0, low), (advance, high), False)
+                    x += advance
+                if cid == 32 and wordspace:
+                    if vertical:
+                        y += wordspace
+                    else:
+                        x += wordspace
+                need_charspace = True
+        state.line = (x, y)
+
+    def glyph(self, font, cid: int, matrix: Matrix, lower_left: Tuple[float, float],
+              upper_right: Tuple[float, float], vertical: bool) -> None:
+        (a, b, c, d, e, f) = matrix
+        x0, y0 = a * lower_left[0] + c * lower_left[1] + e, b * lower_left[0] + d * lower_left[1] + f
+        x1, y1 = a * upper_right[0] + c * upper_right[1] + e, b * upper_right[0] + d * upper_right[1] + f
+        if x1 < x0:
+            x0, x1 = x1, x0
+        if y1 < y0:
+            y0, y1 = y1, y0
+        top, bottom = self.height - y1, self.height - y0
+        if not _in_bands(top, bottom, self.bands):
+            return
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = f"(cid:{cid})"
+        self.chars.append({
+            "text": text, "x0": x0, "x1": x1, "top": top, "bottom": bottom,
+            "size": x1 - x0 if vertical else y1 - y0
+        })
+
+
+def read_chars(page, rsrcmgr, bands: Optional[Sequence[Band]] = None) -> List[dict]:
+    """
+    Glyphs of a pdfminer PDFPage whose vertical centre lies in one of the (top, bottom)
+    bands (every glyph when bands is None), in content-stream order, in the coordinates
+    pdfplumber uses for the page (rotated pages included).
+    """
+    (x0, y0, x1, y1) = page.mediabox
+    # The page's rotation as pdfminer's interpreter applies it
+    rotate = page.rotate % 360
+    if rotate == 90:
+        ctm, height = (0, -1, 1, 0, -y0, x1), x1 - x0
+    elif rotate == 180:
+        ctm, height = (-1, 0, 0, -1, x1, y1), y1 - y0
+    elif rotate == 270:
+        ctm, height = (0, 1, -1, 0, y1, -x0), x1 - x0
+    else:
+        ctm, height = (1, 0, 0, 1, -x0, -y0), y1 - y0
+    reader = _Reader(rsrcmgr, height, bands)
+    reader.run(page.resources, list_value(page.contents), ctm)
+    return reader.chars
@@ -0,0 +1,150 @@
+"""
+Code run inside the OCR worker processes.
+
+Each task counts the pages of a document or reads one of its pages within the
+document's budget. The dispatcher gives every task the document's deadline
+(OCR_DOCUMENT_TIMEOUT_SECONDS after its page count was dispatched) and the memory
+reserved for it out of what the document's finished tasks have not used
+(OCR_DOCUMENT_MAX_MEMORY_MB in total), split between the tasks in flight; a task reports
+the memory it used so the next ones get less. A task over budget fails its document
+with OverBudget instead of the worker being killed by the kernel. Budgets are enforced where the platform
+supports them (RLIMIT_AS and SIGALRM, i.e. Linux); elsewhere pages run unbounded.
+"""
+import os
+import re
+import signal
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from ocr.extraction import ExtractionError, extract_page, page_count
+
+
+DOCUMENT_MAX_MEMORY_MB = int(os.getenv("OCR_DOCUMENT_MAX_MEMORY_MB", "512"))
+DOCUMENT_TIMEOUT_SECONDS = float(os.getenv("OCR_DOCUMENT_TIMEOUT_SECONDS", "30"))
+
+
+class OverBudget(ExtractionError):
+    """The document used up its time or memory budget"""
+
+    @classmethod
+    def memory(cls) -> "OverBudget":
+        return cls(f"Reading the document needs more than {DOCUMENT_MAX_MEMORY_MB} MB")
+
+    @classmethod
+    def time(cls) -> "OverBudget":
+        return cls(f"Reading the document took longer than {DOCUMENT_TIMEOUT_SECONDS:g} s")
+
+
+def document_allowance() -> Tuple[Optional[float], Optional[int]]:
+    """(deadline, memory in bytes) of a document starting now; None where the budget is disabled"""
+    deadline = time.time() + DOCUMENT_TIMEOUT_SECONDS if DOCUMENT_TIMEOUT_SECONDS > 0 else None
+    memory = DOCUMENT_MAX_MEMORY_MB * 1024 * 1024 if DOCUMENT_MAX_MEMORY_MB > 0 else None
+    return deadline, memory
+
+
+class _OverTime(Exception):
+    # Not an ExtractionError (a ValueError) so that parsers catching ValueError cannot swallow it
+    pass
+
+
+def warm() -> None:
+    """Process initializer: pay the pdfplumber import and the template load before the first page"""
+    import pdfplumber  # noqa: F401
+    from ocr.template import form_template
+
+    form_template()
+
+
+def _address_space() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _reset_peak_resident() -> Optional[int]:
+    """Restart the peak resident memory (VmHWM) from the current one and return it"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        with open("/proc/self/status") as f:
+            return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) * 1024
+    except (OSError, AttributeError):
+        return None
+
+
+def _peak_resident() -> int:
+    with open("/proc/self/status") as f:
+        return int(re.search(r"VmHWM:\s+(\d+)", f.read()).group(1)) * 1024
+
+
+def _on_alarm(signum, frame):
+    raise _OverTime()
+
+
+@contextmanager
+def document_budget(deadline: Optional[float], memory_left: Optional[int]):
+    """
+    Limit the enclosed work to what is left of the document budget: finish by `deadline`
+    (a time.time() value) and grow the address space by at most `memory_left` bytes.
+    Yields a dict whose "memory" is set to the growth of peak resident memory on exit.
+    """
+    if deadline is not None and deadline <= time.time():
+        raise OverBudget.time()
+    if memory_left is not None and memory_left <= 0:
+        raise OverBudget.memory()
+    usage = {"memory": 0}
+    current = _address_space()
+    limits = None
+    if resource is not None and current is not None and memory_left is not None:
+        limits = resource.getrlimit(resource.RLIMIT_AS)
+        # Room for the main thread's stack to grow: a stack that cannot grow is a segfault, not a MemoryError
+        stack = resource.getrlimit(resource.RLIMIT_STACK)[0]
+        stack_reserve = stack if 0 < stack <= 64 * 1024 * 1024 else 8 * 1024 * 1024
+        soft = current + stack_reserve + memory_left
+        if limits[1] != resource.RLIM_INFINITY:
+            soft = min(soft, limits[1])
+        resource.setrlimit(resource.RLIMIT_AS, (soft, limits[1]))
+    timed = hasattr(signal, "setitimer") and deadline is not None
+    if timed:
+        previous_handler = signal.signal(signal.SIGALRM, _on_alarm)
+        # Keeps firing every second in case a parser swallows the first interruption
+        signal.setitimer(signal.ITIMER_REAL, max(deadline - time.time(), 0.001), 1.0)
+    resident = _reset_peak_resident()
+    try:
+        yield usage
+    except MemoryError:
+        raise OverBudget.memory() from None
+    except _OverTime:
+        raise OverBudget.time() from None
+    finally:
+        if timed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+        if limits is not None:
+            resource.setrlimit(resource.RLIMIT_AS, limits)
+        if resident is not None:
+            usage["memory"] = max(_peak_resident() - resident, 0)
+
+
+def extract_page_within_budget(pdf_bytes: bytes, number: int, deadline: Optional[float],
+                               memory_left: Optional[int]) -> Tuple[Optional[dict], int]:
+    """(extract_page result, memory used in bytes) within what is left of the document budget"""
+    with document_budget(deadline, memory_left) as usage:
+        extraction = extract_page(pdf_bytes, number)
+    return extraction, usage["memory"]
+
+
+def count_pages_within_budget(pdf_bytes: bytes, deadline: Optional[float],
+                              memory_left: Optional[int]) -> Tuple[int, int]:
+    """(page_count result, memory used in bytes) within the document budget"""
+    with document_budget(deadline, memory_left) as usage:
+        pages = page_count(pdf_bytes)
+    return pages, usage["memory"]
@@ -0,0 +1,83 @@
+"""
+Async variants of the API routes for DB_ASYNC mode.
+
+Every route whose handler takes the `session` dependency is re-registered as an
+`async def` handler that receives an AsyncSession (from the read engine when the
+handler reads through get_read_session) and runs the original handler
+(controller + model queries) through AsyncSession.run_sync. Database I/O is then
+awaited on the event loop instead of blocking a threadpool worker, while the route
+definitions, validation and controllers stay single-sourced in routes.py.
+
+run_sync runs the whole handler on the event loop, so handlers that spend their time
+outside the database (PDF parsing, reading uploads) are marked with @sync_only and
+stay sync handlers on the threadpool, with a sync session.
+"""
+import inspect
+from typing import Callable
+
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+
+from db.connection import get_async_read_session, get_async_session, get_read_session
+from utils.instrumentation import InstrumentedRoute
+
+
+def sync_only(func: Callable) -> Callable:
+    """Keep a handler doing CPU-bound or blocking non-DB work off the event loop in DB_ASYNC mode"""
+    func.__sync_only__ = True
+    return func
+
+
+def _async_session_dependency(parameter: inspect.Parameter):
+    if getattr(parameter.default, "dependency", None) is get_read_session:
+        return Depends(get_async_read_session)
+    return Depends(get_async_session)
+
+
+def _async_endpoint(func: Callable) -> Callable:
+    signature = inspect.signature(func)
+    parameters = [
+        parameter.replace(default=_async_session_dependency(parameter), annotation=inspect.Parameter.empty)
+        if parameter.name == "session" else parameter
+        for parameter in signature.parameters.values()
+    ]
+
+    async def endpoint(**kwargs):
+        session = kwargs.pop("session")
+        return await session.run_sync(lambda sync_session: func(session=sync_session, **kwargs))
+
+    endpoint.__signature__ = signature.replace(parameters=parameters)
+    endpoint.__name__ = func.__name__
+    endpoint.__doc__ = func.__doc__
+    return endpoint
+
+
+def build_async_router(sync_router: APIRouter) -> APIRouter:
+    """Copy of sync_router whose session-using handlers run on the async engine"""
+    router = APIRouter(route_class=InstrumentedRoute)
+    for route in sync_router.routes:
+        if not isinstance(route, APIRoute):
+            router.routes.append(route)
+            continue
+        endpoint = route.endpoint
+        if "session" in inspect.signature(endpoint).parameters and not getattr(endpoint, "__sync_only__", False):
+            endpoint = _async_endpoint(endpoint)
+        router.add_api_route(
+            route.path,
+            endpoint,
+            response_model=route.response_model,
+            status_code=route.status_code,
+            tags=route.tags,
+            dependencies=route.dependencies,
+            summary=route.summary,
+            description=route.description,
+            response_description=route.response_description,
+            responses=route.responses,
+            deprecated=route.deprecated,
+            methods=route.methods,
+            operation_id=route.operation_id,
+            include_in_schema=route.include_in_schema,
+            response_class=route.response_class,
+            name=route.name,
+        )
+    return router
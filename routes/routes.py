@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlmodel import Session, select
-from db.connection import get_session
+from typing import Optional
+from db.connection import get_read_session, get_session
 from model import Item, AccountApplicationCreate
-from db.schemas import AccountApplication
+from ocr import MAX_PDF_BYTES
+from db.schemas import AccountApplication, AccountApplicationPage
+from routes.async_routes import sync_only
+from utils.cache import cached_response, response_cache
+from utils.instrumentation import InstrumentedRoute
+from utils.metrics import render_metrics
 from controller.account_application import (
     create_account_application,
+    create_account_applications_bulk,
+    extract_account_application,
+    submit_ocr_job,
+    get_ocr_job,
     get_account_applications,
     get_account_application_by_id,
     update_account_application,
@@ -14,6 +25,7 @@ from controller.account_application import (
     get_applications_by_city,
     get_total_applications_count,
     get_paginated_applications,
+    export_applications,
     get_application_by_account_number,
     get_application_by_iban,
     # Basic Analytics imports
@@ -37,12 +49,16 @@ from controller.account_application import (
     get_premium_customer_analysis,
     get_digital_banking_insights,
     get_high_value_customer_insights,
+    get_high_value_threshold_histogram,
     get_profile_completeness_analytics,
+    get_incomplete_profiles_list,
     get_customer_segmentation,
+    get_customer_segment_members,
+    get_cube_analytics,
     get_executive_summary
 )
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 
 @router.get("/")
@@ -55,6 +71,12 @@ def read_root():
     }
 
 
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus metrics (request and query latency histograms, pool gauges)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @router.post("/account-applications", response_model=AccountApplication)
 def create_application(application_create: AccountApplicationCreate, session: Session = Depends(get_session)):
     """Create a new account application (account_no and iban are auto-generated)
@@ -64,7 +86,38 @@ def create_application(application_create: AccountApplicationCreate, session: Se
     - Next of Kin: If any kin info provided, name/relation/CNIC are required
     - All text fields must be in BLOCK LETTERS (uppercase)
     """
-    return create_account_application(application_create, session)
+    # The stored row is returned as is; response_model only documents it (no second validation)
+    return JSONResponse(create_account_application(application_create, session))
+
+
+@router.post("/account-applications/bulk")
+def create_applications_bulk(
+    applications: list[dict] = Body(..., description="List of AccountApplicationCreate payloads"),
+    chunk_size: int = Query(default=500, ge=1, le=5000, description="Rows per multi-row INSERT"),
+    session: Session = Depends(get_session)
+):
+    """Create many account applications in one transaction
+
+    Every item is validated like POST /account-applications. The response reports, per
+    input index, either the created id/account_no/iban or the validation errors.
+    """
+    return create_account_applications_bulk(applications, session, chunk_size)
+
+
+@router.post("/account-applications/extract")
+@sync_only
+def extract_application_from_form(
+    file: UploadFile = File(..., description="Filled account-opening form (PDF laid out like form.pdf)"),
+    create: bool = Query(False, description="Create the application when the extracted values are valid"),
+    session: Session = Depends(get_session)
+):
+    """Extract an account application from a filled form PDF
+
+    Returns the normalised values (block letters, CNIC XXXXX-XXXXXXX-X, dates DD MM YY),
+    a 0-1 confidence per field and any validation errors. With create=true a valid
+    application is also created and returned under "created".
+    """
+    return extract_account_application(file.file.read(MAX_PDF_BYTES + 1), create, session)
 
 
 @router.get("/account-applications", response_model=list[AccountApplication])
@@ -73,6 +126,31 @@ def read_applications(session: Session = Depends(get_session)):
     return get_account_applications(session)
 
 
+@router.get("/account-applications/export")
+def export_applications_stream(
+    format: str = Query(default="ndjson", description="Export format: ndjson or csv"),
+    cnic_no: Optional[str] = None,
+    account_type: Optional[str] = None,
+    city: Optional[str] = None,
+    account_no: Optional[str] = None,
+    iban: Optional[str] = None,
+    chunk_size: int = Query(default=1000, ge=1, le=10000)
+):
+    """Stream account applications as NDJSON or CSV with constant memory
+
+    Accepts the same filters as the search endpoints; omitted filters match everything.
+    """
+    chunks = export_applications(
+        format, chunk_size,
+        cnic_no=cnic_no, account_type=account_type, city=city, account_no=account_no, iban=iban
+    )
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        chunks, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="account_applications.{format}"'}
+    )
+
+
 @router.get("/account-applications/count")
 def get_applications_count(session: Session = Depends(get_session)):
     """Get total count of account applications"""
@@ -80,14 +158,24 @@ def get_applications_count(session: Session = Depends(get_session)):
     return {"total_applications": count}
 
 
-@router.get("/account-applications/paginated", response_model=list[AccountApplication])
-def get_paginated(skip: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    """Get paginated account applications"""
-    return get_paginated_applications(skip, limit, session)
+@router.get("/account-applications/paginated", response_model=AccountApplicationPage)
+def get_paginated(
+    skip: int = 0,
+    limit: int = 10,
+    sort: str = Query(default="id", description="Sort key: id, city, expected_monthly_turnover_cr or profile_completeness_score"),
+    after: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+    session: Session = Depends(get_session)
+):
+    """Get paginated account applications
+
+    Pass `next_cursor` back as `after` to fetch the next page (null on the last page).
+    Cursor pages cost the same at any depth; `skip` (OFFSET) is kept for compatibility.
+    """
+    return get_paginated_applications(skip, limit, session, sort, after)
 
 
 @router.get("/account-applications/search/cnic/{cnic_no}", response_model=AccountApplication)
-def search_by_cnic(cnic_no: str, session: Session = Depends(get_session)):
+def search_by_cnic(cnic_no: str, session: Session = Depends(get_read_session)):
     """Search account application by CNIC number"""
     application = get_application_by_cnic(cnic_no, session)
     if not application:
@@ -96,19 +184,19 @@ def search_by_cnic(cnic_no: str, session: Session = Depends(get_session)):
 
 
 @router.get("/account-applications/search/account-type/{account_type}", response_model=list[AccountApplication])
-def search_by_account_type(account_type: str, session: Session = Depends(get_session)):
+def search_by_account_type(account_type: str, session: Session = Depends(get_read_session)):
     """Search account applications by account type"""
     return get_applications_by_account_type(account_type, session)
 
 
 @router.get("/account-applications/search/city/{city}", response_model=list[AccountApplication])
-def search_by_city(city: str, session: Session = Depends(get_session)):
+def search_by_city(city: str, session: Session = Depends(get_read_session)):
     """Search account applications by city"""
     return get_applications_by_city(city, session)
 
 
 @router.get("/account-applications/search/account-number/{account_no}", response_model=AccountApplication)
-def search_by_account_number(account_no: str, session: Session = Depends(get_session)):
+def search_by_account_number(account_no: str, session: Session = Depends(get_read_session)):
     """Search account application by account number"""
     application = get_application_by_account_number(account_no, session)
     if not application:
@@ -117,7 +205,7 @@ def search_by_account_number(account_no: str, session: Session = Depends(get_ses
 
 
 @router.get("/account-applications/search/iban/{iban}", response_model=AccountApplication)
-def search_by_iban(iban: str, session: Session = Depends(get_session)):
+def search_by_iban(iban: str, session: Session = Depends(get_read_session)):
     """Search account application by IBAN"""
     application = get_application_by_iban(iban, session)
     if not application:
@@ -143,70 +231,111 @@ def delete_application(application_id: int, session: Session = Depends(get_sessi
     return delete_account_application(application_id, session)
 
 
+# ==================== OCR JOB ENDPOINTS ====================
+
+@router.post("/ocr/jobs", status_code=202)
+@sync_only
+def create_ocr_job(
+    files: list[UploadFile] = File(..., description="Filled account-opening form PDFs"),
+    create: bool = Query(True, description="Create an application for every valid form"),
+    session: Session = Depends(get_session)
+):
+    """Queue form PDFs for background extraction
+
+    Returns the job at once (status "queued"); poll GET /ocr/jobs/{job_id} for progress.
+    Responds 429 with Retry-After while the queue is full.
+    """
+    documents = [(file.filename, file.file.read(MAX_PDF_BYTES + 1)) for file in files]
+    return submit_ocr_job(documents, create, session)
+
+
+@router.get("/ocr/jobs/{job_id}")
+def read_ocr_job(job_id: int, session: Session = Depends(get_session)):
+    """Progress of an OCR job, each document's result and the created application ids"""
+    return get_ocr_job(job_id, session)
+
+
 # ==================== ANALYTICS ENDPOINTS ====================
 
+@router.get("/analytics/cache-stats")
+def analytics_cache_stats():
+    """Get analytics response cache statistics (hits, misses, size, current data generation)"""
+    return response_cache.stats()
+
+
 @router.get("/analytics/dashboard")
-def get_dashboard(session: Session = Depends(get_session)):
+@cached_response()
+def get_dashboard(session: Session = Depends(get_read_session)):
     """Get comprehensive dashboard summary with all key metrics"""
     return get_dashboard_summary(session)
 
 
 @router.get("/analytics/account-types")
-def analytics_account_types(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_account_types(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by account type (CURRENT, SAVINGS, AHU_LAT)"""
     return get_analytics_by_account_type(session)
 
 
 @router.get("/analytics/cities")
-def analytics_cities(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_cities(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by city"""
     return get_analytics_by_city(session)
 
 
 @router.get("/analytics/gender")
-def analytics_gender(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_gender(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by gender (MALE, FEMALE, OTHER)"""
     return get_analytics_by_gender(session)
 
 
 @router.get("/analytics/occupation")
-def analytics_occupation(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_occupation(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by occupation"""
     return get_analytics_by_occupation(session)
 
 
 @router.get("/analytics/card-types")
-def analytics_card_types(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_card_types(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by card type (CLASSIC, GOLD, TITANIUM, etc.)"""
     return get_analytics_by_card_type(session)
 
 
 @router.get("/analytics/card-networks")
-def analytics_card_networks(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_card_networks(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by card network (VISA, MASTERCARD)"""
     return get_analytics_by_card_network(session)
 
 
 @router.get("/analytics/marital-status")
-def analytics_marital_status(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_marital_status(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by marital status"""
     return get_analytics_by_marital_status(session)
 
 
 @router.get("/analytics/residential-status")
-def analytics_residential_status(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_residential_status(session: Session = Depends(get_read_session)):
     """Get analytics breakdown by residential status"""
     return get_analytics_by_residential_status(session)
 
 
 @router.get("/analytics/services")
-def analytics_services(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_services(session: Session = Depends(get_read_session)):
     """Get analytics for services adoption (internet banking, mobile banking, etc.)"""
     return get_services_analytics(session)
 
 
 @router.get("/analytics/next-of-kin")
-def analytics_kin(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_kin(session: Session = Depends(get_read_session)):
     """Get analytics for next of kin (with/without kin information)"""
     return get_kin_analytics(session)
 
@@ -214,7 +343,8 @@ def analytics_kin(session: Session = Depends(get_session)):
 # ==================== ADVANCED ANALYTICS ENDPOINTS ====================
 
 @router.get("/analytics/executive-summary")
-def analytics_executive_summary(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_executive_summary(session: Session = Depends(get_read_session)):
     """
     Executive Summary: Comprehensive business intelligence report with key metrics,
     health indicators, and actionable recommendations for decision makers.
@@ -223,7 +353,8 @@ def analytics_executive_summary(session: Session = Depends(get_session)):
 
 
 @router.get("/analytics/financial-insights")
-def analytics_financial(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_financial(session: Session = Depends(get_read_session)):
     """
     Financial Analytics: Detailed analysis of expected monthly turnovers including
     average, min, max values and net cash flow predictions.
@@ -232,7 +363,8 @@ def analytics_financial(session: Session = Depends(get_session)):
 
 
 @router.get("/analytics/cross-analysis/gender-account")
-def analytics_gender_account(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_gender_account(session: Session = Depends(get_read_session)):
     """
     Cross-Tabulation: Gender vs Account Type analysis showing which account types
     are preferred by different genders with distribution insights.
@@ -241,7 +373,8 @@ def analytics_gender_account(session: Session = Depends(get_session)):
 
 
 @router.get("/analytics/cross-analysis/occupation-card")
-def analytics_occupation_card(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_occupation_card(session: Session = Depends(get_read_session)):
     """
     Cross-Tabulation: Occupation vs Card Type analysis showing premium card adoption
     rates by occupation and top premium card adopter demographics.
@@ -249,8 +382,25 @@ def analytics_occupation_card(session: Session = Depends(get_session)):
     return get_occupation_card_cross_analysis(session)
 
 
+@router.get("/analytics/cube")
+@cached_response()
+def analytics_cube(
+    session: Session = Depends(get_read_session),
+    dims: str = Query(default="", description="Comma-separated dimensions to group by, e.g. gender,account_type (none: totals)"),
+    measures: str = Query(default="count", description="Comma-separated measures: count, sum/avg/min/max_cr, sum/avg/min/max_dr"),
+    filters: Optional[str] = Query(default=None, description="column:value|value,... e.g. city:KARACHI|LAHORE,internet_banking:true")
+):
+    """
+    Analytics Cube: Any whitelisted measures for every combination of up to three
+    dimensions, optionally filtered, compiled to one grouped query. Cells are flat rows
+    (null for a missing dimension value) that a pivot table can be built from.
+    """
+    return get_cube_analytics(session, dims, measures, filters)
+
+
 @router.get("/analytics/city-performance")
-def analytics_city_performance(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_city_performance(session: Session = Depends(get_read_session)):
     """
     City Performance Analysis: Comprehensive city-wise metrics including application volume,
     average customer value, total deposits, and city rankings.
@@ -259,7 +409,8 @@ def analytics_city_performance(session: Session = Depends(get_session)):
 
 
 @router.get("/analytics/occupation-income")
-def analytics_occupation_income(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_occupation_income(session: Session = Depends(get_read_session)):
     """
     Occupation Income Analysis: Average income patterns by occupation with income tier
     classification (HIGH/MEDIUM/LOW) and earning comparisons.
@@ -268,7 +419,8 @@ def analytics_occupation_income(session: Session = Depends(get_session)):
 
 
 @router.get("/analytics/premium-customers")
-def analytics_premium_customers(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_premium_customers(session: Session = Depends(get_read_session)):
     """
     Premium Customer Demographics: In-depth analysis of PLATINUM, SIGNATURE, and INFINITE
     card holders including their demographics, income comparison, and profile.
@@ -277,7 +429,8 @@ def analytics_premium_customers(session: Session = Depends(get_session)):
 
 
 @router.get("/analytics/digital-banking")
-def analytics_digital_banking(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_digital_banking(session: Session = Depends(get_read_session)):
     """
     Digital Banking Adoption: Comprehensive analysis of digital service adoption including
     maturity scoring, adoption rates, and recommendations for improvement.
@@ -286,8 +439,9 @@ def analytics_digital_banking(session: Session = Depends(get_session)):
 
 
 @router.get("/analytics/high-value-customers")
+@cached_response()
 def analytics_high_value(
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
     threshold: float = Query(default=500000, description="Monthly credit threshold for high-value classification")
 ):
     """
@@ -297,8 +451,20 @@ def analytics_high_value(
     return get_high_value_customer_insights(session, threshold)
 
 
+@router.get("/analytics/high-value-customers/histogram")
+@cached_response()
+def analytics_high_value_histogram(session: Session = Depends(get_read_session)):
+    """
+    High-Value Threshold Histogram: Monthly credit turnover buckets with the number of
+    customers at or above each bucket edge, precomputed in the analytics counters so a
+    threshold slider can be moved without querying per value.
+    """
+    return get_high_value_threshold_histogram(session)
+
+
 @router.get("/analytics/profile-completeness")
-def analytics_profile_completeness(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_profile_completeness(session: Session = Depends(get_read_session)):
     """
     Profile Completeness Analysis: Measure data quality across customer profiles with
     field-by-field completion rates and improvement recommendations.
@@ -306,8 +472,24 @@ def analytics_profile_completeness(session: Session = Depends(get_session)):
     return get_profile_completeness_analytics(session)
 
 
+@router.get("/analytics/profile-completeness/incomplete")
+@cached_response()
+def analytics_incomplete_profiles(
+    session: Session = Depends(get_read_session),
+    below: float = Query(default=50, ge=0, le=100, description="List profiles below this completeness percentage"),
+    limit: int = Query(default=50, ge=1, le=1000),
+    after: Optional[str] = Query(default=None, description="next_cursor from the previous page")
+):
+    """
+    Incomplete Profiles: Applications below the completeness threshold, least complete
+    first, for data collection follow-up. Served from the persisted score index.
+    """
+    return get_incomplete_profiles_list(session, below, limit, after)
+
+
 @router.get("/analytics/customer-segments")
-def analytics_customer_segments(session: Session = Depends(get_session)):
+@cached_response()
+def analytics_customer_segments(session: Session = Depends(get_read_session)):
     """
     Customer Segmentation: Behavioral segmentation including Premium Digital Natives,
     High-Value Traditional, Young Professionals, Business Owners, and more with
@@ -316,3 +498,16 @@ def analytics_customer_segments(session: Session = Depends(get_session)):
     return get_customer_segmentation(session)
 
 
+@router.get("/analytics/customer-segments/{segment}/members")
+@cached_response()
+def analytics_customer_segment_members(
+    segment: str,
+    session: Session = Depends(get_read_session),
+    after_id: int = Query(default=0, description="next_after_id from the previous page"),
+    limit: int = Query(default=100, ge=1, le=1000)
+):
+    """
+    Customer Segment Members: Application ids belonging to one segment, in id order,
+    paginated with after_id.
+    """
+    return get_customer_segment_members(segment, session, after_id, limit)
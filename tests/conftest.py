@@ -0,0 +1,15 @@
+"""
+Test setup: the app runs against a throwaway SQLite database, without the background
+OCR job queue or the analytics response cache. Set before any app module is imported,
+since db.connection reads its configuration at import time.
+"""
+import os
+import sys
+import tempfile
+
+_database = os.path.join(tempfile.mkdtemp(prefix="ds-ocr-tests-"), "test.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_database}"
+os.environ["OCR_JOBS"] = "false"
+os.environ["ANALYTICS_CACHE_MAX_BYTES"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
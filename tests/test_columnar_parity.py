@@ -0,0 +1,149 @@
+"""
+Columnar analytics (db/columnar.py) against SQL.
+
+Every analytics route, and a set of /analytics/cube queries, is answered twice, once
+from the columnar store and once from SQL over the application table, after each kind
+of write the store applies: single and bulk creates, updates, deletes and the
+compaction that drops deleted rows.
+"""
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from fastapi.testclient import TestClient
+
+import db.columnar
+import db.schemas
+import main
+from benchmarks.generator import generate_application
+from db.columnar import columnar_store
+from db.schemas import CUSTOMER_SEGMENTS
+
+
+# Found on the app: every GET /analytics route without path parameters, except these
+EXCLUDED_ROUTES = ("/analytics/cache-stats", "/analytics/cube")
+PARAMETER_QUERIES = [
+    ("/analytics/high-value-customers", {"threshold": threshold})
+    for threshold in (0, 100000, 500000, 1e12)
+] + [
+    ("/analytics/profile-completeness/incomplete", {"below": below, "limit": 1000})
+    for below in (50, 100)
+] + [
+    (f"/analytics/customer-segments/{segment}/members", params)
+    for segment in CUSTOMER_SEGMENTS
+    for params in ({"limit": 1000}, {"limit": 7, "after_id": 40})
+]
+CUBE_QUERIES = [
+    {},
+    {"dims": "gender,account_type", "measures": "count,avg_cr,sum_cr"},
+    {"dims": "city", "measures": "count,avg_cr,sum_cr,min_cr,max_cr,avg_dr"},
+    {"dims": "card_type,card_network,marital_status", "measures": "count,sum_dr,max_dr,min_cr"},
+    {"dims": "", "measures": "count,avg_cr,min_cr,max_cr"},
+    {"dims": "gender", "filters": "city:KARACHI|LAHORE,internet_banking:true"},
+    {"dims": "residential_status", "measures": "count,sum_cr", "filters": "card_type:PLATINUM|INFINITE,mobile_banking:false"},
+    {"measures": "count,sum_cr", "filters": "city:NOWHERE"},
+]
+
+
+def _analytics_queries():
+    queries = [
+        (route.path, {})
+        for route in main.app.routes
+        if getattr(route, "path", "").startswith("/analytics") and "GET" in route.methods
+        and "{" not in route.path and route.path not in EXCLUDED_ROUTES
+    ]
+    return queries + PARAMETER_QUERIES + [("/analytics/cube", params) for params in CUBE_QUERIES]
+
+
+def _responses(client, queries):
+    responses = {}
+    for path, params in queries:
+        response = client.get(path, params=params)
+        assert response.status_code == 200, (path, params, response.text)
+        responses[path, tuple(sorted(params.items()))] = response.json()
+    return responses
+
+
+def assert_parity(client, monkeypatch):
+    queries = _analytics_queries()
+    columnar = _responses(client, queries)
+    # Cubes grouped by sorting instead of dense arrays
+    monkeypatch.setattr(db.columnar, "CUBE_MAX_CELLS", 4)
+    sorted_cubes = _responses(client, [(path, params) for path, params in queries if path == "/analytics/cube"])
+    monkeypatch.setattr(db.columnar, "CUBE_MAX_CELLS", 1 << 20)
+    monkeypatch.setattr(db.schemas, "ANALYTICS_COLUMNAR_ENABLED", False)
+    try:
+        sql = _responses(client, queries)
+    finally:
+        monkeypatch.setattr(db.schemas, "ANALYTICS_COLUMNAR_ENABLED", True)
+    for key, expected in sql.items():
+        assert columnar[key] == expected, key
+    for key, cube in sorted_cubes.items():
+        assert cube == sql[key], key
+
+
+def _update(client, rng, application_id):
+    application = client.get(f"/account-applications/{application_id}").json()
+    application.update({
+        "city": rng.choice(["QUETTA", "NEWTOWN", None]),
+        "expected_monthly_turnover_cr": rng.choice([None, 5.0, 99999999.0]),
+        "gender": "FEMALE",
+        "card_type": rng.choice([None, "INFINITE"]),
+        "internet_banking": True,
+        "mobile_banking": rng.choice([True, False]),
+    })
+    response = client.put(f"/account-applications/{application_id}", json=application)
+    assert response.status_code == 200, response.text
+
+
+def test_columnar_matches_sql_after_writes(monkeypatch):
+    # SQL over the base table, not the analytics counters
+    monkeypatch.setattr(db.schemas, "ANALYTICS_COUNTERS_ENABLED", False)
+    monkeypatch.setattr(db.schemas, "ANALYTICS_COLUMNAR_ENABLED", True)
+    monkeypatch.setattr(db.columnar, "COMPACT_MIN_DELETED", 8)
+    monkeypatch.setattr(columnar_store, "loaded", False)
+    rng = random.Random(7)
+
+    with TestClient(main.app) as client:
+        response = client.post("/account-applications/bulk", json=[generate_application(rng, 8_000_000 + i) for i in range(120)])
+        assert response.status_code in (200, 201), response.text
+        # Loads the store
+        assert_parity(client, monkeypatch)
+        assert columnar_store.loaded
+
+        ids = []
+        for i in range(20):
+            response = client.post("/account-applications", json=generate_application(rng, 8_100_000 + i))
+            assert response.status_code == 200, response.text
+            ids.append(response.json()["id"])
+        assert_parity(client, monkeypatch)
+
+        response = client.post("/account-applications/bulk", json=[generate_application(rng, 8_200_000 + i) for i in range(40)])
+        assert response.status_code in (200, 201), response.text
+        assert_parity(client, monkeypatch)
+
+        for application_id in ids[:10] + [1, 2, 3, 50]:
+            _update(client, rng, application_id)
+        assert_parity(client, monkeypatch)
+
+        for application_id in ids[10:] + [4, 5, 60]:
+            assert client.delete(f"/account-applications/{application_id}").status_code == 200
+        assert_parity(client, monkeypatch)
+        assert columnar_store.size > columnar_store.live_count
+
+        # Once deleted rows outnumber the live ones the arrays are compacted
+        live_ids = [application["id"] for application in client.get("/account-applications/paginated", params={"limit": 1000}).json()["items"]]
+        for application_id in live_ids:
+            assert client.delete(f"/account-applications/{application_id}").status_code == 200
+            if columnar_store.size == columnar_store.live_count:
+                break
+        assert columnar_store.size == columnar_store.live_count > 0
+        assert_parity(client, monkeypatch)
+
+        # Writes after a compaction land in the compacted arrays
+        response = client.post("/account-applications/bulk", json=[generate_application(rng, 8_300_000 + i) for i in range(30)])
+        assert response.status_code in (200, 201), response.text
+        _update(client, rng, live_ids[-1])
+        assert_parity(client, monkeypatch)
@@ -0,0 +1,126 @@
+"""
+Analytics counters (AnalyticsCounter) against SQL.
+
+Every analytics route is answered twice, once from the counter table and once from
+SQL over the application table, after each kind of write the counters are upserted
+for: single and bulk creates, updates and deletes. The counter rows are also compared
+with a rebuild from scratch, which checks the total row's turnover min/max.
+"""
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+import db.schemas
+import main
+from benchmarks.generator import generate_application
+from db.connection import engine
+from db.schemas import AnalyticsCounter, TOTAL_DIMENSION
+
+
+PARAMETER_QUERIES = [
+    ("/analytics/high-value-customers", {"threshold": threshold})
+    for threshold in (0, 100000, 1e12)
+]
+
+
+def _analytics_queries():
+    queries = [
+        (route.path, {})
+        for route in main.app.routes
+        if getattr(route, "path", "").startswith("/analytics") and "GET" in route.methods
+        and "{" not in route.path and route.path != "/analytics/cache-stats"
+    ]
+    return queries + PARAMETER_QUERIES
+
+
+def _responses(client, queries):
+    responses = {}
+    for path, params in queries:
+        response = client.get(path, params=params)
+        assert response.status_code == 200, (path, params, response.text)
+        responses[path, tuple(sorted(params.items()))] = response.json()
+    return responses
+
+
+def _counter_rows():
+    with Session(engine) as session:
+        rows = session.exec(select(AnalyticsCounter)).all()
+    keys = [(row.dimension, row.value) for row in rows]
+    assert len(keys) == len(set(keys)), "duplicate counter keys"
+    return {
+        key: row.model_dump(exclude={"id", "dimension", "value"})
+        for key, row in zip(keys, rows)
+        # Emptied categories keep a zero row until the next rebuild
+        if row.count or row.dimension == TOTAL_DIMENSION
+    }
+
+
+def assert_parity(client, monkeypatch):
+    queries = _analytics_queries()
+    counters = _responses(client, queries)
+    monkeypatch.setattr(db.schemas, "ANALYTICS_COUNTERS_ENABLED", False)
+    try:
+        sql = _responses(client, queries)
+    finally:
+        monkeypatch.setattr(db.schemas, "ANALYTICS_COUNTERS_ENABLED", True)
+    for key, expected in sql.items():
+        assert counters[key] == expected, key
+
+    upserted = _counter_rows()
+    with Session(engine) as session:
+        AnalyticsCounter.rebuild(session)
+    rebuilt = _counter_rows()
+    assert upserted.keys() == rebuilt.keys()
+    for key, expected in rebuilt.items():
+        assert upserted[key] == pytest.approx(expected), key
+
+
+def _update(client, rng, application_id, turnover_cr):
+    application = client.get(f"/account-applications/{application_id}").json()
+    application.update({
+        "city": rng.choice(["QUETTA", "NEWTOWN", None]),
+        "expected_monthly_turnover_cr": turnover_cr,
+        "expected_monthly_turnover_dr": rng.choice([None, 1.0, 250000.0]),
+        "card_type": rng.choice([None, "INFINITE"]),
+        "internet_banking": rng.choice([True, False]),
+    })
+    response = client.put(f"/account-applications/{application_id}", json=application)
+    assert response.status_code == 200, response.text
+
+
+def test_counters_match_sql_after_writes(monkeypatch):
+    monkeypatch.setattr(db.schemas, "ANALYTICS_COLUMNAR_ENABLED", False)
+    monkeypatch.setattr(db.schemas, "ANALYTICS_COUNTERS_ENABLED", True)
+    rng = random.Random(11)
+
+    with TestClient(main.app) as client:
+        # Earlier tests may have written with the counters disabled
+        with Session(engine) as session:
+            AnalyticsCounter.rebuild(session)
+
+        response = client.post("/account-applications/bulk", json=[generate_application(rng, 9_000_000 + i) for i in range(60)])
+        assert response.status_code in (200, 201), response.text
+        assert_parity(client, monkeypatch)
+
+        ids = []
+        for i in range(15):
+            response = client.post("/account-applications", json=generate_application(rng, 9_100_000 + i))
+            assert response.status_code == 200, response.text
+            ids.append(response.json()["id"])
+        assert_parity(client, monkeypatch)
+
+        # New extremes widen the total row's min/max; replacing them forces a rescan
+        _update(client, rng, ids[0], 0.5)
+        _update(client, rng, ids[1], 5e11)
+        assert_parity(client, monkeypatch)
+        _update(client, rng, ids[0], 7.0)
+        _update(client, rng, ids[1], None)
+        for application_id in ids[2:8]:
+            _update(client, rng, application_id, rng.choice([None, 5.0, 99999999.0]))
+        assert_parity(client, monkeypatch)
+
+        for application_id in ids[8:]:
+            assert client.delete(f"/account-applications/{application_id}").status_code == 200
+        assert_parity(client, monkeypatch)
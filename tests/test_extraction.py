@@ -0,0 +1,77 @@
+"""
+Form extraction (ocr/) from the printed form.
+
+fixtures/filled_form.pdf is form.pdf with typed values overlaid on page 1: text in
+the field rows, X marks in the checkboxes and one digit per cell in the CNIC and
+expiry boxes.
+"""
+from pathlib import Path
+
+from ocr import normalize
+from ocr.extraction import extract_application
+
+
+ROOT = Path(__file__).resolve().parent.parent
+FILLED_FORM = Path(__file__).resolve().parent / "fixtures" / "filled_form.pdf"
+
+FILLED_FIELDS = {
+    "title_of_account": "MUHAMMAD ALI KHAN",
+    "name": "MUHAMMAD ALI KHAN",
+    "fathers_husbands_name": "AHMED KHAN",
+    "mothers_name": "FATIMA BIBI",
+    "marital_status": "MARRIED",
+    "gender": "MALE",
+    "nationality": "PAKISTANI",
+    "place_of_birth": "KARACHI",
+    "date_of_birth": "15 08 90",
+    "cnic_no": "42101-1234567-1",
+    "cnic_expiry_date": "31 12 30",
+    "house_no_block_street": "HOUSE 12 BLOCK B",
+    "area_location": "GULSHAN",
+    "city": "KARACHI",
+    "postal_code": "75300",
+    "source_of_income": "SALARY",
+    "expected_monthly_turnover_dr": 50.0,
+    "expected_monthly_turnover_cr": 75.0,
+    "residing_since": "2010",
+    "next_of_kin_name": "AHMED KHAN",
+    "next_of_kin_cnic": "42101-7654321-3",
+    "next_of_kin_relationship": "FATHER",
+    "next_of_kin_contact_no": "03001234567",
+    "next_of_kin_email": "ahmed@example.com",
+    "account_type": "SAVINGS",
+    "occupation": "DOCTOR",
+    "residential_status": "HOUSE_OWNED",
+    "internet_banking": True,
+    "mobile_banking": False,
+    "check_book": True,
+    "sms_alerts": False,
+    "zakat_deduction": False,
+    "card_type": "GOLD",
+    "has_next_of_kin": True,
+}
+
+
+def test_filled_form_fields():
+    result = extract_application(FILLED_FORM.read_bytes())
+
+    assert result["page"] == 1
+    assert {field: result["fields"][field] for field in FILLED_FIELDS} == FILLED_FIELDS
+    # Reshaped values (typed in lower case, date with slashes) are read with less confidence
+    assert result["confidence"]["cnic_no"] == normalize.EXACT
+    assert result["confidence"]["date_of_birth"] == normalize.RESHAPED
+
+
+def test_blank_form_has_no_values():
+    result = extract_application((ROOT / "form.pdf").read_bytes())
+
+    assert {field: value for field, value in result["fields"].items() if value not in (None, False)} == {}
+
+
+def test_cnic():
+    assert normalize.cnic("42101-1234567-1") == ("42101-1234567-1", normalize.EXACT)
+    assert normalize.cnic("4210 1123 4567 1") == ("42101-1234567-1", normalize.RESHAPED)
+    assert normalize.cnic("42101-123") == ("42101-123", normalize.INVALID)
+    # Printed cell separators of an empty CNIC box
+    assert normalize.cnic("- -") == (None, 0.0)
+    assert normalize.cnic(None) == (None, 0.0)
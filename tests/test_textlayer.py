@@ -0,0 +1,136 @@
+"""
+The fast text-layer reader (ocr/textlayer.py) against pdfplumber.
+
+Small PDFs are written by hand so each case exercises one feature: a base-14 font,
+a Type3 font with its own FontMatrix, vertical (Identity-V) text, rotated text,
+true/false/null operands in marked content, pages rotated by /Rotate, and a page with
+no text layer. The glyphs read must be pdfplumber's page.chars, and the template read
+of a form must give the fields of the full-page reader it falls back to.
+"""
+import io
+import re
+from pathlib import Path
+
+import pdfplumber
+import pytest
+from pdfminer.pdfinterp import PDFResourceManager
+
+from ocr.extraction import NO_FORM_FOUND, ExtractionError, _open_page, extract_application, extract_fields, extract_page, page_text
+from ocr.template import form_template
+from ocr.textlayer import read_chars
+
+
+FILLED_FORM = Path(__file__).resolve().parent / "fixtures" / "filled_form.pdf"
+
+FONTS = {
+    "F1": b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    "F2": b"<< /Type /Font /Subtype /Type3 /FontBBox [0 -20 100 100] /FontMatrix [0.01 0 0 0.01 0 0]"
+          b" /CharProcs << /A {glyph} /B {glyph} >> /Encoding << /Type /Encoding /Differences [65 /A /B] >>"
+          b" /FirstChar 65 /LastChar 66 /Widths [80 60] /Resources << >> >>",
+    "F3": b"<< /Type /Font /Subtype /Type0 /BaseFont /Vertical /Encoding /Identity-V /DescendantFonts [{cid_font}] >>",
+}
+TEXT = b"BT /F1 12 Tf 20 150 Td (Hello) Tj 0 -20 Td [(W) 120 (orld)] TJ ET"
+CONTENTS = {
+    "base-14 font": TEXT,
+    "Type3 font": b"BT /F2 10 Tf 30 100 Td (ABBA) Tj ET",
+    "vertical text": b"BT /F3 12 Tf 200 180 Td <000100020003> Tj ET",
+    "rotated text": b"BT /F1 12 Tf 0 1 -1 0 100 40 Tm (Up) Tj ET",
+    "true/false/null operands": b"/Span << /MCID 0 /Open true /Closed false /Alt null >> BDC " + TEXT + b" EMC",
+}
+
+
+def _stream(data: bytes) -> bytes:
+    return b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+
+
+def _pdf(content: bytes, rotate: int = 0, size=(300, 200)) -> bytes:
+    """A one-page PDF showing `content` with the fonts F1-F3"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %g %g] /Rotate %d"
+        b" /Resources << /Font << /F1 5 0 R /F2 6 0 R /F3 8 0 R >> >> /Contents 4 0 R >>" % (*size, rotate),
+        _stream(content),
+        FONTS["F1"],
+        FONTS["F2"].replace(b"{glyph}", b"7 0 R"),
+        _stream(b"80 0 0 0 80 100 d1 0 0 80 100 re f"),
+        FONTS["F3"].replace(b"{cid_font}", b"9 0 R"),
+        b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /Vertical"
+        b" /CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> /DW 1000 >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _glyphs(chars):
+    return [
+        (char["text"], *(round(char[key], 3) for key in ("x0", "x1", "top", "bottom", "size")))
+        for char in chars
+    ]
+
+
+def _pdfplumber_chars(pdf_bytes: bytes):
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return pdf.pages[0].chars
+
+
+@pytest.mark.parametrize("rotate", [0, 90, 180, 270])
+@pytest.mark.parametrize("case", sorted(CONTENTS))
+def test_glyphs_match_pdfplumber(case, rotate):
+    pdf_bytes = _pdf(CONTENTS[case], rotate)
+    expected = _glyphs(_pdfplumber_chars(pdf_bytes))
+
+    assert expected
+    assert _glyphs(read_chars(_open_page(pdf_bytes, 1), PDFResourceManager())) == expected
+
+
+@pytest.mark.parametrize("rotate", [0, 90])
+def test_bands_select_pdfplumber_glyphs(rotate):
+    pdf_bytes = _pdf(TEXT, rotate)
+    chars = _pdfplumber_chars(pdf_bytes)
+    first = chars[0]
+    bands = [(first["top"] - 1, first["bottom"] + 1)]
+    expected = [char for char in chars if bands[0][0] <= (char["top"] + char["bottom"]) / 2 <= bands[0][1]]
+
+    assert 0 < len(expected) < len(chars)
+    assert _glyphs(read_chars(_open_page(pdf_bytes, 1), PDFResourceManager(), bands)) == _glyphs(expected)
+
+
+def test_page_without_text_layer():
+    pdf_bytes = _pdf(b"0.5 g 20 20 200 100 re f")
+
+    assert read_chars(_open_page(pdf_bytes, 1), PDFResourceManager()) == []
+    assert _pdfplumber_chars(pdf_bytes) == []
+    with pytest.raises(ExtractionError, match=re.escape(NO_FORM_FOUND)):
+        extract_application(pdf_bytes)
+
+
+def test_template_read_matches_full_page_read():
+    pdf_bytes = FILLED_FORM.read_bytes()
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        expected = extract_fields(page_text(pdf.pages[0].chars))
+
+    assert form_template().read_page(_open_page(pdf_bytes, 1)) == expected
+
+
+def test_other_layouts_fall_back_to_full_page_read():
+    template = form_template()
+    form_text = b"BT /F1 12 Tf 40 700 Td (Type of Account) Tj 0 -20 Td (Name: ALI) Tj ET"
+    same_size = _pdf(form_text, size=(template.width, template.height))
+    other_size = _pdf(form_text)
+
+    for pdf_bytes in (same_size, other_size):
+        # Printed labels are not where the template expects them
+        assert template.read_page(_open_page(pdf_bytes, 1)) is None
+        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+            expected = extract_fields(page_text(pdf.pages[0].chars))
+        extraction = extract_page(pdf_bytes, 1)
+        assert (extraction["fields"], extraction["confidence"]) == expected
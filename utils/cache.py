@@ -0,0 +1,146 @@
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlmodel import Session
+
+from db.connection import DATABASE_READ_URL, READ_STICKY_SECONDS
+from db.schemas import DATA_GENERATION_SEQUENCE, NumberSequence
+from utils.instrumentation import count_result_rows
+
+
+# Cached responses are tagged with the data generation (a NumberSequence advanced in
+# every write transaction, by any process) they were computed at, and are stale once the
+# database's generation moves on.
+_last_write = 0.0  # time.monotonic() of this process's last write
+
+
+def current_generation(session: Session) -> int:
+    """Data generation of the database `session` reads (one primary-key read)"""
+    return NumberSequence.current(session, DATA_GENERATION_SEQUENCE)
+
+
+def note_write() -> None:
+    """Record that this process committed an application write (for replica_settling)"""
+    global _last_write
+    _last_write = time.monotonic()
+
+
+def replica_settling() -> bool:
+    """Whether a read replica may not have applied the last write yet"""
+    return DATABASE_READ_URL is not None and time.monotonic() - _last_write < READ_STICKY_SECONDS
+
+
+class ResponseCache:
+    """In-process LRU cache of rendered JSON responses bounded by total body size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.generation = 0  # newest data generation seen
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (generation, body)
+        self._lock = threading.Lock()
+
+    def get(self, key, generation: int) -> Optional[bytes]:
+        """The cached body for `key` if it was computed at data generation `generation`"""
+        with self._lock:
+            if generation > self.generation:
+                # Every entry is older: drop them all at once
+                self.generation = generation
+                self._entries.clear()
+                self.current_bytes = 0
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, generation: int, body: bytes) -> None:
+        if len(body) > self.max_bytes or generation < self.generation:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (generation, body)
+            self.current_bytes += len(body)
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _discard(self, key) -> None:
+        _, body = self._entries.pop(key)
+        self.current_bytes -= len(body)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "generation": self.generation,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits / lookups) * 100, 2) if lookups > 0 else 0
+        }
+
+
+# ANALYTICS_CACHE_MAX_BYTES=0 disables caching; ANALYTICS_CACHE_EXCLUDE lists endpoint
+# function names (comma separated) that must always be recomputed
+ANALYTICS_CACHE_MAX_BYTES = int(os.getenv("ANALYTICS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+ANALYTICS_CACHE_EXCLUDE = {name.strip() for name in os.getenv("ANALYTICS_CACHE_EXCLUDE", "").split(",") if name.strip()}
+
+response_cache = ResponseCache(ANALYTICS_CACHE_MAX_BYTES)
+
+
+def cached_response(enabled: bool = True) -> Callable:
+    """
+    Cache a sync JSON route handler keyed on (endpoint, query params) until the next write.
+
+    The session dependency is excluded from the key; each lookup reads the data
+    generation through it, so writes made by any process invalidate the entry. Pass enabled=False (or list the
+    endpoint in ANALYTICS_CACHE_EXCLUDE) to opt an endpoint out.
+    """
+    def decorator(func: Callable) -> Callable:
+        if not enabled or func.__name__ in ANALYTICS_CACHE_EXCLUDE or ANALYTICS_CACHE_MAX_BYTES <= 0:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(**kwargs):
+            key = (func.__name__, tuple(sorted((k, v) for k, v in kwargs.items() if k != "session")))
+            # Read the generation before computing so a concurrent write marks the result stale
+            generation = current_generation(kwargs["session"])
+            body = response_cache.get(key, generation)
+            if body is not None:
+                return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+            result = func(**kwargs)
+            count_result_rows(result)
+            body = JSONResponse(jsonable_encoder(result)).body
+            # Right after a write the replica may still answer with the old data; do not
+            # keep that answer for the whole generation
+            if not replica_settling():
+                response_cache.set(key, generation, body)
+            return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+        return wrapper
+
+    return decorator
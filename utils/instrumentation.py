@@ -0,0 +1,199 @@
+"""
+Per-request instrumentation.
+
+RequestInstrumentationMiddleware opens a RequestStats for every HTTP request; the
+SQLAlchemy hooks installed by install_query_hooks add each statement's duration (and
+the rows a DML statement affected) to it, and InstrumentedRoute marks when the handler
+returned, counting the rows in its result, so the time spent encoding the response
+can be separated from the handler itself. The totals are
+sent as a Server-Timing header and, when REQUEST_LOG_JSON is enabled, logged as one
+JSON line per request.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+
+
+REQUEST_INSTRUMENTATION_ENABLED = os.getenv("REQUEST_INSTRUMENTATION", "true").lower() not in ("false", "0", "no")
+REQUEST_LOG_JSON = os.getenv("REQUEST_LOG_JSON", "false").lower() in ("true", "1", "yes")
+
+logger = logging.getLogger("app.requests")
+if REQUEST_LOG_JSON and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class RequestStats:
+    """Mutable counters for one request (shared with threadpool workers via the context)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.result_counted = False
+        self.handler_finished: Optional[float] = None
+        self.response_started: Optional[float] = None
+
+    @property
+    def serialization_time(self) -> float:
+        if self.handler_finished is None or self.response_started is None:
+            return 0.0
+        return max(self.response_started - self.handler_finished, 0.0)
+
+    def server_timing(self) -> str:
+        total = (self.response_started or time.perf_counter()) - self.started
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} queries, {self.rows} rows", '
+            f"serialize;dur={self.serialization_time * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}"
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "statements": self.statements,
+            "db_ms": round(self.db_time * 1000, 3),
+            "rows": self.rows,
+            "serialize_ms": round(self.serialization_time * 1000, 3),
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+        }
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Stats of the request being handled, or None outside a request"""
+    return _current_stats.get()
+
+
+def install_query_hooks(engine) -> None:
+    """Attribute statement count, DB time and rows written by `engine` (sync Engine) to the current request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_stats.get() is not None:
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        if stats is None or not conn.info.get("query_start"):
+            return
+        stats.db_time += time.perf_counter() - conn.info["query_start"].pop()
+        stats.statements += 1
+        if cursor.description is None:
+            # INSERT / UPDATE / DELETE: rows affected (-1 when the driver does not know)
+            stats.rows += max(cursor.rowcount, 0)
+
+
+def _result_rows(result) -> int:
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict):
+        # A page envelope counts its items
+        items = result.get("items")
+        return len(items) if isinstance(items, list) else len(result)
+    return 0 if result is None else 1
+
+
+def count_result_rows(result) -> None:
+    """Add the rows of a handler's result to the current request, once per request"""
+    stats = _current_stats.get()
+    if stats is None or stats.result_counted:
+        return
+    stats.result_counted = True
+    stats.rows += _result_rows(result)
+
+
+def _mark_handler_finished() -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.handler_finished = time.perf_counter()
+
+
+def _finished(result):
+    # Responses (cached bodies, streams) are counted where they are built, if at all
+    if not isinstance(result, Response):
+        count_result_rows(result)
+    return result
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap a route handler to record when it returned and how many rows it returned"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return _finished(await endpoint(*args, **kwargs))
+            finally:
+                _mark_handler_finished()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                return _finished(endpoint(*args, **kwargs))
+            finally:
+                _mark_handler_finished()
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute whose handler records its finish time, separating serialization from handler time"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if REQUEST_INSTRUMENTATION_ENABLED and not getattr(endpoint, "__instrumented__", False):
+            endpoint = _timed_endpoint(endpoint)
+            endpoint.__instrumented__ = True
+        super().__init__(path, endpoint, **kwargs)
+
+
+class RequestInstrumentationMiddleware:
+    """ASGI middleware that collects RequestStats and emits the Server-Timing header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REQUEST_INSTRUMENTATION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                stats.response_started = time.perf_counter()
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            if REQUEST_LOG_JSON:
+                route = scope.get("route")
+                logger.info(json.dumps({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(route, "path", None),
+                    "status": status_code,
+                    **stats.as_dict(),
+                }))
@@ -0,0 +1,281 @@
+"""
+Prometheus metrics rendered in the text exposition format by GET /metrics.
+
+- http_request_duration_seconds / http_requests_in_flight: MetricsMiddleware, labelled
+  by route template so path parameters do not create new series
+- db_query_duration_seconds: install_query_metrics, labelled by the AccountApplication
+  classmethod that issued the statement (see label_query_methods)
+- db_pool_wait_seconds / db_pool_connect_seconds: pool events on the engine
+- db_pool_size / db_pool_checked_out / db_pool_overflow: read from the engine's pool
+  when /metrics is scraped
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative histogram with a fixed set of label names"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge set directly, or read from `function` at render time"""
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (), function: Optional[Callable] = None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.function = function
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.function is not None:
+            values = self.function()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+request_duration = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status"), REQUEST_BUCKETS
+))
+requests_in_flight = register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled", ("method",)
+))
+query_duration = register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency by the AccountApplication classmethod that issued it",
+    ("method",), DB_BUCKETS
+))
+pool_wait = register(Histogram(
+    "db_pool_wait_seconds", "Time a session waited for a connection from the pool, excluding opening new connections",
+    ("engine",), DB_BUCKETS
+))
+pool_connect = register(Histogram(
+    "db_pool_connect_seconds", "Time spent opening a new database connection for the pool",
+    ("engine",), DB_BUCKETS
+))
+
+_pools: Dict[str, Callable] = {}
+
+
+def _pool_stat(read_pool: Callable) -> Callable:
+    def read() -> dict:
+        values = {}
+        for engine_name, get_pool in _pools.items():
+            try:
+                values[(engine_name,)] = read_pool(get_pool())
+            except AttributeError:
+                # Pools without queue statistics (NullPool, StaticPool)
+                continue
+        return values
+    return read
+
+
+register(Gauge("db_pool_size", "Configured pool size", ("engine",), _pool_stat(lambda pool: pool.size())))
+register(Gauge("db_pool_checked_out", "Connections currently checked out", ("engine",), _pool_stat(lambda pool: pool.checkedout())))
+# QueuePool.overflow() counts from -pool_size; report only connections beyond the pool size
+register(Gauge("db_pool_overflow", "Connections open beyond the pool size", ("engine",), _pool_stat(lambda pool: max(pool.overflow(), 0))))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        requests_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            requests_in_flight.dec(method)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            request_duration.observe(time.perf_counter() - started, method, route, str(status_code))
+
+
+# Innermost public query classmethod on the call stack
+_query_method: ContextVar[str] = ContextVar("query_method", default="other")
+
+
+def label_query_methods(cls):
+    """Class decorator: label statements issued by the public classmethods of `cls` with the method name"""
+    for name, attribute in list(vars(cls).items()):
+        # Generators (stream_rows) run their queries after the call returns; left as "other"
+        if name.startswith("_") or not isinstance(attribute, classmethod) or inspect.isgeneratorfunction(attribute.__func__):
+            continue
+        setattr(cls, name, classmethod(_labelled(name, attribute.__func__)))
+    return cls
+
+
+def _labelled(name: str, func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _query_method.set(name)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _query_method.reset(token)
+        return result
+    return wrapper
+
+
+# When the current session started asking the pool for a connection
+_checkout_started: ContextVar[Optional[float]] = ContextVar("checkout_started", default=None)
+
+
+def _mark_checkout_started(*args) -> None:
+    _checkout_started.set(time.perf_counter())
+
+
+def _clear_checkout_started(*args) -> None:
+    _checkout_started.set(None)
+
+
+def install_query_metrics(engine, engine_name: str = "default") -> None:
+    """Record statement latency and pool statistics of `engine` (sync Engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if starts:
+            query_duration.observe(time.perf_counter() - starts.pop(), _query_method.get())
+        # The session already held its connection
+        _checkout_started.set(None)
+
+    # Pool events registered on the engine move to the new pool when engine.dispose() replaces it
+    _pools[engine_name] = lambda: engine.pool
+
+    @event.listens_for(engine, "do_connect")
+    def do_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info["metrics_connect_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        started = connection_record.info.pop("metrics_connect_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        pool_connect.observe(elapsed, engine_name)
+        # Opening the connection is not waiting for one
+        checkout_started = _checkout_started.get()
+        if checkout_started is not None:
+            _checkout_started.set(checkout_started + elapsed)
+
+    @event.listens_for(engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        started = _checkout_started.get()
+        if started is not None:
+            _checkout_started.set(None)
+            pool_wait.observe(time.perf_counter() - started, engine_name)
+
+    # A session checks out a connection, if it has none yet, when it executes or flushes
+    if not event.contains(Session, "do_orm_execute", _mark_checkout_started):
+        event.listen(Session, "do_orm_execute", _mark_checkout_started)
+        event.listen(Session, "before_flush", _mark_checkout_started)
+        event.listen(Session, "after_begin", _clear_checkout_started)
@@ -0,0 +1,29 @@
+import base64
+import json
+from typing import Any, Optional, Tuple
+
+
+def encode_cursor(sort: str, key: Any, last_id: int) -> str:
+    """Encode the last row's sort key and id as an opaque URL-safe token"""
+    raw = json.dumps([sort, key, last_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[str, Any, int]:
+    """Decode a token produced by encode_cursor into (sort, key, last_id)"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        sort, key, last_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(sort, str) or not isinstance(last_id, int):
+        raise ValueError("Invalid pagination cursor")
+    return sort, key, last_id
+
+
+def next_cursor(rows: list, limit: int, sort: str) -> Optional[str]:
+    """Cursor for the page after `rows`, or None when this was the last page"""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(sort, getattr(last, sort), last.id)
@@ -0,0 +1,45 @@
+"""
+Read-your-writes stickiness for the read replica.
+
+With DATABASE_READ_URL set, analytics and search routes read from a replica that may
+lag behind the primary. ReadYourWritesMiddleware marks every client that just wrote
+(a successful POST, PUT, PATCH or DELETE) with a short-lived cookie; while the cookie
+is live, db.connection.get_read_session sends that client's reads to the primary, so
+it sees its own writes.
+"""
+import time
+
+from starlette.datastructures import MutableHeaders
+
+from db.connection import READ_STICKY_COOKIE, READ_STICKY_SECONDS
+
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+def sticky_cookie() -> str:
+    """Set-Cookie value pinning the client's reads to the primary for READ_STICKY_SECONDS"""
+    until = time.time() + READ_STICKY_SECONDS
+    return (
+        f"{READ_STICKY_COOKIE}={until:.3f}; Max-Age={max(int(READ_STICKY_SECONDS), 1)}; "
+        "Path=/; HttpOnly; SameSite=Lax"
+    )
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware that sets the read-your-writes cookie on successful writes"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("Set-Cookie", sticky_cookie())
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,9 +1,16 @@
 import re
-import random
-import string
 from typing import Optional
 
 
+# Compiled once at import; the validators run for every field of every request
+_CNIC = re.compile(r'^\d{5}-\d{7}-\d{1}$')
+_DATE = re.compile(r'^\d{2} \d{2} \d{2}$')
+_DIGITS = re.compile(r'^\d+$')
+_EMAIL = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+_ACCOUNT_NUMBER = re.compile(r'^\d{12}$')
+_IBAN = re.compile(r'^PK\d{18}$')
+
+
 def validate_uppercase(v: Optional[str]) -> Optional[str]:
     """Validate that the field is in BLOCK LETTERS (uppercase only)"""
     if v is not None and not v.isupper():
@@ -13,68 +20,89 @@ def validate_uppercase(v: Optional[str]) -> Optional[str]:
 
 def validate_cnic(v: str) -> str:
     """Validate CNIC format: XXXXX-XXXXXXX-X"""
-    if not re.match(r'^\d{5}-\d{7}-\d{1}$', v):
+    if not _CNIC.match(v):
         raise ValueError('CNIC must be in format XXXXX-XXXXXXX-X (e.g., 12345-1234567-1)')
     return v
 
 
 def validate_kin_cnic(v: Optional[str]) -> Optional[str]:
     """Validate Next of Kin CNIC format"""
-    if v is not None and not re.match(r'^\d{5}-\d{7}-\d{1}$', v):
+    if v is not None and not _CNIC.match(v):
         raise ValueError('Next of Kin CNIC must be in format XXXXX-XXXXXXX-X')
     return v
 
 
 def validate_date_format(v: Optional[str]) -> Optional[str]:
     """Validate date format: DD MM YY"""
-    if v is not None and not re.match(r'^\d{2} \d{2} \d{2}$', v):
+    if v is not None and not _DATE.match(v):
         raise ValueError('Date must be in format DD MM YY (e.g., 01 01 25)')
     return v
 
 
 def validate_postal_code(v: Optional[str]) -> Optional[str]:
     """Validate postal code contains only digits"""
-    if v is not None and not re.match(r'^\d+$', v):
+    if v is not None and not _DIGITS.match(v):
         raise ValueError('Postal code must contain only digits')
     return v
 
 
 def validate_contact(v: Optional[str]) -> Optional[str]:
     """Validate contact number contains only digits"""
-    if v is not None and not re.match(r'^\d+$', v):
+    if v is not None and not _DIGITS.match(v):
         raise ValueError('Contact number must contain only digits')
     return v
 
 
 def validate_email(v: Optional[str]) -> Optional[str]:
     """Validate email format"""
-    if v is not None and not re.match(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', v):
+    if v is not None and not _EMAIL.match(v):
         raise ValueError('Invalid email format')
     return v
 
 
-def generate_account_number() -> str:
-    """Generate a random 12-digit account number"""
-    return ''.join(random.choices(string.digits, k=12))
+def luhn_check_digit(digits: str) -> str:
+    """Luhn check digit for a string of digits"""
+    total = 0
+    for position, char in enumerate(reversed(digits)):
+        digit = int(char)
+        if position % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return str((10 - total % 10) % 10)
+
+
+def account_number_from_sequence(value: int) -> str:
+    """Derive a 12-digit account number (11-digit sequence + Luhn check digit)"""
+    if not 0 < value < 10 ** 11:
+        raise ValueError('Account number sequence exhausted')
+    digits = f"{value:011d}"
+    return digits + luhn_check_digit(digits)
+
+
+def iban_check_digits(country_code: str, bban: str) -> str:
+    """ISO 13616 mod-97 check digits for a country code and BBAN"""
+    rearranged = bban + country_code + "00"
+    numeric = ''.join(str(int(char, 36)) for char in rearranged.upper())
+    return f"{98 - int(numeric) % 97:02d}"
 
 
-def generate_iban() -> str:
-    """Generate a random Pakistani IBAN (PK + 2 check digits + 16 digits)"""
-    # Pakistani IBAN format: PK + 2 check digits + 16 digits
-    check_digits = ''.join(random.choices(string.digits, k=2))
-    account_digits = ''.join(random.choices(string.digits, k=16))
-    return f"PK{check_digits}{account_digits}"
+def iban_from_account_number(account_no: str, bank_code: str) -> str:
+    """Build a Pakistani IBAN (PK + check digits + 4-digit bank code + 12-digit account number)"""
+    bban = f"{bank_code}{account_no}"
+    return f"PK{iban_check_digits('PK', bban)}{bban}"
 
 
 def validate_account_number(v: Optional[str]) -> Optional[str]:
     """Validate account number format (12 digits)"""
-    if v is not None and not re.match(r'^\d{12}$', v):
+    if v is not None and not _ACCOUNT_NUMBER.match(v):
         raise ValueError('Account number must be 12 digits')
     return v
 
 
 def validate_iban(v: Optional[str]) -> Optional[str]:
     """Validate IBAN format (PK followed by 18 digits)"""
-    if v is not None and not re.match(r'^PK\d{18}$', v):
+    if v is not None and not _IBAN.match(v):
         raise ValueError('IBAN must be in format PK followed by 18 digits')
     return v
\ No newline at end of file